@@ -7,228 +7,287 @@
 
 import streamlit as st
 import pandas as pd
-from rapidfuzz import process, fuzz
 import plotly.express as px
-import re
-import gspread
 from datetime import datetime
-from gspread_dataframe import set_with_dataframe
-import numpy as np # Diperlukan untuk HPP
+import time
+import functools
+import instrumentation
+import jobs
+from gsheets_client import connect
+from dataset_store import STORE
+from derived import (
+    MY_STORE_NAME, TOP_PRODUCTS, brand_omzet, build_comparison_lookup, build_derived_frames, build_hpp_lookup, build_margin_history,
+    build_match_index, category_omzet, compare_product, hpp_analysis, store_latest_products, top_products,
+)
+from formatting import DATE_COLUMN, WEEK_COLUMN, format_week, rupiah_column, rupiah_columns, weekly_growth, wow_growth_colors
+from ingestion import memory_report
+from rollups import build_range_rollups, build_rollups
+from presence import build_presence, first_seen_week, rows_in_week, week_changes
+from snapshot import history_info, latest_table, window_start
+from storage import SheetsBackend, SnapshotBackend
 
 # ================================
 # KONFIGURASI HALAMAN
 # ================================
 st.set_page_config(layout="wide", page_title="Dashboard Analisis v5.0")
+DIAGNOSTICS_HISTORY = 10  # jumlah run terakhir yang bisa dilihat di panel diagnostik
+SPAN_FIELDS = {'nama', 'kedalaman', 'mulai', 'detik', 'api_calls', 'bytes_in', 'gagal'}
 
 # ================================
 # FUNGSI KONEKSI GOOGLE SHEETS
 # ================================
 @st.cache_resource(show_spinner="Menghubungkan ke Google Sheets...")
 def connect_to_gsheets():
-    creds_dict = {
-        "type": st.secrets["gcp_type"], "project_id": st.secrets["gcp_project_id"],
-        "private_key_id": st.secrets["gcp_private_key_id"], "private_key": st.secrets["gcp_private_key_raw"].replace('\\n', '\n'),
-        "client_email": st.secrets["gcp_client_email"], "client_id": st.secrets["gcp_client_id"],
-        "auth_uri": st.secrets["gcp_auth_uri"], "token_uri": st.secrets["gcp_token_uri"],
-        "auth_provider_x509_cert_url": st.secrets["gcp_auth_provider_x509_cert_url"],
-        "client_x509_cert_url": st.secrets["gcp_client_x509_cert_url"]
-    }
-    gc = gspread.service_account_from_dict(creds_dict)
-    return gc
+    return connect(st.secrets)
+
+# ================================
+# DIAGNOSTIK KINERJA (OPSIONAL)
+# ================================
+# Satu trace per run script: aktif jika DASHBOARD_DIAGNOSTICS=1 atau dicentang di panel sidebar
+def diagnostics_enabled():
+    return st.session_state.get('diagnostics', instrumentation.DIAGNOSTICS_DEFAULT)
+
+def remember_trace(trace):
+    if trace is None: return
+    history = st.session_state.setdefault('diagnostics_history', [])
+    history.append(trace.to_dict())
+    del history[:-DIAGNOSTICS_HISTORY]
+
+def begin_run_trace():
+    previous = st.session_state.get('diagnostics_trace')
+    if previous is not None and not previous.finished:
+        # Run sebelumnya berhenti lewat st.stop()/st.rerun(), mis. saat data pertama kali dimuat
+        remember_trace(instrumentation.finish_trace(previous, ended=previous.last_activity))
+    st.session_state.diagnostics_trace = instrumentation.start_trace("dashboard", enabled=diagnostics_enabled())
+    return st.session_state.diagnostics_trace
+
+def show_diagnostics(trace):
+    remember_trace(instrumentation.finish_trace(trace))
+    with st.sidebar.expander("🩺 Diagnostik Kinerja"):
+        st.checkbox("Ukur waktu per tahap & panggilan API", value=diagnostics_enabled(), key='diagnostics_toggle',
+                    on_change=lambda: st.session_state.update(diagnostics=st.session_state.diagnostics_toggle))
+        history = st.session_state.get('diagnostics_history', [])
+        if not history:
+            st.caption("Belum ada run yang diukur."); return
+        chosen = st.selectbox("Run", range(len(history) - 1, -1, -1), format_func=lambda i: (
+            f"{history[i]['waktu'][11:]} · {history[i]['trace']} · {history[i]['detik']:.2f} detik"))
+        record = history[chosen]
+        api = record['api']
+        st.caption(f"Total {record['detik']:.2f} detik | {api['calls']} panggilan API ({api['detik']:.2f} detik), "
+                   f"{api['bytes_in'] / 1024:,.0f} KB diterima, {api['bytes_out'] / 1024:,.0f} KB dikirim")
+        if record['spans']:
+            # Atribut tambahan per span (sheet, baris, frame, ...) digabung jadi satu kolom keterangan
+            spans_df = pd.DataFrame([{
+                'mulai': span['mulai'], 'tahap': '· ' * span['kedalaman'] + span['nama'], 'detik': span['detik'],
+                'api_calls': span['api_calls'], 'bytes_in': span['bytes_in'],
+                'keterangan': ', '.join(f"{k}={v}" for k, v in span.items() if k not in SPAN_FIELDS),
+            } for span in record['spans']]).sort_values('mulai', kind='stable')
+            st.dataframe(spans_df[['tahap', 'detik', 'api_calls', 'bytes_in', 'keterangan']], use_container_width=True, hide_index=True, column_config={
+                'detik': st.column_config.NumberColumn("Detik", format="%.3f"),
+                'api_calls': st.column_config.NumberColumn("API"),
+                'bytes_in': st.column_config.NumberColumn("Byte", format="%,d"),
+            })
 
 # ================================
 # FUNGSI MEMUAT SEMUA DATA
 # ================================
-@st.cache_data(show_spinner="Mengambil data terbaru dari Google Sheets...")
+def check_matches_header(matches_df):
+    if matches_df is None or matches_df.empty: return pd.DataFrame()
+    expected_cols = ['Produk Toko Saya', 'Produk Kompetitor', 'Harga Kompetitor']
+    missing_cols = [col for col in expected_cols if col not in matches_df.columns]
+    if missing_cols:
+        st.error(f"Header di sheet 'HASIL_MATCHING' salah! Kolom berikut tidak ditemukan: {', '.join(missing_cols)}")
+        return pd.DataFrame()
+    return matches_df
+
+def store_snapshot(spreadsheet_key, rekap_df, database_df, matches_df, manifest, report):
+    try:
+        saved = SnapshotBackend(spreadsheet_key).save(rekap_df, database_df, matches_df, manifest)
+        report['snapshot'], report['versi'] = saved['saved_at'], f"{spreadsheet_key}@{saved['generation']}"
+    except Exception as e:
+        st.warning(f"Snapshot lokal gagal disimpan: {e}")
+        report['versi'] = f"{spreadsheet_key}@{time.time_ns()}"
+
+def publish_dataset(spreadsheet_key, rekap_df, database_df, matches_df, report, latest_df=None, history=None):
+    # Jika snapshot terpartisi tersimpan, hanya jendela riwayat terbaru yang dipegang di memori;
+    # bulan yang lebih lama dimuat dari partisi saat rentang tanggalnya dipilih (history_range).
+    # Rollup harian & mingguan dibangun sekali per versi data, saat data dimuat.
+    if latest_df is None: latest_df = latest_table(rekap_df)
+    history = dict(history or history_info(rekap_df))
+    history['date_min'], history['date_max'] = pd.Timestamp(history['date_min']), pd.Timestamp(history['date_max'])
+    history['loaded_from'] = window_start(history['date_max']) if report.get('snapshot') else None
+    if history['loaded_from'] is not None and rekap_df['Tanggal'].min() < history['loaded_from']:
+        rekap_df = rekap_df[rekap_df['Tanggal'] >= history['loaded_from']].reset_index(drop=True)
+    with instrumentation.span("load.rollups"):
+        rollups = build_rollups(rekap_df)
+    return STORE.publish(spreadsheet_key, report['versi'], rekap_df, database_df, check_matches_header(matches_df), report,
+                         rollups=rollups, latest=latest_df, history=history)
+
 def load_all_data(spreadsheet_key):
-    gc = connect_to_gsheets()
+    # Versi yang sudah dimuat sesi lain dipakai bersama (tanpa salinan, tanpa membaca ulang)
+    with STORE.load_lock(spreadsheet_key):
+        dataset = STORE.latest(spreadsheet_key)
+        if dataset is not None: return dataset
+        with st.spinner("Memuat data (snapshot lokal / Google Sheets)..."), instrumentation.span("load.dataset"):
+            return _load_dataset(spreadsheet_key)
+
+def _load_dataset(spreadsheet_key):
+    # Start dingin: baca snapshot Parquet lokal tanpa panggilan API sama sekali,
+    # dan dari REKAP hanya partisi bulan di jendela riwayat terbaru
+    started = time.perf_counter()
+    window = SnapshotBackend(spreadsheet_key).load_window()
+    if window is not None:
+        rekap_df, database_df, matches_df, manifest, latest_df = window
+        report = {'mode': 'snapshot', 'timings': [], 'warnings': [], 'api_calls': 0,
+                  'total_detik': time.perf_counter() - started, 'snapshot': manifest.get('saved_at'),
+                  'versi': f"{spreadsheet_key}@{manifest.get('generation')}", 'memori': memory_report(rekap_df)}
+        return publish_dataset(spreadsheet_key, rekap_df, database_df, matches_df, report, latest_df=latest_df, history=manifest['history'])
+
     try:
-        spreadsheet = gc.open_by_key(spreadsheet_key)
+        with instrumentation.span("load.full_load"):
+            rekap_df, database_df, matches_df, manifest, report = SheetsBackend(connect_to_gsheets()).load(spreadsheet_key)
     except Exception as e:
         st.error(f"GAGAL KONEKSI/OPEN SPREADSHEET: {e}")
-        return None, None, None
-
-    # Nama sheet yang relevan sekarang termasuk DATABASE secara eksplisit
-    sheet_names = [
-        "DATABASE", "DB KLIK - REKAP - READY", "DB KLIK - REKAP - HABIS",
-        "ABDITAMA - REKAP - READY", "ABDITAMA - REKAP - HABIS", "LEVEL99 - REKAP - READY", "LEVEL99 - REKAP - HABIS",
-        "JAYA PC - REKAP - READY", "JAYA PC - REKAP - HABIS", "MULTIFUNGSI - REKAP - READY", "MULTIFUNGSI - REKAP - HABIS",
-        "IT SHOP - REKAP - READY", "IT SHOP - REKAP - HABIS", "SURYA MITRA ONLINE - REKAP - READY", "SURYA MITRA ONLINE - REKAP - HABIS",
-        "GG STORE - REKAP - READY", "GG STORE - REKAP - HABIS", "TECH ISLAND - REKAP - READY", "TECH ISLAND - REKAP - HABIS",
-        "LOGITECH - REKAP - READY", "LOGITECH - REKAP - HABIS"
-    ]
-    rekap_list_df, database_df, matches_df = [], pd.DataFrame(), pd.DataFrame()
-
-    for sheet_name in sheet_names:
-        try:
-            worksheet = spreadsheet.worksheet(sheet_name)
-            all_values = worksheet.get_all_values()
-            if not all_values or len(all_values) < 2: continue
-            header, data = all_values[0], all_values[1:]
-            df_sheet = pd.DataFrame(data, columns=header)
-            if '' in df_sheet.columns: df_sheet = df_sheet.drop(columns=[''])
-            if "DATABASE" in sheet_name.upper():
-                database_df = df_sheet
-            elif "REKAP" in sheet_name.upper():
-                store_name_match = re.match(r"^(.*?) - REKAP", sheet_name, re.IGNORECASE)
-                toko_name = store_name_match.group(1).strip() if store_name_match else "Toko Tak Dikenal"
-                df_sheet['Toko'] = toko_name
-                if 'Status' not in df_sheet.columns:
-                    df_sheet['Status'] = 'Tersedia' if "READY" in sheet_name.upper() else 'Habis'
-                rekap_list_df.append(df_sheet)
-        except gspread.exceptions.WorksheetNotFound: continue
-        except Exception as e: st.warning(f"Gagal baca sheet '{sheet_name}': {e}"); continue
-
-    if not rekap_list_df:
-        st.error("Tidak ada data REKAP yang berhasil dimuat."); return None, None, None
-    rekap_df = pd.concat(rekap_list_df, ignore_index=True)
-    rekap_df.columns = [str(c).strip().upper() for c in rekap_df.columns]
-    
-    final_rename = {
-        'NAMA': 'Nama Produk', 'TERJUAL/BLN': 'Terjual per Bulan', 
-        'TANGGAL': 'Tanggal', 'HARGA': 'Harga', 'BRAND': 'Brand', 
-        'STOK': 'Stok', 'TOKO': 'Toko', 'STATUS': 'Status'
-    }
-    rekap_df.rename(columns=final_rename, inplace=True)
-
-    if 'Nama Produk' in rekap_df.columns:
-        rekap_df['Nama Produk'] = rekap_df['Nama Produk'].astype(str).str.strip()
-    if 'Tanggal' in rekap_df.columns:
-        rekap_df['Tanggal'] = pd.to_datetime(rekap_df['Tanggal'], errors='coerce', dayfirst=True)
-    if 'Harga' in rekap_df.columns:
-        rekap_df['Harga'] = pd.to_numeric(rekap_df['Harga'].astype(str).str.replace(r'[^\d]', '', regex=True), errors='coerce')
-    if 'Terjual per Bulan' in rekap_df.columns:
-        rekap_df['Terjual per Bulan'] = pd.to_numeric(rekap_df['Terjual per Bulan'], errors='coerce').fillna(0)
-    
-    rekap_df.dropna(subset=['Tanggal', 'Nama Produk', 'Harga', 'Toko'], inplace=True)
-    if 'Brand' not in rekap_df.columns or rekap_df['Brand'].isnull().all():
-        rekap_df['Brand'] = rekap_df['Nama Produk'].str.split(n=1).str[0].str.upper()
-    rekap_df['Omzet'] = (rekap_df['Harga'].fillna(0) * rekap_df.get('Terjual per Bulan', 0).fillna(0)).astype(int)
-
+        return None
+    for message in report['warnings']: st.warning(message)
+    if rekap_df is None:
+        st.error("Tidak ada data REKAP yang berhasil dimuat."); return None
+    store_snapshot(spreadsheet_key, rekap_df, database_df, matches_df, manifest, report)
+    return publish_dataset(spreadsheet_key, rekap_df, database_df, matches_df, report)
+
+def refresh_all_data(spreadsheet_key):
+    # Hanya baris REKAP yang baru ditambahkan sejak snapshot terakhir yang diambil & diparsing
+    snapshot = SnapshotBackend(spreadsheet_key).load()
+    if snapshot is None:
+        with STORE.load_lock(spreadsheet_key):
+            return _load_dataset(spreadsheet_key)
     try:
-        matches_sheet = spreadsheet.worksheet("HASIL_MATCHING")
-        matches_df = pd.DataFrame(matches_sheet.get_all_records())
-        if not matches_df.empty:
-            matches_df.columns = [str(c).strip() for c in matches_df.columns]
-            expected_cols = ['Produk Toko Saya', 'Produk Kompetitor', 'Harga Kompetitor']
-            missing_cols = [col for col in expected_cols if col not in matches_df.columns]
-            if missing_cols:
-                st.error(f"Header di sheet 'HASIL_MATCHING' salah! Kolom berikut tidak ditemukan: {', '.join(missing_cols)}")
-                matches_df = pd.DataFrame()
-    except gspread.exceptions.WorksheetNotFound: pass
-    except Exception as e: st.warning(f"Gagal memuat 'HASIL_MATCHING': {e}")
-
-    return rekap_df.sort_values('Tanggal'), database_df, matches_df
+        with st.spinner("Mengambil baris baru dari Google Sheets..."), instrumentation.span("load.incremental_refresh"):
+            rekap_df, database_df, matches_df, manifest, report = SheetsBackend(connect_to_gsheets()).refresh(spreadsheet_key, snapshot)
+    except Exception as e:
+        st.error(f"GAGAL KONEKSI/OPEN SPREADSHEET: {e}")
+        return None
+    for message in report['warnings']: st.warning(message)
+    if rekap_df is None:
+        st.error("Tidak ada data REKAP yang berhasil dimuat."); return None
+    store_snapshot(spreadsheet_key, rekap_df, database_df, matches_df, manifest, report)
+    return publish_dataset(spreadsheet_key, rekap_df, database_df, matches_df, report)
 
 # ================================
 # FUNGSI UNTUK PROSES UPDATE HARGA
 # ================================
-def load_source_data_for_update(gc, spreadsheet_key):
-    # (Fungsi ini tidak diubah)
-    spreadsheet = gc.open_by_key(spreadsheet_key)
-    sheet_objs = [s for s in spreadsheet.worksheets() if "REKAP" in s.title.upper()]
-    rekap_list = []
-    
-    for s in sheet_objs:
-        try:
-            vals = s.get_all_values()
-            if not vals or len(vals) < 2: continue
-            header, data = vals[0], vals[1:]
-            df = pd.DataFrame(data, columns=header)
-            if '' in df.columns: df = df.drop(columns=[''])
-            store_name_match = re.match(r"^(.*?) - REKAP", s.title, re.IGNORECASE)
-            df['Toko'] = store_name_match.group(1).strip() if store_name_match else "Toko Tak Dikenal"
-            rekap_list.append(df)
-        except Exception: continue
-
-    if not rekap_list: return pd.DataFrame()
-    rekap_df = pd.concat(rekap_list, ignore_index=True)
-    rekap_df.columns = [str(c).strip().upper() for c in rekap_df.columns]
-    final_rename = {
-        'NAMA': 'Nama Produk', 'TERJUAL/BLN': 'Terjual per Bulan', 'TANGGAL': 'Tanggal', 'HARGA': 'Harga', 
-        'BRAND': 'Brand', 'STOK': 'Stok', 'TOKO': 'Toko', 'STATUS': 'Status'
-    }
-    rekap_df.rename(columns=final_rename, inplace=True)
-    required_cols = ['Tanggal', 'Nama Produk', 'Toko', 'Harga']
-    if not all(col in rekap_df.columns for col in required_cols): return pd.DataFrame()
-    rekap_df['Tanggal'] = pd.to_datetime(rekap_df['Tanggal'], errors='coerce', dayfirst=True)
-    rekap_df['Harga'] = pd.to_numeric(rekap_df['Harga'].astype(str).str.replace(r'[^\d]', '', regex=True), errors='coerce')
-    rekap_df.dropna(subset=required_cols, inplace=True)
-    idx = rekap_df.groupby(['Toko', 'Nama Produk'])['Tanggal'].idxmax()
-    return rekap_df.loc[idx].reset_index(drop=True)
-
-def run_price_comparison_update(gc, spreadsheet_key, score_cutoff=88):
-    # (Fungsi ini tidak diubah)
-    placeholder = st.empty()
-    with placeholder.container():
-        st.info("Memulai pembaruan perbandingan harga...")
-        prog = st.progress(0, text="0%")
-    source_df = load_source_data_for_update(gc, spreadsheet_key)
-    if source_df is None or source_df.empty:
-        with placeholder.container(): st.error("Gagal memuat data sumber untuk update. Batal."); return
-    my_store_name = "DB KLIK"
-    my_store_df = source_df[source_df['Toko'] == my_store_name]
-    competitor_df = source_df[source_df['Toko'] != my_store_name]
-    if my_store_df.empty or competitor_df.empty:
-        with placeholder.container(): st.warning("Data toko Anda atau kompetitor tidak cukup."); return
-    competitor_products_list = competitor_df['Nama Produk'].unique().tolist()
-    all_matches = []
-    total = len(my_store_df)
-    for i, (_, row) in enumerate(my_store_df.iterrows()):
-        prog.progress(int((i / total) * 80), text=f"Mencocokkan produk {i+1}/{total}")
-        matches = process.extract(row['Nama Produk'], competitor_products_list, scorer=fuzz.token_set_ratio, limit=5, score_cutoff=score_cutoff)
-        for match_name, score, _ in matches:
-            matched_rows = competitor_df[competitor_df['Nama Produk'] == match_name]
-            for _, mrow in matched_rows.iterrows():
-                all_matches.append({'Produk Toko Saya': row['Nama Produk'], 'Harga Toko Saya': int(row['Harga']), 'Produk Kompetitor': match_name, 'Harga Kompetitor': int(mrow['Harga']), 'Toko Kompetitor': mrow['Toko'], 'Skor Kemiripan': int(score), 'Tanggal_Update': datetime.now().strftime('%Y-%m-%d')})
-    prog.progress(90, text="Menyimpan hasil...")
-    try:
-        spreadsheet = gc.open_by_key(spreadsheet_key)
-        try:
-            worksheet = spreadsheet.worksheet("HASIL_MATCHING")
-            worksheet.clear()
-        except gspread.exceptions.WorksheetNotFound:
-            worksheet = spreadsheet.add_worksheet(title="HASIL_MATCHING", rows=1, cols=1)
-        if all_matches:
-            results_df = pd.DataFrame(all_matches)
-            set_with_dataframe(worksheet, results_df, resize=True)
-            with placeholder.container(): st.success(f"Selesai: {len(results_df)} baris hasil disimpan.")
-        else:
-            with placeholder.container(): st.warning("Tidak ditemukan pasangan produk yang cocok.")
-    except Exception as e:
-        with placeholder.container(): st.error(f"Gagal menyimpan hasil: {e}")
+JOB_POLL_SECONDS = 3
+
+def submit_price_update(spreadsheet_key, score_cutoff, incremental, use_blocking):
+    # Pembaruan dijalankan worker.py di proses terpisah; dashboard hanya mengirim job
+    job, created = jobs.submit_job({'spreadsheet_key': spreadsheet_key, 'score_cutoff': score_cutoff,
+                                    'incremental': incremental, 'use_blocking': use_blocking})
+    if created: st.sidebar.info("Pembaruan dikirim ke worker latar belakang.")
+    else: st.sidebar.info(f"Pembaruan masih {job['status']} (dimulai {job['created_at']}); job baru tidak dibuat.")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def show_update_status(spreadsheet_key):
+    job = jobs.latest_job(spreadsheet_key)
+    if job is None: return
+    if job['status'] in jobs.ACTIVE_STATUSES:
+        st.progress(min(int(job.get('progress', 0)), 100), text=job.get('pesan', ''))
+        return
+    result = job.get('hasil') or {}
+    if job['status'] == 'selesai': st.success(job.get('pesan', ''))
+    elif job['status'] == 'kosong': st.warning(job.get('pesan', ''))
+    else: st.error(job.get('pesan', ''))
+    write_report = result.get('penulisan')
+    if write_report:
+        st.caption(f"Penulisan diff: {write_report['diperbarui']} diperbarui, {write_report['ditambah']} ditambah, {write_report['dihapus']} dihapus, {write_report['tetap']} tetap ({write_report['api_calls']} panggilan API, {write_report['detik']:.1f} detik).")
+    if result.get('peringatan'): st.warning(result['peringatan'])
+    recall = result.get('recall')
+    if recall is not None:
+        scope = {'penuh': "semua produk", 'produk_baru': "produk baru", 'terjadwal': "semua produk, terjadwal"}.get(recall.get('cakupan'), "semua produk")
+        source = "hasil tersimpan, " if recall.get('tersimpan') else ""
+        st.caption(f"Recall blocking terakhir: {recall['recall']:.1%} ({source}sampel {recall['sampel']} {scope}, diukur {recall.get('diukur_pada', '-')}).")
+    if recall is not None and recall['recall'] < 1:
+        st.warning(f"Recall blocking {recall['recall']:.1%} pada sampel {recall['sampel']} produk; {len(recall['hilang'])} pasangan terlewat dibanding brute force.")
+        st.dataframe(pd.DataFrame(recall['hilang'], columns=['Produk Toko Saya', 'Produk Kompetitor', 'Skor Kemiripan']), hide_index=True)
+    # Job yang baru selesai: muat ulang HASIL_MATCHING sekali per sesi
+    if job['status'] in ('selesai', 'kosong') and st.session_state.get('applied_job') != job['id']:
+        st.session_state.applied_job = job['id']
+        # Worker sudah membaca ulang HASIL_MATCHING ke snapshot; tidak ada panggilan API di sini
+        loaded = SnapshotBackend(spreadsheet_key).load_frame('matches')
+        if st.session_state.get('data_loaded') and loaded is not None:
+            new_matches_df, manifest = loaded
+            version = f"{spreadsheet_key}@{manifest['generation']}"
+            base = STORE.latest(spreadsheet_key) or st.session_state.dataset
+            st.session_state.dataset = STORE.get(version) or STORE.with_matches(base, version, check_matches_header(new_matches_df))
+            st.rerun()
 
 # ================================
 # FUNGSI-FUNGSI PEMBANTU (UTILITY)
 # ================================
-def format_wow_growth(pct_change):
-    if pd.isna(pct_change) or pct_change == float('inf'): return "N/A"
-    elif pct_change > 0.001: return f"▲ {pct_change:.1%}"
-    elif pct_change < -0.001: return f"▼ {pct_change:.1%}"
-    else: return f"▬ 0.0%"
-
-def style_wow_growth(val):
-    color = 'black'
-    if isinstance(val, str):
-        if '▲' in val: color = 'green'
-        elif '▼' in val: color = 'red'
-    return f'color: {color}'
+DERIVED_CACHE_ENTRIES = 16
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner="Memuat riwayat lama dari snapshot...")
+def history_range(data_version, spreadsheet_key, first_month, last_month):
+    # Rentang di luar jendela memori: hanya partisi bulan first_month..last_month yang dibaca
+    loaded = SnapshotBackend(spreadsheet_key).load_frame('rekap', first_month, last_month)
+    if loaded is None: return None
+    return loaded[0], build_rollups(loaded[0])
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner="Menghitung agregat seluruh riwayat dari snapshot...")
+def history_aggregate(data_version, spreadsheet_key, name):
+    # Agregat seluruh riwayat dijawab SQLite (cermin snapshot), tanpa memuat baris mentah ke memori
+    store = SnapshotBackend(spreadsheet_key).sql_store()
+    return None if store is None else getattr(store, name)()
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner=False)
+def derived_frames(data_version, start_date, end_date, _df):
+    # Dibagi antar-rerun & sesi per (versi data, rentang tanggal); frame hasilnya tidak boleh diubah
+    return build_derived_frames(_df, start_date, end_date)
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner=False)
+def range_rollups(data_version, start_date, end_date, _rollups, _df_filtered, _competitor_latest_overall):
+    return build_range_rollups(_rollups, _df_filtered, _competitor_latest_overall, start_date, end_date)
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner=False)
+def match_index(matches_version, _matches_df):
+    return build_match_index(_matches_df)
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner=False)
+def store_latest_products_cached(data_version, _df):
+    return store_latest_products(_df)
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner=False)
+def comparison_lookup(data_version, start_date, end_date, _df_filtered, _competitor_latest_overall, _store_products):
+    return build_comparison_lookup(_df_filtered, _competitor_latest_overall, _store_products['Nama Produk'].unique())
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner=False)
+def presence_map(data_version, start_date, end_date, _df_filtered):
+    return build_presence(_df_filtered)
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner=False)
+def hpp_lookup(database_version, _db_df):
+    # Dibangun sekali per isi DATABASE; tidak ikut dibangun ulang saat hanya REKAP yang bertambah
+    return build_hpp_lookup(_db_df)
+
+@st.cache_resource(max_entries=DERIVED_CACHE_ENTRIES, show_spinner="Menghitung riwayat margin dari seluruh riwayat...")
+def margin_history(data_version, database_version, spreadsheet_key, loaded_from, _df, _hpp_lookup):
+    # Seluruh riwayat toko sendiri: rekap di memori jika lengkap, selain itu partisi toko tersebut di snapshot lokal
+    store_rows = _df[_df['Toko'] == MY_STORE_NAME]
+    if loaded_from is not None:
+        loaded = SnapshotBackend(spreadsheet_key).load_frame('rekap', stores=[MY_STORE_NAME])
+        if loaded is not None: store_rows = loaded[0]
+    return build_margin_history(store_rows, _hpp_lookup)
 
 @st.cache_data
 def convert_df_for_download(df):
     return df.to_csv(index=False).encode('utf-8')
 
-def format_rupiah(val):
-    if pd.isna(val) or not isinstance(val, (int, float, np.number)):
-        return "N/A"
-    return f"Rp {int(val):,}"
-
 # ================================
 # APLIKASI UTAMA (MAIN APP)
 # ================================
 st.title("📊 Dashboard Analisis Penjualan & Bisnis")
 
 SPREADSHEET_KEY = "1hl7YPEPg4aaEheN5fBKk65YX3"
+diagnostics = begin_run_trace()
 gc = connect_to_gsheets()
 
 # --- Tombol untuk memuat data di awal ---
@@ -238,20 +297,34 @@ if not st.session_state.data_loaded:
     _, col_center, _ = st.columns([2, 3, 2])
     with col_center:
         if st.button("Tarik Data & Mulai Analisis 🚀", type="primary"):
-            df, db_df, matches_df = load_all_data(SPREADSHEET_KEY)
-            if df is not None and not df.empty and db_df is not None:
-                st.session_state.df, st.session_state.db_df, st.session_state.matches_df = df, db_df, matches_df
+            dataset = load_all_data(SPREADSHEET_KEY)
+            if dataset is not None and not dataset.rekap.empty and dataset.database is not None:
+                st.session_state.dataset = dataset
                 st.session_state.data_loaded = True
                 st.rerun()
             else:
                 st.error("Gagal memuat data. Periksa akses Google Sheets dan pastikan sheet 'DATABASE' ada.")
     st.info("👆 Klik tombol untuk menarik semua data yang diperlukan untuk analisis.")
+    show_diagnostics(diagnostics)
     st.stop()
 
-# Ambil data dari session state
-df = st.session_state.df
-db_df = st.session_state.db_df if 'db_df' in st.session_state else pd.DataFrame()
-matches_df = st.session_state.matches_df if 'matches_df' in st.session_state else pd.DataFrame()
+# Ambil data dari dataset bersama; session state hanya memegang handle-nya (frame read-only)
+dataset = st.session_state.dataset
+df = dataset.rekap
+db_df = dataset.database if dataset.database is not None else pd.DataFrame()
+matches_df = dataset.matches if dataset.matches is not None else pd.DataFrame()
+
+def rekap_for_range(start_date, end_date):
+    # Rentang di dalam jendela memori memakai dataset.rekap; rentang yang lebih lama memuat partisi bulannya
+    loaded_from = dataset.history.get('loaded_from')
+    if loaded_from is None or pd.Timestamp(start_date) >= loaded_from:
+        return dataset.rekap, dataset.rollups
+    first_month, last_month = (pd.Timestamp(d).to_period('M').to_timestamp() for d in (start_date, end_date))
+    loaded = history_range(dataset.rekap_version, dataset.spreadsheet_key, first_month, last_month)
+    if loaded is None:
+        st.sidebar.warning("Riwayat lama tidak tersedia di snapshot lokal; hanya jendela data terbaru yang dianalisis.")
+        return dataset.rekap, dataset.rollups
+    return loaded
 
 # ================================
 # SIDEBAR (KONTROL UTAMA)
@@ -261,45 +334,72 @@ app_mode = st.sidebar.radio(
     "Pilih Tampilan:",
     ("Tab Analisis", "HPP Produk")
 )
+load_report = dataset.report
+if load_report.get('snapshot'):
+    st.sidebar.caption(f"Snapshot lokal: {load_report['snapshot']}")
+if st.sidebar.button("🔄 Segarkan Data (Baris Baru Saja)"):
+    new_dataset = refresh_all_data(SPREADSHEET_KEY)
+    if new_dataset is not None and not new_dataset.rekap.empty:
+        st.session_state.dataset = new_dataset
+        st.rerun()
 st.sidebar.divider()
 
 if app_mode == "Tab Analisis":
     st.sidebar.header("Kontrol & Filter Analisis")
-    min_date, max_date = df['Tanggal'].min().date(), df['Tanggal'].max().date()
-    selected_date_range = st.sidebar.date_input("Rentang Tanggal:", [min_date, max_date], min_value=min_date, max_value=max_date)
+    history = dataset.history
+    min_date, max_date = history['date_min'].date(), history['date_max'].date()
+    default_start = max(min_date, history['loaded_from'].date()) if history['loaded_from'] is not None else min_date
+    selected_date_range = st.sidebar.date_input("Rentang Tanggal:", [default_start, max_date], min_value=min_date, max_value=max_date)
     if len(selected_date_range) != 2: st.sidebar.warning("Pilih 2 tanggal."); st.stop()
     start_date, end_date = selected_date_range
+    range_df, range_rollups_source = rekap_for_range(start_date, end_date)
     accuracy_cutoff = st.sidebar.slider("Tingkat Akurasi Pencocokan (%)", 80, 100, 91, 1)
+    incremental_matching = st.sidebar.checkbox("Pencocokan inkremental (pakai cache skor)", value=True, help="Hanya produk & nama kompetitor yang baru/berubah yang diskor ulang.")
+    blocking_matching = st.sidebar.checkbox("Blocking token (lebih cepat, recall bisa < 100%)", value=False, help="Hanya pasangan yang berbagi token/ukuran yang diskor. Nonaktif = brute force, semua pasangan diskor.")
 
-    latest_source_date = df['Tanggal'].max().date()
+    latest_source_date = max_date
     last_destination_update = datetime(1970, 1, 1).date()
     if not matches_df.empty and 'Tanggal_Update' in matches_df.columns:
-        matches_df['Tanggal_Update'] = pd.to_datetime(matches_df['Tanggal_Update'], errors='coerce')
-        if not matches_df['Tanggal_Update'].isna().all():
-            last_destination_update = matches_df['Tanggal_Update'].max().date()
+        update_dates = pd.to_datetime(matches_df['Tanggal_Update'], errors='coerce')
+        if not update_dates.isna().all():
+            last_destination_update = update_dates.max().date()
     st.sidebar.info(f"Data Sumber Terbaru: **{latest_source_date.strftime('%d %b %Y')}**")
     st.sidebar.info(f"Perbandingan Terakhir: **{last_destination_update.strftime('%d %b %Y')}**")
     if latest_source_date > last_destination_update:
         st.sidebar.warning("Data sumber lebih baru dari hasil perbandingan.")
         if st.sidebar.button("Perbarui Sekarang 🚀", type="primary"):
-            run_price_comparison_update(gc, SPREADSHEET_KEY, score_cutoff=accuracy_cutoff)
-            _, _, new_matches_df = load_all_data(SPREADSHEET_KEY)
-            st.session_state.matches_df = new_matches_df
-            st.success("Pembaruan selesai."); st.rerun()
+            submit_price_update(SPREADSHEET_KEY, accuracy_cutoff, incremental_matching, blocking_matching)
     else:
         st.sidebar.success("Data perbandingan sudah terbaru.")
     if st.sidebar.button("Jalankan Pembaruan Manual", type="secondary"):
-        run_price_comparison_update(gc, SPREADSHEET_KEY, score_cutoff=accuracy_cutoff)
-        _, _, new_matches_df = load_all_data(SPREADSHEET_KEY)
-        st.session_state.matches_df = new_matches_df
-        st.success("Pembaruan manual selesai."); st.rerun()
+        submit_price_update(SPREADSHEET_KEY, accuracy_cutoff, incremental_matching, blocking_matching)
+    with st.sidebar:
+        show_update_status(SPREADSHEET_KEY)
 
     st.sidebar.divider()
-    df_filtered_export = df[(df['Tanggal'].dt.date >= start_date) & (df['Tanggal'].dt.date <= end_date)]
+    df_filtered_export = range_df[(range_df['Tanggal'] >= pd.Timestamp(start_date)) & (range_df['Tanggal'] < pd.Timestamp(end_date) + pd.Timedelta(days=1))]
     st.sidebar.header("Ekspor & Info")
     st.sidebar.info(f"Baris data dalam rentang: **{len(df_filtered_export)}**")
     csv_data = convert_df_for_download(df_filtered_export)
     st.sidebar.download_button("📥 Unduh CSV (Filter)", data=csv_data, file_name=f'analisis_{start_date}_{end_date}.csv', mime='text/csv')
+    if load_report:
+        with st.sidebar.expander("⏱️ Waktu Pemuatan per Sheet"):
+            st.caption(f"Mode: {load_report.get('mode', '-')} | Total: {load_report.get('total_detik', 0):.1f} detik, {load_report.get('api_calls', 0)} panggilan API")
+            if load_report.get('timings'):
+                st.dataframe(pd.DataFrame(load_report['timings']), use_container_width=True, hide_index=True)
+                st.caption("Detik = bagian sheet dari waktu permintaan batch-nya (proporsional jumlah sel) + waktu parse. Sheet dengan nomor batch yang sama diambil dalam satu permintaan.")
+            client_stats = getattr(getattr(gc, 'http_client', None), 'stats', None)
+            if client_stats:
+                st.caption(f"Klien Sheets bersama: {client_stats['dikirim']} permintaan dikirim, {client_stats['digabung']} digabung, "
+                           f"{client_stats['diulang']} diulang, {client_stats['menunggu_kuota_detik']:.1f} detik menunggu kuota")
+        if load_report.get('memori'):
+            with st.sidebar.expander("🧮 Memori Data per Kolom"):
+                memory_df = pd.DataFrame(load_report['memori'])
+                st.caption(f"Total: {memory_df['sebelum_mb'].sum():.1f} MB sebelum → {memory_df['sesudah_mb'].sum():.1f} MB sesudah skema ringkas (per salinan data)")
+                st.dataframe(memory_df, use_container_width=True, hide_index=True, column_config={
+                    'sebelum_mb': st.column_config.NumberColumn("Sebelum (MB)", format="%.2f"),
+                    'sesudah_mb': st.column_config.NumberColumn("Sesudah (MB)", format="%.2f"),
+                })
 else: # Untuk mode HPP
     st.sidebar.info("Tampilan ini menganalisis harga jual produk Anda dibandingkan dengan Harga Pokok Penjualan (HPP) dari sheet 'DATABASE'.")
 
@@ -307,337 +407,303 @@ else: # Untuk mode HPP
 # ================================
 # PERSIAPAN DATA UNTUK TABS
 # ================================
-df_filtered = df.copy()
-if app_mode == "Tab Analisis":
-    start_date_dt, end_date_dt = pd.to_datetime(start_date), pd.to_datetime(end_date)
-    df_filtered = df[(df['Tanggal'] >= start_date_dt) & (df['Tanggal'] <= end_date_dt)].copy()
-
+with instrumentation.span("derived.frames"):
+    if app_mode == "Tab Analisis":
+        frames = derived_frames(dataset.rekap_version, start_date, end_date, range_df)
+    else:
+        # HPP hanya memakai baris terbaru per produk: cukup tabel kecil "terbaru per produk", bukan riwayat
+        frames = derived_frames(dataset.rekap_version, None, None, dataset.latest)
+df_filtered = frames['df_filtered']
 if df_filtered.empty: 
     st.error("Tidak ada data di rentang tanggal yang dipilih (jika pada Tab Analisis)."); st.stop()
 
-df_filtered['Minggu'] = df_filtered['Tanggal'].dt.to_period('W-SUN').apply(lambda p: p.start_time).dt.date
-my_store_name = "DB KLIK"
-main_store_df = df_filtered[df_filtered['Toko'] == my_store_name]
-competitor_df = df_filtered[df_filtered['Toko'] != my_store_name]
+my_store_name = MY_STORE_NAME
+main_store_df, competitor_df = frames['main_store_df'], frames['competitor_df']
+latest_entries_overall = frames['latest_entries_overall']
+main_store_latest_overall, competitor_latest_overall = frames['main_store_latest_overall'], frames['competitor_latest_overall']
 
-latest_entries_weekly = df_filtered.loc[df_filtered.groupby(['Minggu', 'Toko', 'Nama Produk'])['Tanggal'].idxmax()]
-latest_entries_overall = df_filtered.loc[df_filtered.groupby(['Toko', 'Nama Produk'])['Tanggal'].idxmax()]
-main_store_latest_overall = latest_entries_overall[latest_entries_overall['Toko'] == my_store_name]
-competitor_latest_overall = latest_entries_overall[latest_entries_overall['Toko'] != my_store_name]
-
-# =========================================================================================
-# ================================ TAMPILAN KONTEN UTAMA ================================
-# =========================================================================================
+# ================================
+# RENDER TAB ANALISIS
+# ================================
+def analysis_rollups():
+    # Tabel kecil dari rollup per versi data; hanya minggu di batas rentang yang dihitung dari baris mentah
+    return range_rollups(dataset.rekap_version, start_date, end_date, range_rollups_source, df_filtered, competitor_latest_overall)
+
+def full_history_aggregate(name, key):
+    # Pilihan "seluruh riwayat" hanya jika snapshot lokal ada; None berarti pakai rentang terpilih
+    if dataset.history.get('loaded_from') is None: return None
+    if not st.toggle("Seluruh riwayat (agregat SQL dari snapshot lokal)", key=key): return None
+    result = history_aggregate(dataset.rekap_version, dataset.spreadsheet_key, name)
+    if result is None: st.warning("Snapshot lokal tidak tersedia; menampilkan rentang tanggal terpilih.")
+    return result
+
+TAB_LABELS = ["⭐ Analisis Toko Saya", "⚖️ Perbandingan Harga", "🏆 Analisis Brand Kompetitor", "📦 Status Stok Produk", "📈 Kinerja Penjualan", "📊 Analisis Mingguan"]
+
+def tab_fragment(render):
+    # Tiap tab adalah fragment: widget di dalamnya hanya me-rerun tab itu sendiri
+    @st.fragment
+    @functools.wraps(render)
+    def run_tab():
+        started = time.perf_counter()
+        # Rerun fragment saja tidak melewati awal script: ukur dalam trace sendiri
+        fragment_trace = None if instrumentation.active() else instrumentation.start_trace("fragment", enabled=diagnostics_enabled())
+        with instrumentation.span(f"tab.{render.__name__}"):
+            render()
+        remember_trace(instrumentation.finish_trace(fragment_trace))
+        st.caption(f"⏱️ Tab dirender dalam {time.perf_counter() - started:.2f} detik")
+    return run_tab
+
+@tab_fragment
+def render_tab1():
+    # Tab 1: Analisis Toko Saya
+    st.header(f"Analisis Kinerja Toko: {my_store_name}")
+    
+    section_counter = 1
 
-if app_mode == "Tab Analisis":
-    st.header("📈 Tampilan Analisis Penjualan & Kompetitor")
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["⭐ Analisis Toko Saya", "⚖️ Perbandingan Harga", "🏆 Analisis Brand Kompetitor", "📦 Status Stok Produk", "📈 Kinerja Penjualan", "📊 Analisis Mingguan"])
+    st.subheader(f"{section_counter}. Analisis Kategori Terlaris (Berdasarkan Omzet)")
+    section_counter += 1
     
-    # KODE UNTUK SEMUA TAB DARI VERSI SEBELUMNYA TETAP SAMA DI SINI
-    with tab1:
-        st.header(f"Analisis Kinerja Toko: {my_store_name}")
+    if 'KATEGORI' in main_store_latest_overall.columns:
+        main_store_cat, category_sales = category_omzet(main_store_latest_overall)
         
-        section_counter = 1
+        if not category_sales.empty:
+            cat_sales_sorted = category_sales.head(10)
+            fig_cat = px.bar(cat_sales_sorted, x='KATEGORI', y='Omzet', title='Top 10 Kategori Berdasarkan Omzet', text_auto='.2s')
+            st.plotly_chart(fig_cat, use_container_width=True)
 
-        st.subheader(f"{section_counter}. Analisis Kategori Terlaris (Berdasarkan Omzet)")
-        section_counter += 1
-        
-        if 'KATEGORI' in main_store_latest_overall.columns:
-            main_store_cat = main_store_latest_overall.copy()
-            main_store_cat['KATEGORI'] = main_store_cat['KATEGORI'].replace('', 'Lainnya').fillna('Lainnya')
+            st.markdown("##### Rincian Data Omzet per Kategori")
+            st.dataframe(cat_sales_sorted, use_container_width=True, hide_index=True, column_config=rupiah_columns(['Omzet']))
+
+            st.markdown("---")
+            st.subheader("Lihat Produk Terlaris per Kategori")
             
-            category_sales = main_store_cat.groupby('KATEGORI')['Omzet'].sum().reset_index()
+            category_list = category_sales['KATEGORI'].tolist()
             
-            if not category_sales.empty:
-                cat_sales_sorted = category_sales.sort_values('Omzet', ascending=False).head(10)
-                fig_cat = px.bar(cat_sales_sorted, x='KATEGORI', y='Omzet', title='Top 10 Kategori Berdasarkan Omzet', text_auto='.2s')
-                st.plotly_chart(fig_cat, use_container_width=True)
-
-                st.markdown("##### Rincian Data Omzet per Kategori")
-                table_cat_sales = cat_sales_sorted.copy()
-                table_cat_sales['Omzet'] = table_cat_sales['Omzet'].apply(lambda x: f"Rp {int(x):,.0f}")
-                st.dataframe(table_cat_sales, use_container_width=True, hide_index=True)
-
-                st.markdown("---")
-                st.subheader("Lihat Produk Terlaris per Kategori")
-                
-                category_list = category_sales.sort_values('Omzet', ascending=False)['KATEGORI'].tolist()
-                
-                selected_category = st.selectbox(
-                    "Pilih Kategori untuk melihat produk terlaris:",
-                    options=category_list
-                )
+            selected_category = st.selectbox(
+                "Pilih Kategori untuk melihat produk terlaris:",
+                options=category_list
+            )
 
-                if selected_category:
-                    products_in_category = main_store_cat[main_store_cat['KATEGORI'] == selected_category].copy()
-                    top_products_in_category = products_in_category.sort_values('Terjual per Bulan', ascending=False)
+            if selected_category:
+                top_products_in_category = top_products(main_store_cat[main_store_cat['KATEGORI'] == selected_category])
 
-                    if top_products_in_category.empty:
-                        st.info(f"Tidak ada produk terlaris untuk kategori '{selected_category}'.")
-                    else:
-                        columns_to_display = ['Nama Produk', 'SKU', 'Harga', 'Terjual per Bulan', 'Omzet']
-                        if 'SKU' not in top_products_in_category.columns:
-                            top_products_in_category['SKU'] = 'N/A'
-                        
-                        display_table = top_products_in_category[columns_to_display].copy()
-                        display_table['Harga'] = display_table['Harga'].apply(lambda x: f"Rp {int(x):,.0f}")
-                        display_table['Omzet'] = display_table['Omzet'].apply(lambda x: f"Rp {int(x):,.0f}")
-                        
-                        st.dataframe(display_table, use_container_width=True, hide_index=True)
-            else:
-                st.info("Tidak ada data omzet per kategori untuk ditampilkan.")
+                if top_products_in_category.empty:
+                    st.info(f"Tidak ada produk terlaris untuk kategori '{selected_category}'.")
+                else:
+                    columns_to_display = ['Nama Produk', 'SKU', 'Harga', 'Terjual per Bulan', 'Omzet']
+                    
+                    st.dataframe(top_products_in_category[columns_to_display], use_container_width=True, hide_index=True,
+                                 column_config=rupiah_columns(['Harga', 'Omzet']))
         else:
-            st.warning("Kolom 'KATEGORI' tidak ditemukan pada data toko Anda. Analisis ini dilewati.")
-
-        st.subheader(f"{section_counter}. Produk Terlaris")
-        section_counter += 1
-        top_products = main_store_latest_overall.sort_values('Terjual per Bulan', ascending=False).head(15).copy()
-        top_products['Harga_rp'] = top_products['Harga'].apply(lambda x: f"Rp {int(x):,.0f}")
-        top_products['Omzet_rp'] = top_products['Omzet'].apply(lambda x: f"Rp {int(x):,.0f}")
-        
-        display_cols_top = ['Nama Produk', 'SKU', 'Harga_rp', 'Omzet_rp', 'Terjual per Bulan']
-        if 'SKU' not in top_products.columns:
-            top_products['SKU'] = 'N/A'
+            st.info("Tidak ada data omzet per kategori untuk ditampilkan.")
+    else:
+        st.warning("Kolom 'KATEGORI' tidak ditemukan pada data toko Anda. Analisis ini dilewati.")
+
+    st.subheader(f"{section_counter}. Produk Terlaris")
+    section_counter += 1
+    top_products_main = top_products(main_store_latest_overall, TOP_PRODUCTS)
+    display_cols_top = ['Nama Produk', 'SKU', 'Harga', 'Omzet', 'Terjual per Bulan']
+    st.dataframe(top_products_main[display_cols_top], use_container_width=True, hide_index=True, column_config=rupiah_columns(['Harga', 'Omzet']))
+
+    st.subheader(f"{section_counter}. Distribusi Omzet Brand")
+    section_counter += 1
+    brand_omzet_main = brand_omzet(main_store_latest_overall)
+    if not brand_omzet_main.empty:
+        fig_brand_pie = px.pie(brand_omzet_main.head(7), 
+                             names='Brand', values='Omzet', title='Distribusi Omzet Top 7 Brand (Snapshot Terakhir)')
         
-        display_df_top = top_products[display_cols_top].rename(
-            columns={'Harga_rp': 'Harga', 'Omzet_rp': 'Omzet'}
-        )
-        st.dataframe(display_df_top, use_container_width=True, hide_index=True)
-
-        st.subheader(f"{section_counter}. Distribusi Omzet Brand")
-        section_counter += 1
-        brand_omzet_main = main_store_latest_overall.groupby('Brand')['Omzet'].sum().reset_index()
-        if not brand_omzet_main.empty:
-            fig_brand_pie = px.pie(brand_omzet_main.sort_values('Omzet', ascending=False).head(7), 
-                                 names='Brand', values='Omzet', title='Distribusi Omzet Top 7 Brand (Snapshot Terakhir)')
-            
-            fig_brand_pie.update_traces(
-                textposition='outside',
-                texttemplate='%{label}<br><b>Rp %{value:,.0f}</b><br>(%{percent})',
-                insidetextfont=dict(color='white')
-            )
-            fig_brand_pie.update_layout(showlegend=False)
-            
-            st.plotly_chart(fig_brand_pie, use_container_width=True)
-        else:
-            st.info("Tidak ada data omzet brand.")
-
-        st.subheader(f"{section_counter}. Ringkasan Kinerja Mingguan (WoW Growth)")
-        section_counter += 1
-        main_store_latest_weekly = main_store_df.loc[main_store_df.groupby(['Minggu', 'Nama Produk'])['Tanggal'].idxmax()]
-        weekly_summary_tab1 = main_store_latest_weekly.groupby('Minggu').agg(
-            Omzet=('Omzet', 'sum'), Penjualan_Unit=('Terjual per Bulan', 'sum')
-        ).reset_index().sort_values('Minggu')
-        weekly_summary_tab1['Pertumbuhan Omzet (WoW)'] = weekly_summary_tab1['Omzet'].pct_change().apply(format_wow_growth)
-        weekly_summary_tab1['Omzet'] = weekly_summary_tab1['Omzet'].apply(lambda x: f"Rp {x:,.0f}")
-        st.dataframe(
-            weekly_summary_tab1[['Minggu', 'Omzet', 'Penjualan_Unit', 'Pertumbuhan Omzet (WoW)']].style.applymap(
-                style_wow_growth, subset=['Pertumbuhan Omzet (WoW)']
-            ), use_container_width=True, hide_index=True
+        fig_brand_pie.update_traces(
+            textposition='outside',
+            texttemplate='%{label}<br><b>Rp %{value:,.0f}</b><br>(%{percent})',
+            insidetextfont=dict(color='white')
         )
-
-    with tab2:
-        st.header(f"Perbandingan Produk '{my_store_name}' dengan Kompetitor")
-        st.info("Perbandingan menggunakan data produk terbaru dari toko Anda yang cocok dengan data kompetitor terakhir.")
+        fig_brand_pie.update_layout(showlegend=False)
         
-        df_main_store_unfiltered = df[df['Toko'] == my_store_name]
-        latest_date_in_db_klik = df_main_store_unfiltered['Tanggal'].max()
-        latest_products_df = df_main_store_unfiltered[df_main_store_unfiltered['Tanggal'] == latest_date_in_db_klik].copy()
+        st.plotly_chart(fig_brand_pie, use_container_width=True)
+    else:
+        st.info("Tidak ada data omzet brand.")
+
+    st.subheader(f"{section_counter}. Ringkasan Kinerja Mingguan (WoW Growth)")
+    section_counter += 1
+    weekly_summary_tab1 = weekly_growth(analysis_rollups()['main_weekly'])
+    st.dataframe(
+        weekly_summary_tab1[['Minggu', 'Omzet', 'Penjualan_Unit', 'Pertumbuhan Omzet (WoW)']].style.apply(
+            wow_growth_colors, subset=['Pertumbuhan Omzet (WoW)']
+        ), use_container_width=True, hide_index=True, column_config={'Minggu': WEEK_COLUMN, 'Omzet': rupiah_column()}
+    )
+
+@tab_fragment
+def render_tab2():
+    # Tab 2: Perbandingan Harga
+    st.header(f"Perbandingan Produk '{my_store_name}' dengan Kompetitor")
+    st.info("Perbandingan menggunakan data produk terbaru dari toko Anda yang cocok dengan data kompetitor terakhir.")
+    
+    latest_products_df = store_latest_products_cached(dataset.rekap_version, df)
+    
+    brand_list = sorted(latest_products_df['Brand'].unique())
+    selected_brand = st.selectbox("Filter berdasarkan Brand:", ["Semua Brand"] + brand_list, key="brand_select_compare")
+    
+    if selected_brand != "Semua Brand":
+        products_to_show_df = latest_products_df[latest_products_df['Brand'] == selected_brand]
+    else:
+        products_to_show_df = latest_products_df
         
-        brand_list = sorted(latest_products_df['Brand'].unique())
-        selected_brand = st.selectbox("Filter berdasarkan Brand:", ["Semua Brand"] + brand_list, key="brand_select_compare")
+    product_list = sorted(products_to_show_df['Nama Produk'].unique())
+    selected_product = st.selectbox("Pilih produk dari toko Anda:", product_list, key="product_select_compare")
+
+    if selected_product:
+        product_info_list = latest_products_df[latest_products_df['Nama Produk'] == selected_product]
         
-        if selected_brand != "Semua Brand":
-            products_to_show_df = latest_products_df[latest_products_df['Brand'] == selected_brand]
-        else:
-            products_to_show_df = latest_products_df
+        if not product_info_list.empty:
+            product_info = product_info_list.iloc[0]
+            st.markdown(f"**Produk Pilihan Anda:** *{product_info['Nama Produk']}*")
             
-        product_list = sorted(products_to_show_df['Nama Produk'].unique())
-        selected_product = st.selectbox("Pilih produk dari toko Anda:", product_list, key="product_select_compare")
+            lookup = comparison_lookup(dataset.rekap_version, start_date, end_date, df_filtered, competitor_latest_overall, latest_products_df)
+            comparison = compare_product(match_index(dataset.version, matches_df), lookup, competitor_latest_overall,
+                                         product_info, accuracy_cutoff, my_store_name)
 
-        if selected_product:
-            product_info_list = latest_products_df[latest_products_df['Nama Produk'] == selected_product]
+            col1, col2, col3 = st.columns(3)
             
-            if not product_info_list.empty:
-                product_info = product_info_list.iloc[0]
-                st.markdown(f"**Produk Pilihan Anda:** *{product_info['Nama Produk']}*")
-                
-                matches_for_product = matches_df[
-                    (matches_df['Produk Toko Saya'] == selected_product) &
-                    (matches_df['Skor Kemiripan'] >= accuracy_cutoff)
-                ].sort_values(by='Skor Kemiripan', ascending=False)
+            product_stats = comparison['stats']
+            if product_stats is not None:
+                col1.metric("Harga Rata-Rata (Semua Toko)", f"Rp {int(product_stats['Harga Rata-Rata']):,}")
+                col3.metric("Toko Omzet Tertinggi", f"{product_stats['Toko']}", f"Rp {int(product_stats['Omzet']):,}")
+            else:
+                col1.metric("Harga Rata-Rata (Semua Toko)", "N/A")
+                col3.metric("Toko Omzet Tertinggi", "N/A")
 
-                col1, col2, col3 = st.columns(3)
-                
-                all_occurrences = df_filtered[df_filtered['Nama Produk'] == selected_product]
-                if not all_occurrences.empty:
-                    avg_price = all_occurrences['Harga'].mean()
-                    col1.metric("Harga Rata-Rata (Semua Toko)", f"Rp {int(avg_price):,}")
-                    
-                    top_store_row = all_occurrences.loc[all_occurrences['Omzet'].idxmax()]
-                    top_store_name = top_store_row['Toko']
-                    top_omzet = top_store_row['Omzet']
-                    col3.metric("Toko Omzet Tertinggi", f"{top_store_name}", f"Rp {int(top_omzet):,}")
-                else:
-                    col1.metric("Harga Rata-Rata (Semua Toko)", "N/A")
-                    col3.metric("Toko Omzet Tertinggi", "N/A")
+            total_competitor_stores = len(competitor_df['Toko'].unique())
+            ready_count = comparison['ready_stores']
+            oot_count = total_competitor_stores - ready_count
+            
+            col2.metric(
+                "Status di Kompetitor", 
+                f"Ready: {ready_count} | Habis: {oot_count}", 
+                help=f"Berdasarkan {total_competitor_stores} total toko kompetitor yang dipantau."
+            )
+            
+            st.divider()
 
-                total_competitor_stores = len(competitor_df['Toko'].unique())
-                matched_product_names = matches_for_product['Produk Kompetitor'].unique()
-                matched_products_details = competitor_latest_overall[
-                    competitor_latest_overall['Nama Produk'].isin(matched_product_names)
+            st.subheader("Perbandingan Harga Produk (Termasuk Toko Anda)")
+            comparison_df = comparison['table']
+            if comparison_df is None:
+                st.warning("Tidak ditemukan produk yang cocok di toko kompetitor berdasarkan filter akurasi Anda.")
+            else:
+
+                ordered_cols = [
+                    'Nama Produk Tercantum', 'Toko', 'Harga', 'Selisih Harga', 'Posisi Harga',
+                    'Terjual per Bulan', 'Omzet', 'Skor Kemiripan (%)'
                 ]
                 
-                ready_count = matched_products_details[matched_products_details['Status'] == 'Tersedia']['Toko'].nunique()
-                oot_count = total_competitor_stores - ready_count
-                
-                col2.metric(
-                    "Status di Kompetitor", 
-                    f"Ready: {ready_count} | Habis: {oot_count}", 
-                    help=f"Berdasarkan {total_competitor_stores} total toko kompetitor yang dipantau."
-                )
+                st.dataframe(comparison_df[ordered_cols], use_container_width=True, hide_index=True,
+                             column_config=rupiah_columns(['Harga', 'Selisih Harga', 'Omzet']))
+
+@tab_fragment
+def render_tab3():
+    # Tab 3: Analisis Brand Kompetitor
+    st.header("Analisis Brand di Toko Kompetitor")
+    if competitor_df.empty:
+        st.warning("Tidak ada data kompetitor pada rentang tanggal ini.")
+    else:
+        rollup = analysis_rollups()
+        competitor_brands, competitor_stores = rollup['competitor_brands'], rollup['competitor_stores']
+        full_history = full_history_aggregate('brand_breakdown', 'tab3_full_history')
+        if full_history is not None:
+            competitor_brands, competitor_stores = full_history, sorted(full_history['Toko'].unique())
+        for competitor_store in competitor_stores:
+            with st.expander(f"Analisis untuk Kompetitor: **{competitor_store}**"):
+                brand_analysis = competitor_brands[competitor_brands['Toko'] == competitor_store].drop(columns='Toko').sort_values(
+                    "Total_Omzet", ascending=False, kind='mergesort')
                 
-                st.divider()
+                if not brand_analysis.empty:
+                    st.dataframe(brand_analysis.head(10), use_container_width=True, hide_index=True, column_config=rupiah_columns(['Total_Omzet']))
 
-                st.subheader("Perbandingan Harga Produk (Termasuk Toko Anda)")
-                if matches_for_product.empty:
-                    st.warning("Tidak ditemukan produk yang cocok di toko kompetitor berdasarkan filter akurasi Anda.")
+                    fig_pie_comp = px.pie(brand_analysis.head(7), names='Brand', values='Total_Omzet', title=f'Distribusi Omzet Top 7 Brand di {competitor_store} (Snapshot Terakhir)')
+                    st.plotly_chart(fig_pie_comp, use_container_width=True)
                 else:
-                    my_product_info = product_info.copy()
-                    my_price = int(my_product_info['Harga'])
-                    my_terjual = my_product_info.get('Terjual per Bulan', 0)
-                    my_omzet = my_product_info.get('Omzet', 0)
-
-                    comparison_data = [{
-                        'Nama Produk Tercantum': my_product_info['Nama Produk'],
-                        'Toko': f"{my_store_name} (Anda)",
-                        'Harga_num': my_price,
-                        'Selisih Harga': "Rp 0 (Basis)",
-                        'Terjual per Bulan': int(my_terjual) if my_terjual else 0,
-                        'Omzet_num': int(my_omzet) if my_omzet else 0,
-                        'Skor Kemiripan (%)': 100
-                    }]
-
-                    for _, match in matches_for_product.iterrows():
-                        comp_price = int(match['Harga Kompetitor'])
-                        price_diff = comp_price - my_price
-                        
-                        diff_text = f" (Sama)"
-                        if price_diff > 0: diff_text = f" (Lebih Mahal)"
-                        elif price_diff < 0: diff_text = f" (Lebih Murah)"
-
-                        comp_details = competitor_latest_overall[
-                            (competitor_latest_overall['Nama Produk'] == match['Produk Kompetitor']) &
-                            (competitor_latest_overall['Toko'] == match['Toko Kompetitor'])
-                        ]
-                        
-                        terjual = comp_details['Terjual per Bulan'].iloc[0] if not comp_details.empty else 0
-                        omzet = comp_details['Omzet'].iloc[0] if not comp_details.empty else 0
-                        
-                        comparison_data.append({
-                            'Nama Produk Tercantum': match['Produk Kompetitor'],
-                            'Toko': match['Toko Kompetitor'],
-                            'Harga_num': comp_price,
-                            'Selisih Harga': f"Rp {price_diff:,}{diff_text}",
-                            'Terjual per Bulan': int(terjual) if terjual else 0,
-                            'Omzet_num': int(omzet) if omzet else 0,
-                            'Skor Kemiripan (%)': int(match['Skor Kemiripan'])
-                        })
-                    
-                    comparison_df = pd.DataFrame(comparison_data)
-                    comparison_df = comparison_df.sort_values(by='Harga_num', ascending=True).reset_index(drop=True)
-
-                    comparison_df['Harga'] = comparison_df['Harga_num'].apply(lambda x: f"Rp {x:,}")
-                    comparison_df['Omzet'] = comparison_df['Omzet_num'].apply(lambda x: f"Rp {x:,}")
-
-                    ordered_cols = [
-                        'Nama Produk Tercantum', 'Toko', 'Harga', 'Selisih Harga',
-                        'Terjual per Bulan', 'Omzet', 'Skor Kemiripan (%)'
-                    ]
-                    
-                    st.dataframe(comparison_df[ordered_cols], use_container_width=True, hide_index=True)
+                    st.info("Tidak ada data brand untuk toko ini.")
+
+@tab_fragment
+def render_tab4():
+    # Tab 4: Status Stok Produk
+    st.header("Tren Status Stok Mingguan per Toko")
+    stock_trends = analysis_rollups()['stock_trends'].copy()
+    if 'Tersedia' not in stock_trends.columns: stock_trends['Tersedia'] = 0
+    if 'Habis' not in stock_trends.columns: stock_trends['Habis'] = 0
+    stock_trends_melted = stock_trends.melt(id_vars=['Minggu', 'Toko'], value_vars=['Tersedia', 'Habis'], var_name='Tipe Stok', value_name='Jumlah Produk')
+    
+    fig_stock_trends = px.line(stock_trends_melted, x='Minggu', y='Jumlah Produk', color='Toko', line_dash='Tipe Stok', markers=True, title='Jumlah Produk Tersedia vs. Habis per Minggu')
+    st.plotly_chart(fig_stock_trends, use_container_width=True)
+    st.dataframe(stock_trends.set_index('Minggu'), use_container_width=True, column_config={'_index': WEEK_COLUMN})
+
+@tab_fragment
+def render_tab5():
+    # Tab 5: Kinerja Penjualan
+    st.header("Analisis Kinerja Penjualan (Semua Toko)")
+    
+    rollup = analysis_rollups()
+    all_stores_latest_per_week = full_history_aggregate('weekly_omzet', 'tab5_full_history')
+    if all_stores_latest_per_week is None: all_stores_latest_per_week = rollup['weekly_omzet']
+    fig_weekly_omzet = px.line(all_stores_latest_per_week, x='Minggu', y='Omzet', color='Toko', markers=True, title='Perbandingan Omzet Mingguan Antar Toko (Berdasarkan Snapshot Terakhir)')
+    st.plotly_chart(fig_weekly_omzet, use_container_width=True)
+    
+    st.subheader("Tabel Rincian Omzet per Tanggal")
+    if not df_filtered.empty:
+        # Tanggal tanpa omzet dibiarkan kosong (NaN) agar kolom tetap numerik & bisa diurutkan
+        omzet_pivot = rollup['omzet_pivot']
+        omzet_pivot = omzet_pivot.where(omzet_pivot > 0)
+        omzet_pivot.columns = omzet_pivot.columns.strftime('%d %b %Y')
+        omzet_pivot = omzet_pivot.reset_index()
+        st.info("Anda bisa scroll tabel ini ke samping untuk melihat tanggal lainnya.")
+        st.dataframe(omzet_pivot, use_container_width=True, hide_index=True, column_config=rupiah_columns(omzet_pivot.columns[1:]))
+    else:
+        st.warning("Tidak ada data untuk ditampilkan dalam tabel.")
+
+@tab_fragment
+def render_tab6():
+    # Tab 6: Analisis Mingguan
+    st.header("Analisis Produk Baru Mingguan")
+    presence = presence_map(dataset.rekap_version, start_date, end_date, df_filtered)
+    weeks = list(presence['weeks'])
+    if len(weeks) < 2:
+        st.info("Butuh setidaknya 2 minggu data untuk melakukan perbandingan produk baru.")
+    else:
+        col1, col2 = st.columns(2)
+        week_before = col1.selectbox("Pilih Minggu Pembanding:", weeks, index=0, format_func=format_week)
+        week_after = col2.selectbox("Pilih Minggu Penentu:", weeks, index=len(weeks)-1, format_func=format_week)
 
-    with tab3:
-        st.header("Analisis Brand di Toko Kompetitor")
-        if competitor_df.empty:
-            st.warning("Tidak ada data kompetitor pada rentang tanggal ini.")
+        if week_before >= week_after:
+            st.error("Minggu Penentu harus setelah Minggu Pembanding.")
         else:
-            competitor_list = sorted(competitor_df['Toko'].unique())
-            for competitor_store in competitor_list:
-                with st.expander(f"Analisis untuk Kompetitor: **{competitor_store}**"):
-                    single_competitor_df = competitor_latest_overall[competitor_latest_overall['Toko'] == competitor_store]
-                    brand_analysis = single_competitor_df.groupby('Brand').agg(
-                        Total_Omzet=('Omzet', 'sum'), 
-                        Total_Unit_Terjual=('Terjual per Bulan', 'sum')
-                    ).reset_index().sort_values("Total_Omzet", ascending=False)
+            new_pairs, store_changes = week_changes(presence, week_before, week_after)
+            st.dataframe(store_changes, use_container_width=True, hide_index=True)
+            for store in presence['stores']:
+                with st.expander(f"Lihat Produk Baru di Toko: **{store}**"):
+                    store_pairs = new_pairs[presence['pair_store'][new_pairs] == store]
                     
-                    if not brand_analysis.empty:
-                        display_brand_analysis = brand_analysis.head(10).copy()
-                        display_brand_analysis['Total_Omzet'] = display_brand_analysis['Total_Omzet'].apply(lambda x: f"Rp {int(x):,.0f}")
-                        st.dataframe(display_brand_analysis, use_container_width=True, hide_index=True)
-
-                        fig_pie_comp = px.pie(brand_analysis.head(7), names='Brand', values='Total_Omzet', title=f'Distribusi Omzet Top 7 Brand di {competitor_store} (Snapshot Terakhir)')
-                        st.plotly_chart(fig_pie_comp, use_container_width=True)
+                    if len(store_pairs) == 0:
+                        st.write("Tidak ada produk baru yang terdeteksi.")
                     else:
-                        st.info("Tidak ada data brand untuk toko ini.")
-
-    with tab4:
-        st.header("Tren Status Stok Mingguan per Toko")
-        stock_trends = df_filtered.groupby(['Minggu', 'Toko', 'Status']).size().unstack(fill_value=0).reset_index()
-        if 'Tersedia' not in stock_trends.columns: stock_trends['Tersedia'] = 0
-        if 'Habis' not in stock_trends.columns: stock_trends['Habis'] = 0
-        stock_trends_melted = stock_trends.melt(id_vars=['Minggu', 'Toko'], value_vars=['Tersedia', 'Habis'], var_name='Tipe Stok', value_name='Jumlah Produk')
-        
-        fig_stock_trends = px.line(stock_trends_melted, x='Minggu', y='Jumlah Produk', color='Toko', line_dash='Tipe Stok', markers=True, title='Jumlah Produk Tersedia vs. Habis per Minggu')
-        st.plotly_chart(fig_stock_trends, use_container_width=True)
-        st.dataframe(stock_trends.set_index('Minggu'), use_container_width=True)
+                        st.write(f"Ditemukan **{len(store_pairs)}** produk baru:")
+                        row_positions = rows_in_week(presence, store_pairs, week_after)
+                        new_products_df = df_filtered.iloc[row_positions].copy()
+                        new_products_df['Pertama Tersedia'] = first_seen_week(presence, presence['pair_codes'][row_positions])
+                        st.dataframe(new_products_df[['Nama Produk', 'Harga', 'Stok', 'Brand', 'Pertama Tersedia']], use_container_width=True, hide_index=True,
+                                     column_config={'Harga': rupiah_column(), 'Pertama Tersedia': DATE_COLUMN})
 
-    with tab5:
-        st.header("Analisis Kinerja Penjualan (Semua Toko)")
-        
-        all_stores_latest_per_week = latest_entries_weekly.groupby(['Minggu', 'Toko'])['Omzet'].sum().reset_index()
-        fig_weekly_omzet = px.line(all_stores_latest_per_week, x='Minggu', y='Omzet', color='Toko', markers=True, title='Perbandingan Omzet Mingguan Antar Toko (Berdasarkan Snapshot Terakhir)')
-        st.plotly_chart(fig_weekly_omzet, use_container_width=True)
-        
-        st.subheader("Tabel Rincian Omzet per Tanggal")
-        if not df_filtered.empty:
-            omzet_pivot = df_filtered.pivot_table(index='Toko', columns='Tanggal', values='Omzet', aggfunc='sum').fillna(0)
-            omzet_pivot.columns = [col.strftime('%d %b %Y') for col in omzet_pivot.columns]
-            for col in omzet_pivot.columns:
-                omzet_pivot[col] = omzet_pivot[col].apply(lambda x: f"Rp {int(x):,}" if x > 0 else "-")
-            omzet_pivot.reset_index(inplace=True)
-            st.info("Anda bisa scroll tabel ini ke samping untuk melihat tanggal lainnya.")
-            st.dataframe(omzet_pivot, use_container_width=True, hide_index=True)
-        else:
-            st.warning("Tidak ada data untuk ditampilkan dalam tabel.")
 
-    with tab6:
-        st.header("Analisis Produk Baru Mingguan")
-        weeks = sorted(df_filtered['Minggu'].unique())
-        if len(weeks) < 2:
-            st.info("Butuh setidaknya 2 minggu data untuk melakukan perbandingan produk baru.")
-        else:
-            col1, col2 = st.columns(2)
-            week_before = col1.selectbox("Pilih Minggu Pembanding:", weeks, index=0)
-            week_after = col2.selectbox("Pilih Minggu Penentu:", weeks, index=len(weeks)-1)
+# =========================================================================================
+# ================================ TAMPILAN KONTEN UTAMA ================================
+# =========================================================================================
 
-            if week_before >= week_after:
-                st.error("Minggu Penentu harus setelah Minggu Pembanding.")
-            else:
-                all_stores = sorted(df_filtered['Toko'].unique())
-                for store in all_stores:
-                    with st.expander(f"Lihat Produk Baru di Toko: **{store}**"):
-                        products_before = set(df_filtered[(df_filtered['Toko'] == store) & (df_filtered['Minggu'] == week_before) & (df_filtered['Status'] == 'Tersedia')]['Nama Produk'])
-                        products_after = set(df_filtered[(df_filtered['Toko'] == store) & (df_filtered['Minggu'] == week_after) & (df_filtered['Status'] == 'Tersedia')]['Nama Produk'])
-                        new_products = products_after - products_before
-                        
-                        if not new_products:
-                            st.write("Tidak ada produk baru yang terdeteksi.")
-                        else:
-                            st.write(f"Ditemukan **{len(new_products)}** produk baru:")
-                            new_products_df = df_filtered[df_filtered['Nama Produk'].isin(new_products) & (df_filtered['Toko'] == store) & (df_filtered['Minggu'] == week_after)].copy()
-                            new_products_df['Harga_fmt'] = new_products_df['Harga'].apply(lambda x: f"Rp {int(x):,.0f}")
-                            st.dataframe(new_products_df[['Nama Produk', 'Harga_fmt', 'Stok', 'Brand']].rename(columns={'Harga_fmt':'Harga'}), use_container_width=True, hide_index=True)
+if app_mode == "Tab Analisis":
+    st.header("📈 Tampilan Analisis Penjualan & Kompetitor")
+    # Tab melacak state (on_change="rerun"), jadi hanya tab yang sedang dibuka yang dihitung
+    tabs = st.tabs(TAB_LABELS, key="analysis_tab", on_change="rerun")
+    for tab, render_tab in zip(tabs, [render_tab1, render_tab2, render_tab3, render_tab4, render_tab5, render_tab6]):
+        if tab.open is False: continue
+        with tab:
+            render_tab()
 
 elif app_mode == "HPP Produk":
     st.header("💰 Tampilan Analisis Harga Pokok Penjualan (HPP)")
@@ -647,83 +713,79 @@ elif app_mode == "HPP Produk":
         st.error("Sheet 'DATABASE' tidak ditemukan atau tidak memiliki kolom 'SKU'. Analisis HPP tidak dapat dilanjutkan.")
         st.stop()
 
-    # Pastikan kolom HPP ada dan bersihkan
-    if 'HPP (LATEST)' not in db_df.columns: db_df['HPP (LATEST)'] = np.nan
-    if 'HPP (AVERAGE)' not in db_df.columns: db_df['HPP (AVERAGE)'] = np.nan
-
-    # Konversi kolom HPP ke numerik, paksa error menjadi NaN (kosong)
-    db_df['HPP_LATEST_NUM'] = pd.to_numeric(db_df['HPP (LATEST)'], errors='coerce')
-    db_df['HPP_AVERAGE_NUM'] = pd.to_numeric(db_df['HPP (AVERAGE)'], errors='coerce')
-
-    # Logika fallback: Gunakan LATEST, jika kosong, gunakan AVERAGE
-    db_df['HPP'] = db_df['HPP_LATEST_NUM'].fillna(db_df['HPP_AVERAGE_NUM'])
-    
-    # Pilih hanya data HPP yang relevan dan bersih
-    hpp_data = db_df[['SKU', 'HPP']].copy()
-    hpp_data.dropna(subset=['SKU', 'HPP'], inplace=True)
-    hpp_data = hpp_data[hpp_data['SKU'] != '']
-    hpp_data.drop_duplicates(subset=['SKU'], keep='first', inplace=True)
-
-    # 2. GABUNGKAN DATA PENJUALAN TERBARU DENGAN DATA HPP
-    # Menggunakan data penjualan terbaru dari toko Anda
-    latest_db_klik = main_store_latest_overall.copy()
-    
-    # Gabungkan berdasarkan SKU. `how='left'` menjaga semua produk dari toko Anda.
-    merged_df = pd.merge(latest_db_klik, hpp_data, on='SKU', how='left')
-
-    # 3. HITUNG SELISIH DAN PISAHKAN DATA
-    merged_df['Selisih'] = merged_df['Harga'] - merged_df['HPP']
+    with instrumentation.span("hpp.siapkan"):
+        # SKU -> HPP (HPP (LATEST), fallback ke HPP (AVERAGE)), di-cache per isi DATABASE; db_df tidak diubah
+        hpp = hpp_lookup(dataset.database_version, db_df)
 
-    # Tabel 1: Jual lebih murah dari HPP (Rugi)
-    df_rugi = merged_df[merged_df['Selisih'] < 0].copy()
+        # 2. HPP UNTUK DATA PENJUALAN TERBARU
+        # Menggunakan data penjualan terbaru dari toko Anda; semua produk tetap ada (HPP kosong jika SKU tidak ditemukan)
+        # 3. HITUNG SELISIH DAN PISAHKAN DATA: Rugi (Harga < HPP), Untung (Harga >= HPP), HPP tidak ditemukan di DATABASE
+        hpp_tables = hpp_analysis(main_store_latest_overall, hpp)
+        df_rugi, df_untung, df_tidak_ditemukan = hpp_tables['rugi'], hpp_tables['untung'], hpp_tables['tidak_ditemukan']
 
-    # Tabel 2: Jual lebih mahal dari HPP (Untung)
-    df_untung = merged_df[(merged_df['Selisih'] >= 0)].copy()
+    # 4. TAMPILKAN TABEL-TABEL HASIL ANALISIS
+    with instrumentation.span("hpp.tabel"):
+        # --- TABEL 1: PRODUK DIJUAL DI BAWAH HPP ---
+        st.subheader("🔴 Produk Lebih Murah dari HPP")
+        if df_rugi.empty:
+            st.success("👍 Mantap! Tidak ada produk yang dijual di bawah HPP.")
+        else:
+            display_rugi = df_rugi[['Nama Produk', 'SKU', 'Harga', 'HPP', 'Selisih', 'Terjual per Bulan', 'Omzet']].copy()
+            display_rugi.rename(columns={'Terjual per Bulan': 'Terjual/Bln'}, inplace=True)
+            st.dataframe(display_rugi, use_container_width=True, hide_index=True, column_config=rupiah_columns(['Harga', 'HPP', 'Selisih', 'Omzet']))
 
-    # Tabel 3: Produk tidak ditemukan HPP-nya di DATABASE
-    df_tidak_ditemukan = merged_df[merged_df['HPP'].isnull()].copy()
+        st.divider()
 
-    # 4. TAMPILKAN TABEL-TABEL HASIL ANALISIS
-    
-    # --- TABEL 1: PRODUK DIJUAL DI BAWAH HPP ---
-    st.subheader("🔴 Produk Lebih Murah dari HPP")
-    if df_rugi.empty:
-        st.success("👍 Mantap! Tidak ada produk yang dijual di bawah HPP.")
-    else:
-        display_rugi = df_rugi[['Nama Produk', 'SKU', 'Harga', 'HPP', 'Selisih', 'Terjual per Bulan', 'Omzet']].copy()
-        display_rugi.rename(columns={'Terjual per Bulan': 'Terjual/Bln'}, inplace=True)
-        # Formatting
-        for col in ['Harga', 'HPP', 'Selisih', 'Omzet']:
-            display_rugi[col] = display_rugi[col].apply(format_rupiah)
-        st.dataframe(display_rugi, use_container_width=True, hide_index=True)
-
-    st.divider()
-
-    # --- TABEL 2: PRODUK DIJUAL DI ATAS HPP ---
-    st.subheader("🟢 Produk Lebih Mahal dari HPP")
-    if df_untung.empty:
-        st.warning("Tidak ada produk yang dijual di atas HPP.")
-    else:
-        display_untung = df_untung[['Nama Produk', 'SKU', 'Harga', 'HPP', 'Selisih', 'Terjual per Bulan', 'Omzet']].copy()
-        display_untung.rename(columns={'Terjual per Bulan': 'Terjual/Bln'}, inplace=True)
-        # Formatting
-        for col in ['Harga', 'HPP', 'Selisih', 'Omzet']:
-            display_untung[col] = display_untung[col].apply(format_rupiah)
-        st.dataframe(display_untung, use_container_width=True, hide_index=True)
-
-    st.divider()
-    
-    # --- TABEL 3: PRODUK TIDAK TERDETEKSI ---
-    st.subheader("❓ Produk Tidak Terdeteksi HPP-nya")
-    if df_tidak_ditemukan.empty:
-        st.success("👍 Semua produk yang dijual berhasil dicocokkan dengan data HPP di DATABASE.")
-    else:
-        st.warning("Mohon untuk mengecek data produk lagi, sepertinya ada data yang tidak akurat atau SKU tidak cocok.")
-        display_tidak_ditemukan = df_tidak_ditemukan[['Nama Produk', 'SKU', 'Harga', 'Terjual per Bulan', 'Omzet']].copy()
-        display_tidak_ditemukan.rename(columns={'Terjual per Bulan': 'Terjual/Bln'}, inplace=True)
-        # Formatting
-        for col in ['Harga', 'Omzet']:
-            display_tidak_ditemukan[col] = display_tidak_ditemukan[col].apply(format_rupiah)
-        st.dataframe(display_tidak_ditemukan, use_container_width=True, hide_index=True)
+        # --- TABEL 2: PRODUK DIJUAL DI ATAS HPP ---
+        st.subheader("🟢 Produk Lebih Mahal dari HPP")
+        if df_untung.empty:
+            st.warning("Tidak ada produk yang dijual di atas HPP.")
+        else:
+            display_untung = df_untung[['Nama Produk', 'SKU', 'Harga', 'HPP', 'Selisih', 'Terjual per Bulan', 'Omzet']].copy()
+            display_untung.rename(columns={'Terjual per Bulan': 'Terjual/Bln'}, inplace=True)
+            st.dataframe(display_untung, use_container_width=True, hide_index=True, column_config=rupiah_columns(['Harga', 'HPP', 'Selisih', 'Omzet']))
 
+        st.divider()
 
+        # --- TABEL 3: PRODUK TIDAK TERDETEKSI ---
+        st.subheader("❓ Produk Tidak Terdeteksi HPP-nya")
+        if df_tidak_ditemukan.empty:
+            st.success("👍 Semua produk yang dijual berhasil dicocokkan dengan data HPP di DATABASE.")
+        else:
+            st.warning("Mohon untuk mengecek data produk lagi, sepertinya ada data yang tidak akurat atau SKU tidak cocok.")
+            display_tidak_ditemukan = df_tidak_ditemukan[['Nama Produk', 'SKU', 'Harga', 'Terjual per Bulan', 'Omzet']].copy()
+            display_tidak_ditemukan.rename(columns={'Terjual per Bulan': 'Terjual/Bln'}, inplace=True)
+            st.dataframe(display_tidak_ditemukan, use_container_width=True, hide_index=True, column_config=rupiah_columns(['Harga', 'Omzet']))
+
+    # 5. RIWAYAT MARGIN MINGGUAN DARI SELURUH RIWAYAT
+    with instrumentation.span("hpp.riwayat_margin"):
+        st.divider()
+        st.subheader("📉 Riwayat Margin terhadap HPP")
+        margins = margin_history(dataset.rekap_version, dataset.database_version, dataset.spreadsheet_key,
+                                 dataset.history.get('loaded_from'), df, hpp)
+        margin_summary = margins['summary']
+        if margin_summary.empty:
+            st.info("Belum ada produk dengan HPP yang tercatat di riwayat penjualan.")
+        else:
+            st.caption(f"Harga per minggu (snapshot terakhir tiap minggu) di seluruh riwayat {MY_STORE_NAME}, dibandingkan dengan HPP saat ini dari DATABASE.")
+            ever_below = margin_summary[margin_summary['Minggu di Bawah HPP'] > 0]
+            col1, col2 = st.columns(2)
+            col1.metric("Produk Pernah di Bawah HPP", f"{len(ever_below)} dari {len(margin_summary)}")
+            col2.metric("Total Minggu di Bawah HPP", f"{int(ever_below['Minggu di Bawah HPP'].sum()):,}")
+            st.dataframe(margin_summary, use_container_width=True, hide_index=True, column_config={
+                **rupiah_columns(['HPP', 'Harga Terakhir', 'Selisih Terakhir', 'Selisih Terendah']),
+                'Terakhir di Bawah HPP': DATE_COLUMN,
+            })
+
+            product_names = dict(zip(margin_summary['SKU'], margin_summary['Nama Produk']))
+            selected_sku = st.selectbox("Pilih SKU untuk melihat riwayat margin:", margin_summary['SKU'].tolist(),
+                                        format_func=lambda sku: f"{sku} - {product_names[sku]}", key="hpp_margin_sku")
+            sku_weekly = margins['weekly'][margins['weekly']['SKU'] == selected_sku]
+            fig_margin = px.line(sku_weekly, x='Minggu', y=['Harga', 'HPP'], markers=True, title=f"Harga Mingguan vs. HPP: {product_names[selected_sku]}")
+            st.plotly_chart(fig_margin, use_container_width=True)
+            st.dataframe(sku_weekly.drop(columns=['SKU', 'Nama Produk']), use_container_width=True, hide_index=True, column_config={
+                'Minggu': WEEK_COLUMN, **rupiah_columns(['Harga', 'HPP', 'Selisih']),
+                'Margin %': st.column_config.NumberColumn(format="%.1f%%"),
+            })
+
+show_diagnostics(diagnostics)
@@ -0,0 +1,238 @@
+# ===================================================================================
+#  BENCHMARK DENGAN DATA SINTETIS (TANPA KREDENSIAL GOOGLE)
+#  Membuat workbook sintetis (offline_sheets.py), lalu mengukur ingesti penuh &
+#  inkremental, snapshot, agregat SQL di cermin snapshot, penyiapan frame
+#  turunan, komputasi di balik tiap tab dan tampilan HPP (termasuk riwayat margin), serta
+#  run_price_comparison_update terhadap klien tiruan.
+#  Hasil ditulis sebagai JSON agar bisa dibandingkan antar-commit.
+#
+#    python benchmark.py --products 500 --stores 6 --days 60 --repeat 3 --output hasil.json
+#    python benchmark.py --compare hasil-lama.json hasil-baru.json [--threshold 1.2]
+# ===================================================================================
+
+import argparse
+import copy
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import matching
+import snapshot
+from derived import (
+    MY_STORE_NAME, TOP_PRODUCTS, brand_omzet, build_comparison_lookup, build_derived_frames, build_hpp_lookup, build_margin_history,
+    build_match_index, category_omzet, compare_product, hpp_analysis, store_latest_products, top_products,
+)
+from formatting import weekly_growth
+from offline_sheets import OfflineClient, append_day, generate_workbook
+from presence import build_presence, week_changes
+from price_update import run_price_comparison_update
+from rollups import build_range_rollups, build_rollups
+from storage import SnapshotBackend
+
+SPREADSHEET_KEY = "benchmark"
+RESULT_FORMAT = 1
+TAB2_PRODUCTS = 50  # produk yang dibuka di tab 2 per ulangan
+
+
+def measure(fn, repeat):
+    # Jalankan fn `repeat` kali; hasil dari ulangan terakhir dikembalikan bersama durasi tiap ulangan
+    durations, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        durations.append(time.perf_counter() - started)
+    return result, durations
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def package_versions():
+    versions = {'python': platform.python_version()}
+    for name in ['pandas', 'numpy', 'pyarrow', 'rapidfuzz', 'streamlit']:
+        try: versions[name] = __import__(name).__version__
+        except ImportError: versions[name] = None
+    return versions
+
+
+# ================================
+# KOMPUTASI PER TAB (FUNGSI YANG SAMA DIPANGGIL app.py)
+# ================================
+def tab1_computation(frames, range_rollup):
+    main_latest = frames['main_store_latest_overall']
+    main_store_cat, category_sales = category_omzet(main_latest)
+    products_per_category = [top_products(main_store_cat[main_store_cat['KATEGORI'] == category]) for category in category_sales['KATEGORI'].head(1)]
+    return (category_sales, products_per_category, top_products(main_latest, TOP_PRODUCTS), brand_omzet(main_latest),
+            weekly_growth(range_rollup['main_weekly']))
+
+def tab2_computation(rekap_df, frames, matches_df, score_cutoff=91):
+    index = build_match_index(matches_df)
+    store_products = store_latest_products(rekap_df)
+    lookup = build_comparison_lookup(frames['df_filtered'], frames['competitor_latest_overall'], store_products['Nama Produk'].unique())
+    return [compare_product(index, lookup, frames['competitor_latest_overall'], product, score_cutoff)
+            for _, product in store_products.head(TAB2_PRODUCTS).iterrows()]
+
+def tab6_computation(df_filtered):
+    presence = build_presence(df_filtered)
+    weeks = list(presence['weeks'])
+    if len(weeks) < 2: return presence
+    return week_changes(presence, weeks[0], weeks[-1])
+
+
+# ================================
+# SUITE
+# ================================
+def run_suite(n_products, n_stores, n_days, repeat=3, seed=1, workdir=None, price_update=True):
+    """Jalankan semua tahap benchmark. Mengembalikan dict hasil (siap ditulis sebagai JSON).
+
+    Snapshot & cache pencocokan ditulis di workdir; SNAPSHOT_ROOT dan MATCH_CACHE_ROOT
+    dikembalikan ke nilai semula setelah selesai (juga saat gagal).
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="benchmark-")
+    roots = snapshot.SNAPSHOT_ROOT, matching.MATCH_CACHE_ROOT
+    snapshot.SNAPSHOT_ROOT = os.path.join(workdir, "snapshot")
+    matching.MATCH_CACHE_ROOT = os.path.join(workdir, "matching")
+    try:
+        return _run_stages(n_products, n_stores, n_days, repeat, seed, price_update)
+    finally:
+        snapshot.SNAPSHOT_ROOT, matching.MATCH_CACHE_ROOT = roots
+
+def _run_stages(n_products, n_stores, n_days, repeat, seed, price_update):
+    results = []
+
+    def record(stage, fn, repeat=repeat, **info):
+        result, durations = measure(fn, repeat)
+        results.append({'tahap': stage, 'ulangan': len(durations), 'detik': durations,
+                        'detik_median': statistics.median(durations), 'detik_min': min(durations), 'info': info})
+        print(f"  {stage:<34} median {statistics.median(durations):8.3f} s   min {min(durations):8.3f} s", flush=True)
+        return result
+
+    print(f"Benchmark: {n_products} produk x {n_stores} toko x {n_days} hari (ulangan {repeat})", flush=True)
+    sheets = record('generate_workbook', lambda: generate_workbook(n_products, n_stores, n_days, seed=seed), repeat=1)
+    client = OfflineClient(sheets)
+
+    def full_load():
+        spreadsheet = client.open_by_key(SPREADSHEET_KEY)
+        calls_before = spreadsheet.calls
+        loaded = snapshot.full_load(spreadsheet)
+        loaded[4]['api_calls_offline'] = spreadsheet.calls - calls_before
+        return loaded
+    rekap_df, database_df, matches_df, manifest, report = record('ingestion.full_load', full_load)
+    results[-1]['info'].update(baris_rekap=int(len(rekap_df)), api_calls=report['api_calls_offline'],
+                               memori_mb=round(float(rekap_df.memory_usage(deep=True).sum()) / 2**20, 2))
+    # Puncak memori Python selama muat penuh (dijalankan sekali lagi di luar pengukuran waktu)
+    tracemalloc.start()
+    full_load()
+    results[-1]['info']['puncak_memori_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+    tracemalloc.stop()
+
+    record('snapshot.save', lambda: snapshot.save_snapshot(SPREADSHEET_KEY, rekap_df, database_df, matches_df, manifest))
+    full_snapshot = record('snapshot.load_full', lambda: snapshot.load_snapshot(SPREADSHEET_KEY))
+    window_from = snapshot.window_start(rekap_df['Tanggal'].max())
+    window_df = record('snapshot.load_window', lambda: snapshot.load_snapshot(SPREADSHEET_KEY, start_date=window_from)[0])
+    results[-1]['info'].update(baris=int(len(window_df)), mulai=window_from.strftime('%Y-%m-%d'))
+
+    def sql_build():
+        # Cermin SQLite dibangun ulang tiap ulangan (biasanya sekali per generasi snapshot)
+        manifest_now = snapshot.read_manifest(SPREADSHEET_KEY)
+        mirror = os.path.join(snapshot.snapshot_dir(SPREADSHEET_KEY), manifest_now['files']['rekap'] + snapshot.SQL_MIRROR_SUFFIX)
+        if os.path.exists(mirror): os.remove(mirror)
+        return SnapshotBackend(SPREADSHEET_KEY).sql_store()
+    sql_store = record('storage.sql_build', sql_build)
+    results[-1]['info'].update(mb=round(os.path.getsize(sql_store.path) / 2**20, 2))
+    record('storage.sql_weekly_omzet', sql_store.weekly_omzet)
+    record('storage.sql_brand_breakdown', sql_store.brand_breakdown)
+    record('storage.sql_latest_rows', sql_store.latest_rows)
+
+    appended = OfflineClient(append_day(copy.deepcopy(sheets), seed=seed + 1))
+    refreshed = record('ingestion.incremental_refresh', lambda: snapshot.incremental_refresh(appended.open_by_key(SPREADSHEET_KEY), full_snapshot))
+    results[-1]['info'].update(baris_baru=refreshed[4].get('baris_baru'), mode=refreshed[4].get('mode'))
+
+    # Rentang default dashboard: jendela riwayat terbaru
+    start_date, end_date = window_from.date(), rekap_df['Tanggal'].max().date()
+    frames = record('derived.frames', lambda: build_derived_frames(window_df, start_date, end_date))
+    rollups = record('derived.rollups', lambda: build_rollups(window_df))
+    range_rollup = record('tab3_4_5.range_rollups', lambda: build_range_rollups(
+        rollups, frames['df_filtered'], frames['competitor_latest_overall'], start_date, end_date))
+    record('tab1.analisis_toko', lambda: tab1_computation(frames, range_rollup))
+    record('tab2.perbandingan_harga', lambda: tab2_computation(window_df, frames, matches_df), produk=TAB2_PRODUCTS)
+    record('tab6.analisis_mingguan', lambda: tab6_computation(frames['df_filtered']))
+    hpp_lookup = record('hpp.lookup', lambda: build_hpp_lookup(database_df))
+    record('hpp.analisis_hpp', lambda: hpp_analysis(frames['main_store_latest_overall'], hpp_lookup))
+    store_rows = rekap_df[rekap_df['Toko'] == MY_STORE_NAME]
+    margins = record('hpp.riwayat_margin', lambda: build_margin_history(store_rows, hpp_lookup))
+    results[-1]['info'].update(baris=int(len(store_rows)), minggu_sku=int(len(margins['weekly'])))
+
+    if price_update:
+        update = record('price_update.penuh', lambda: run_price_comparison_update(client, SPREADSHEET_KEY, incremental=False), repeat=1)
+        results[-1]['info'].update(status=update['status'], baris=update.get('baris'), api_calls=update.get('penulisan', {}).get('api_calls'))
+        update = record('price_update.inkremental', lambda: run_price_comparison_update(client, SPREADSHEET_KEY, incremental=True))
+        results[-1]['info'].update(status=update['status'], baris=update.get('baris'))
+
+    return {
+        'format': RESULT_FORMAT, 'commit': git_commit(), 'waktu': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(), 'paket': package_versions(),
+        'parameter': {'produk': n_products, 'toko': n_stores, 'hari': n_days, 'ulangan': repeat, 'seed': seed},
+        'hasil': results,
+    }
+
+def compare_results(old, new, threshold=1.2):
+    """Cetak perbandingan median per tahap. Mengembalikan daftar tahap yang melambat melebihi threshold."""
+    old_by_stage = {row['tahap']: row for row in old['hasil']}
+    print(f"{'tahap':<34} {'lama':>9} {'baru':>9} {'rasio':>7}   ({old.get('commit')} -> {new.get('commit')})")
+    slower = []
+    for row in new['hasil']:
+        before = old_by_stage.get(row['tahap'])
+        if before is None:
+            print(f"{row['tahap']:<34} {'-':>9} {row['detik_median']:9.3f}"); continue
+        ratio = row['detik_median'] / before['detik_median'] if before['detik_median'] > 0 else np.inf
+        flag = "  <- LEBIH LAMBAT" if ratio > threshold else ""
+        if flag: slower.append(row['tahap'])
+        print(f"{row['tahap']:<34} {before['detik_median']:9.3f} {row['detik_median']:9.3f} {ratio:7.2f}{flag}")
+    if old.get('parameter') != new.get('parameter'):
+        print(f"Peringatan: parameter berbeda ({old.get('parameter')} vs {new.get('parameter')})")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dashboard dengan data sintetis & Google Sheets tiruan.")
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--stores', type=int, default=6)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--skip-price-update', action='store_true', help="Lewati run_price_comparison_update (pencocokan fuzzy).")
+    parser.add_argument('--output', help="Path file JSON hasil (default: benchmark-<commit>.json).")
+    parser.add_argument('--compare', nargs=2, metavar=('LAMA', 'BARU'), help="Bandingkan dua file hasil, tanpa menjalankan benchmark.")
+    parser.add_argument('--threshold', type=float, default=1.2, help="Rasio median yang dianggap regresi pada --compare.")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f: old = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f: new = json.load(f)
+        return 1 if compare_results(old, new, args.threshold) else 0
+
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as workdir:
+        result = run_suite(args.products, args.stores, args.days, args.repeat, args.seed, workdir, not args.skip_price_update)
+    output = args.output or f"benchmark-{result['commit'] or 'lokal'}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    print(f"Hasil ditulis ke {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# ===================================================================================
+#  PENYIMPANAN DATASET BERSAMA (PER PROSES)
+#  Satu salinan rekap_df, database_df, dan matches_df per versi data dipakai
+#  bersama oleh semua sesi browser di proses Streamlit ini. Sesi hanya
+#  menyimpan handle (objek Dataset) di session_state, bukan salinan frame.
+#  Versi lama dilepas otomatis begitu tidak ada sesi yang memegang handle-nya
+#  (weakref); versi terbaru per spreadsheet selalu dipertahankan.
+#
+#  rekap hanya berisi jendela riwayat terbaru (lihat snapshot.HISTORY_WINDOW_DAYS)
+#  jika riwayat lengkap tersedia di snapshot terpartisi; history mencatat
+#  rentang lengkap & batas jendelanya, latest berisi baris terbaru per produk.
+#
+#  Frame di dalam Dataset bersifat read-only: kolom turunan dibangun di frame
+#  terpisah (lihat derived.py), jangan ditambahkan ke frame ini.
+# ===================================================================================
+
+import hashlib
+import threading
+import weakref
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+
+@dataclass(frozen=True, eq=False)
+class Dataset:
+    spreadsheet_key: str
+    version: str
+    rekap_version: str  # berubah hanya jika rekap_df berubah (kunci cache frame turunan)
+    rekap: pd.DataFrame
+    database: pd.DataFrame
+    matches: pd.DataFrame
+    report: dict = field(default_factory=dict)
+    rollups: dict = field(default_factory=dict)  # agregat harian/mingguan (lihat rollups.py), ikut rekap_version
+    latest: pd.DataFrame = None  # baris terbaru per (Toko, Nama Produk) dari seluruh riwayat
+    history: dict = field(default_factory=dict)  # date_min, date_max, loaded_from (None = seluruh riwayat di rekap)
+    database_version: str = None  # sidik isi DATABASE (kunci cache HPP); tetap sama selama isi sheet tidak berubah
+
+
+def frame_version(df):
+    # Sidik isi frame: hash per baris + nama kolom, tanpa bergantung pada versi data lain
+    if df is None or df.empty: return 'kosong'
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update('|'.join(map(str, df.columns)).encode('utf-8'))
+    return f"{len(df)}-{digest.hexdigest()[:16]}"
+
+
+class DatasetStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._live = weakref.WeakValueDictionary()
+        self._latest = {}
+        self._load_locks = {}
+
+    def load_lock(self, spreadsheet_key):
+        # Satu pemuatan per spreadsheet pada satu waktu; sesi lain menunggu lalu memakai hasilnya
+        with self._lock:
+            return self._load_locks.setdefault(spreadsheet_key, threading.Lock())
+
+    def publish(self, spreadsheet_key, version, rekap, database, matches, report=None, rekap_version=None, rollups=None,
+                latest=None, history=None, database_version=None):
+        """Daftarkan versi data baru sebagai versi terbaru untuk spreadsheet_key."""
+        dataset = Dataset(spreadsheet_key, version, rekap_version or version, rekap, database, matches, report or {}, rollups or {},
+                          latest, history or {}, database_version or frame_version(database))
+        with self._lock:
+            self._live[version] = dataset
+            self._latest[spreadsheet_key] = dataset
+        return dataset
+
+    def with_matches(self, dataset, version, matches):
+        # Versi baru yang hanya mengganti HASIL_MATCHING; rekap & database dipakai bersama
+        return self.publish(dataset.spreadsheet_key, version, dataset.rekap, dataset.database, matches,
+                            dataset.report, rekap_version=dataset.rekap_version, rollups=dataset.rollups,
+                            latest=dataset.latest, history=dataset.history, database_version=dataset.database_version)
+
+    def latest(self, spreadsheet_key):
+        with self._lock:
+            return self._latest.get(spreadsheet_key)
+
+    def get(self, version):
+        with self._lock:
+            return self._live.get(version)
+
+    def live_versions(self):
+        with self._lock:
+            return sorted(self._live.keys())
+
+
+STORE = DatasetStore()
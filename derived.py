@@ -0,0 +1,268 @@
+# ===================================================================================
+#  FRAME TURUNAN UNTUK TAB ANALISIS
+#  Data terfilter per rentang tanggal, kolom Minggu, dan snapshot "baris
+#  terbaru per grup" (mingguan & keseluruhan). Dibangun sekali per
+#  (versi data, rentang tanggal) dan di-cache oleh app.py; frame hasilnya
+#  diperlakukan read-only oleh tab-tab.
+# ===================================================================================
+
+import numpy as np
+import pandas as pd
+
+MY_STORE_NAME = "DB KLIK"
+
+
+def week_start(dates):
+    # Senin awal minggu (periode W-SUN) sebagai datetime64, tanpa objek Period per baris
+    return dates.dt.normalize() - pd.to_timedelta(dates.dt.dayofweek, unit='D')
+
+def latest_rows(df, keys, date_col='Tanggal'):
+    """Baris dengan tanggal terbaru per grup `keys`, setara df.loc[df.groupby(keys)[date_col].idxmax()].
+
+    Satu sort stabil (tanggal menurun di dalam grup) lalu drop_duplicates,
+    tanpa idxmax per grup. Tanggal kembar: baris yang muncul pertama menang,
+    sama seperti idxmax; hasil terurut menurut kunci grup seperti groupby.
+    """
+    ordered = df.sort_values(keys + [date_col], ascending=[True] * len(keys) + [False], kind='mergesort')
+    return ordered.drop_duplicates(subset=keys, keep='first')
+
+def build_derived_frames(df, start_date=None, end_date=None, my_store_name=MY_STORE_NAME):
+    """Bangun frame turunan untuk rentang [start_date, end_date] (None = seluruh data).
+
+    Mengembalikan dict berisi df_filtered, main_store_df, competitor_df,
+    latest_entries_overall, main_store_latest_overall, dan competitor_latest_overall.
+    Agregat mingguan dibaca dari tabel rollup (lihat rollups.py).
+    """
+    if start_date is None or end_date is None:
+        df_filtered = df.copy()
+    else:
+        start_date_dt, end_date_dt = pd.to_datetime(start_date), pd.to_datetime(end_date)
+        df_filtered = df[(df['Tanggal'] >= start_date_dt) & (df['Tanggal'] <= end_date_dt)].copy()
+    if df_filtered.empty:
+        return {'df_filtered': df_filtered}
+
+    df_filtered['Minggu'] = week_start(df_filtered['Tanggal'])
+    is_main_store = df_filtered['Toko'] == my_store_name
+    main_store_df = df_filtered[is_main_store]
+
+    latest_entries_overall = latest_rows(df_filtered, ['Toko', 'Nama Produk'])
+    is_main_latest = latest_entries_overall['Toko'] == my_store_name
+    return {
+        'df_filtered': df_filtered,
+        'main_store_df': main_store_df,
+        'competitor_df': df_filtered[~is_main_store],
+        'latest_entries_overall': latest_entries_overall,
+        'main_store_latest_overall': latest_entries_overall[is_main_latest],
+        'competitor_latest_overall': latest_entries_overall[~is_main_latest],
+    }
+
+def build_hpp_table(db_df):
+    """Tabel (SKU, HPP) bersih dari sheet DATABASE, tanpa mengubah db_df.
+
+    HPP diambil dari HPP (LATEST); jika kosong, HPP (AVERAGE).
+    """
+    hpp_latest = pd.to_numeric(db_df['HPP (LATEST)'], errors='coerce') if 'HPP (LATEST)' in db_df.columns else pd.Series(np.nan, index=db_df.index)
+    hpp_average = pd.to_numeric(db_df['HPP (AVERAGE)'], errors='coerce') if 'HPP (AVERAGE)' in db_df.columns else pd.Series(np.nan, index=db_df.index)
+    hpp_data = pd.DataFrame({'SKU': db_df['SKU'], 'HPP': hpp_latest.fillna(hpp_average)})
+    hpp_data = hpp_data.dropna(subset=['SKU', 'HPP'])
+    hpp_data = hpp_data[hpp_data['SKU'] != '']
+    return hpp_data.drop_duplicates(subset=['SKU'], keep='first')
+
+def build_hpp_lookup(db_df):
+    # SKU -> HPP sebagai Series berindeks SKU unik (pencarian berkunci, lihat hpp_for)
+    return build_hpp_table(db_df).set_index('SKU')['HPP']
+
+def hpp_for(hpp_lookup, skus):
+    """HPP per baris (NaN jika SKU tidak ada di DATABASE), setara merge kiri pada SKU.
+
+    Tiap SKU unik dicari sekali di indeks lookup lalu dipetakan kembali lewat
+    kode factorize, sehingga biaya tumbuh dengan jumlah SKU, bukan jumlah baris.
+    """
+    codes, uniques = pd.factorize(skus)
+    values = np.append(hpp_lookup.to_numpy(dtype=np.float64), np.nan)
+    hpp_unique = np.append(values[hpp_lookup.index.get_indexer(uniques)], np.nan)
+    return hpp_unique[codes]
+
+def hpp_analysis(main_store_latest, hpp_lookup):
+    """Produk terbaru toko sendiri dibandingkan HPP: dict rugi (Harga < HPP), untung
+    (Harga >= HPP), dan tidak_ditemukan (SKU tanpa HPP di DATABASE), masing-masing
+    dengan kolom HPP & Selisih."""
+    merged = main_store_latest.assign(HPP=hpp_for(hpp_lookup, main_store_latest['SKU']))
+    merged['Selisih'] = merged['Harga'] - merged['HPP']
+    return {
+        'rugi': merged[merged['Selisih'] < 0].copy(),
+        'untung': merged[merged['Selisih'] >= 0].copy(),
+        'tidak_ditemukan': merged[merged['HPP'].isnull()].copy(),
+    }
+
+def build_margin_history(store_rows, hpp_lookup):
+    """Riwayat margin mingguan per SKU toko sendiri terhadap HPP di DATABASE.
+
+    Per (SKU, Minggu) dipakai baris terbaru di minggu itu, seperti rollup
+    mingguan; HPP adalah nilai saat ini (DATABASE tidak menyimpan riwayat HPP).
+    Mengembalikan dict berisi:
+      weekly: SKU, Minggu, Nama Produk, Harga, HPP, Selisih, Margin % (urut SKU, Minggu);
+      summary: per SKU, jumlah minggu tercatat & di bawah HPP, selisih terakhir/terendah,
+               dan minggu terakhir di bawah HPP (urut minggu di bawah HPP terbanyak).
+    """
+    rows = store_rows[['Tanggal', 'SKU', 'Nama Produk', 'Harga']]
+    hpp = hpp_for(hpp_lookup, rows['SKU'])
+    has_hpp = ~np.isnan(hpp)
+    rows = rows[has_hpp].assign(HPP=hpp[has_hpp], Minggu=week_start(rows.loc[has_hpp, 'Tanggal']))
+    weekly = latest_rows(rows, ['SKU', 'Minggu'])
+    selisih = weekly['Harga'] - weekly['HPP']
+    weekly = weekly.assign(Selisih=selisih, **{'Margin %': (selisih / weekly['HPP'].where(weekly['HPP'] > 0) * 100)})
+    weekly = weekly[['SKU', 'Minggu', 'Nama Produk', 'Harga', 'HPP', 'Selisih', 'Margin %']].reset_index(drop=True)
+
+    below = weekly['Selisih'] < 0
+    counts = weekly.assign(_bawah=below, _minggu_bawah=weekly['Minggu'].where(below)).groupby('SKU', sort=False).agg(**{
+        'Minggu Tercatat': ('Minggu', 'size'),
+        'Minggu di Bawah HPP': ('_bawah', 'sum'),
+        'Selisih Terendah': ('Selisih', 'min'),
+        'Terakhir di Bawah HPP': ('_minggu_bawah', 'max'),
+    })
+    last = weekly.drop_duplicates('SKU', keep='last').set_index('SKU')[['Nama Produk', 'HPP', 'Harga', 'Selisih']]
+    summary = last.rename(columns={'Harga': 'Harga Terakhir', 'Selisih': 'Selisih Terakhir'}).join(counts).reset_index()
+    summary = summary.sort_values(['Minggu di Bawah HPP', 'Selisih Terakhir'], ascending=[False, True], kind='mergesort')
+    return {'weekly': weekly, 'summary': summary.reset_index(drop=True)}
+
+
+# ================================
+# KOMPUTASI TAB 1 (ANALISIS TOKO SAYA)
+# ================================
+TOP_PRODUCTS = 15
+
+def category_omzet(main_store_latest):
+    """(baris dengan KATEGORI kosong menjadi 'Lainnya', Omzet per KATEGORI urut menurun)."""
+    rows = main_store_latest.assign(KATEGORI=main_store_latest['KATEGORI'].astype(object).replace('', 'Lainnya').fillna('Lainnya'))
+    sales = rows.groupby('KATEGORI')['Omzet'].sum().reset_index()
+    return rows, sales.sort_values('Omzet', ascending=False)
+
+def top_products(rows, n=None):
+    # Urut Terjual per Bulan menurun (n teratas jika diberikan); SKU 'N/A' jika kolomnya tidak ada
+    ranked = rows.sort_values('Terjual per Bulan', ascending=False)
+    if n is not None: ranked = ranked.head(n)
+    return ranked if 'SKU' in ranked.columns else ranked.assign(SKU='N/A')
+
+def brand_omzet(main_store_latest):
+    # Omzet per Brand dari snapshot terakhir, urut menurun
+    omzet = main_store_latest.groupby('Brand', observed=True)['Omzet'].sum().reset_index()
+    return omzet.sort_values('Omzet', ascending=False)
+
+
+# ================================
+# INDEKS PERBANDINGAN HARGA (TAB 2)
+# ================================
+MATCH_INDEX_COLS = ['Produk Toko Saya', 'Produk Kompetitor', 'Toko Kompetitor', 'Harga Kompetitor', 'Skor Kemiripan']
+
+def build_match_index(matches_df):
+    """Indeks HASIL_MATCHING per 'Produk Toko Saya', skor terurut menurun di dalam tiap produk.
+
+    Mengembalikan dict berisi frame terurut, rentang baris {produk: (awal, akhir)},
+    dan skor negatif untuk pencarian cutoff dengan searchsorted.
+    """
+    if matches_df is None or not all(col in matches_df.columns for col in MATCH_INDEX_COLS):
+        matches_df = pd.DataFrame(columns=MATCH_INDEX_COLS)
+    ordered = matches_df.sort_values(['Produk Toko Saya', 'Skor Kemiripan'], ascending=[True, False], kind='mergesort').reset_index(drop=True)
+    names = ordered['Produk Toko Saya'].to_numpy()
+    boundaries = np.flatnonzero(names[1:] != names[:-1]) + 1
+    starts, ends = np.r_[0, boundaries], np.r_[boundaries, len(ordered)]
+    slices = dict(zip(names[starts], zip(starts, ends))) if len(ordered) else {}
+    neg_scores = -pd.to_numeric(ordered['Skor Kemiripan'], errors='coerce').to_numpy(dtype=np.float64)
+    return {'frame': ordered, 'slices': slices, 'neg_scores': neg_scores}
+
+def matches_for(match_index, product_name, score_cutoff):
+    # Pasangan untuk satu produk dengan skor >= cutoff, skor tertinggi dulu; O(log k) per pencarian
+    span = match_index['slices'].get(product_name)
+    if span is None: return match_index['frame'].iloc[0:0]
+    start, end = span
+    count = np.searchsorted(match_index['neg_scores'][start:end], -score_cutoff, side='right')
+    return match_index['frame'].iloc[start:start + count]
+
+def store_latest_products(df, my_store_name=MY_STORE_NAME):
+    # Produk toko sendiri pada tanggal data terakhirnya (seluruh data, tanpa filter rentang)
+    store_rows = df[df['Toko'] == my_store_name]
+    return store_rows[store_rows['Tanggal'] == store_rows['Tanggal'].max()]
+
+def build_comparison_lookup(df_filtered, competitor_latest_overall, product_names):
+    """Tabel bantu tab 2 untuk satu rentang tanggal, dibangun sekali per versi.
+
+    product_stats: per nama produk toko sendiri, harga rata-rata di semua toko dan
+    baris omzet tertinggi (Toko, Omzet), setara idxmax pada df_filtered.
+    competitor_details: Terjual & Omzet kompetitor terbaru dengan kunci (Toko, Nama Produk).
+    competitor_positions: {nama produk: posisi baris di competitor_latest_overall}.
+    """
+    rows = df_filtered[df_filtered['Nama Produk'].isin(product_names)]
+    top_rows = rows.sort_values('Omzet', ascending=False, kind='mergesort').drop_duplicates('Nama Produk')
+    product_stats = top_rows.set_index('Nama Produk')[['Toko', 'Omzet']].join(rows.groupby('Nama Produk')['Harga'].mean().rename('Harga Rata-Rata'))
+
+    keys = pd.MultiIndex.from_arrays([
+        competitor_latest_overall['Toko'].astype(object).to_numpy(), competitor_latest_overall['Nama Produk'].to_numpy(),
+    ])
+    competitor_details = pd.DataFrame({
+        'Terjual per Bulan': competitor_latest_overall['Terjual per Bulan'].to_numpy(),
+        'Omzet': competitor_latest_overall['Omzet'].to_numpy(),
+    }, index=keys)
+    return {
+        'product_stats': product_stats,
+        'competitor_details': competitor_details,
+        'competitor_positions': competitor_latest_overall.groupby('Nama Produk', sort=False).indices,
+    }
+
+def competitor_rows_for(lookup, competitor_latest_overall, product_names):
+    # Baris kompetitor terbaru untuk sekumpulan nama produk, tanpa memindai seluruh katalog
+    positions = [lookup['competitor_positions'][name] for name in product_names if name in lookup['competitor_positions']]
+    return competitor_latest_overall.iloc[np.concatenate(positions) if positions else []]
+
+def comparison_table(my_product, product_matches, competitor_details, my_store_name=MY_STORE_NAME):
+    """Tabel perbandingan harga (produk sendiri + semua pasangan) dalam satu langkah kolom, urut Harga_num.
+
+    Selisih Harga numerik (diformat saat ditampilkan); arah selisih ada di kolom Posisi Harga.
+    """
+    my_price = int(my_product['Harga'])
+    my_terjual, my_omzet = my_product.get('Terjual per Bulan', 0), my_product.get('Omzet', 0)
+    mine = pd.DataFrame([{
+        'Nama Produk Tercantum': my_product['Nama Produk'], 'Toko': f"{my_store_name} (Anda)",
+        'Harga_num': my_price, 'Selisih Harga': 0, 'Posisi Harga': "Basis",
+        'Terjual per Bulan': int(my_terjual) if my_terjual else 0, 'Omzet_num': int(my_omzet) if my_omzet else 0,
+        'Skor Kemiripan (%)': 100,
+    }])
+
+    keys = pd.MultiIndex.from_arrays([product_matches['Toko Kompetitor'].to_numpy(dtype=object), product_matches['Produk Kompetitor'].to_numpy(dtype=object)])
+    details = competitor_details.reindex(keys)
+    comp_prices = product_matches['Harga Kompetitor'].to_numpy().astype(np.int64)
+    price_diff = comp_prices - my_price
+    position = np.select([price_diff > 0, price_diff < 0], ["Lebih Mahal", "Lebih Murah"], "Sama")
+    competitors = pd.DataFrame({
+        'Nama Produk Tercantum': product_matches['Produk Kompetitor'].to_numpy(),
+        'Toko': product_matches['Toko Kompetitor'].to_numpy(),
+        'Harga_num': comp_prices,
+        'Selisih Harga': price_diff,
+        'Posisi Harga': position,
+        'Terjual per Bulan': details['Terjual per Bulan'].fillna(0).to_numpy().astype(np.int64),
+        'Omzet_num': details['Omzet'].fillna(0).to_numpy().astype(np.int64),
+        'Skor Kemiripan (%)': product_matches['Skor Kemiripan'].to_numpy().astype(np.int64),
+    })
+    comparison_df = pd.concat([mine, competitors], ignore_index=True)
+    return comparison_df.sort_values(by='Harga_num', ascending=True, kind='mergesort').reset_index(drop=True)
+
+def compare_product(match_index, lookup, competitor_latest_overall, product_info, score_cutoff, my_store_name=MY_STORE_NAME):
+    """Data tab 2 untuk satu produk toko sendiri.
+
+    matches: pasangan HASIL_MATCHING dengan skor >= cutoff; stats: baris
+    product_stats (None jika tidak ada); ready_stores: jumlah toko kompetitor
+    yang produk pasangannya Tersedia; table: tabel perbandingan (None tanpa pasangan).
+    """
+    name = product_info['Nama Produk']
+    product_matches = matches_for(match_index, name, score_cutoff)
+    competitor_rows = competitor_rows_for(lookup, competitor_latest_overall, product_matches['Produk Kompetitor'].unique())
+    table = None
+    if not product_matches.empty:
+        table = comparison_table(product_info, product_matches, lookup['competitor_details'], my_store_name)
+        table = table.rename(columns={'Harga_num': 'Harga', 'Omzet_num': 'Omzet'})
+    return {
+        'matches': product_matches,
+        'stats': lookup['product_stats'].loc[name] if name in lookup['product_stats'].index else None,
+        'ready_stores': competitor_rows[competitor_rows['Status'] == 'Tersedia']['Toko'].nunique(),
+        'table': table,
+    }
@@ -0,0 +1,48 @@
+# ===================================================================================
+#  FORMAT TAMPILAN TABEL
+#  Angka tetap numerik di DataFrame dan diformat oleh column_config Streamlit di
+#  sisi browser (urutan sort tetap numerik). String hanya dibangun jika memang
+#  dibutuhkan (panah WoW), dan dibangun per kolom secara vektor, bukan per sel.
+# ===================================================================================
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+RUPIAH_FORMAT = "Rp %,d"
+WOW_THRESHOLD = 0.001
+WOW_COLORS = {'▲': 'color: green', '▼': 'color: red'}
+
+WEEK_COLUMN = st.column_config.DateColumn("Minggu", format="YYYY-MM-DD")
+DATE_COLUMN = st.column_config.DateColumn(format="YYYY-MM-DD")
+
+
+def format_week(week):
+    return week.strftime('%Y-%m-%d')
+
+def rupiah_column(label=None):
+    return st.column_config.NumberColumn(label, format=RUPIAH_FORMAT)
+
+def rupiah_columns(columns):
+    """column_config untuk beberapa kolom Rupiah sekaligus (label = nama kolom)."""
+    return {col: rupiah_column() for col in columns}
+
+def wow_growth_text(pct_change):
+    """Pertumbuhan WoW -> "▲ 12.3%" / "▼ -4.0%" / "▬ 0.0%" / "N/A", satu operasi per kolom."""
+    values = pd.to_numeric(pct_change, errors='coerce').to_numpy(dtype=float)
+    finite = np.isfinite(values)
+    arrows = np.select([values > WOW_THRESHOLD, values < -WOW_THRESHOLD], ['▲ ', '▼ '], '▬ ')
+    percents = np.char.mod('%.1f%%', np.where(finite, values * 100, 0.0))
+    text = np.where(finite, np.char.add(arrows, percents), 'N/A')
+    text = np.where(finite & (np.abs(values) <= WOW_THRESHOLD), '▬ 0.0%', text)
+    return pd.Series(text, index=getattr(pct_change, 'index', None), dtype=object)
+
+def weekly_growth(weekly):
+    # Salinan ringkasan mingguan dengan kolom teks pertumbuhan Omzet WoW
+    weekly = weekly.copy()
+    weekly['Pertumbuhan Omzet (WoW)'] = wow_growth_text(weekly['Omzet'].pct_change())
+    return weekly
+
+def wow_growth_colors(column):
+    # Untuk Styler.apply (per kolom): warna dari karakter panah pertama
+    return column.astype(str).str[0].map(WOW_COLORS).fillna('color: black')
@@ -0,0 +1,194 @@
+# ===================================================================================
+#  KLIEN GOOGLE SHEETS
+#  Kredensial service account dibangun dari secrets (st.secrets untuk dashboard,
+#  file .streamlit/secrets.toml untuk worker di luar Streamlit).
+#  Jika DASHBOARD_OFFLINE_WORKBOOK diisi path workbook JSON, dashboard & worker
+#  memakai klien tiruan dari offline_sheets.py tanpa kredensial.
+#  Panggilan API dihitung (jumlah & byte) saat instrumentasi aktif.
+#
+#  Semua permintaan lewat QuotaHTTPClient:
+#    - token bucket terpisah untuk baca & tulis, disetel di bawah kuota Sheets
+#      per menit, dipakai bersama oleh semua klien dalam satu proses;
+#    - retry dengan exponential backoff + jitter untuk 429 / kuota habis
+#      (dan 408 / 5xx / gangguan koneksi untuk permintaan baca);
+#    - permintaan baca identik yang sedang berjalan digabung: N sesi yang
+#      meminta sheet yang sama menunggu satu respons yang sama;
+#    - koneksi HTTP keep-alive dipakai ulang lewat pool per host.
+# ===================================================================================
+
+import os
+import random
+import threading
+import time
+import tomllib
+from concurrent.futures import Future
+
+import gspread
+import requests
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from requests.adapters import HTTPAdapter
+
+import instrumentation
+from instrumentation import instrument_client
+
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+OFFLINE_WORKBOOK = os.environ.get("DASHBOARD_OFFLINE_WORKBOOK")
+
+# ================================
+# KUOTA & RETRY
+# ================================
+# Kuota default Sheets API per pengguna (service account): 60 baca & 60 tulis per menit
+READS_PER_MINUTE = int(os.environ.get("SHEETS_READS_PER_MINUTE", 60))
+WRITES_PER_MINUTE = int(os.environ.get("SHEETS_WRITES_PER_MINUTE", 60))
+BURST = 10                 # permintaan yang boleh langsung dikirim berurutan
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 64.0
+POOL_SIZE = 16             # koneksi keep-alive per host (>= jumlah thread fetch paralel)
+REQUEST_TIMEOUT = (10, 120)  # (connect, read) detik
+RETRY_STATUS_READ = {408, 429, 500, 502, 503, 504}
+RETRY_STATUS_WRITE = {429}  # tulis (batchUpdate) tidak idempoten: hanya diulang jika pasti ditolak kuota
+
+
+class TokenBucket:
+    """Token bucket thread-safe. Isi ulang (per_minute - burst)/60 token per detik,
+    sehingga jendela 60 detik mana pun tidak melebihi per_minute permintaan."""
+
+    def __init__(self, per_minute, burst=BURST):
+        self.capacity = max(1, min(burst, per_minute - 1))
+        self.rate = max(per_minute - self.capacity, 1) / 60.0
+        self.tokens, self.updated = float(self.capacity), time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Blok sampai satu token tersedia; mengembalikan lama menunggu (detik)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+BUCKETS = {'baca': TokenBucket(READS_PER_MINUTE), 'tulis': TokenBucket(WRITES_PER_MINUTE)}
+
+def backoff_delay(attempt, retry_after=None):
+    # Full jitter: acak di [0, min(maks, dasar * 2^percobaan)], atau Retry-After dari server jika ada
+    if retry_after is not None: return retry_after
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+def is_quota_error(err):
+    # Kuota habis kadang dilaporkan sebagai 403 (usageLimits / RESOURCE_EXHAUSTED), bukan 429
+    error = err.error if isinstance(err.error, dict) else {}
+    reasons = {e.get('domain') for e in error.get('errors', [])} | {e.get('reason') for e in error.get('errors', [])}
+    return err.code == 429 or error.get('status') == 'RESOURCE_EXHAUSTED' or bool(reasons & {'usageLimits', 'rateLimitExceeded'})
+
+def _retry_after(err):
+    value = getattr(getattr(err, 'response', None), 'headers', {}).get('Retry-After')
+    try: return float(value) if value is not None else None
+    except ValueError: return None
+
+def _freeze(value):
+    if isinstance(value, dict): return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)): return tuple(_freeze(v) for v in value)
+    return value
+
+
+class QuotaHTTPClient(HTTPClient):
+    """HTTPClient gspread dengan rate limit, retry + backoff, penggabungan baca, dan pool keep-alive."""
+
+    def __init__(self, auth, session=None):
+        super().__init__(auth, session)
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.headers['Connection'] = 'keep-alive'
+        self.timeout = REQUEST_TIMEOUT
+        # Diperbarui dari banyak thread (fetch paralel & penggabungan baca): selalu di bawah _stats_lock
+        self._stats = {'dikirim': 0, 'digabung': 0, 'diulang': 0, 'menunggu_kuota_detik': 0.0}
+        self._stats_lock = threading.Lock()
+        self._inflight, self._inflight_lock = {}, threading.Lock()
+
+    @property
+    def stats(self):
+        # Salinan konsisten untuk ditampilkan (report pemuatan & diagnostik)
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        kwargs = dict(params=params, data=data, json=json, files=files, headers=headers)
+        if method.upper() != 'GET' or data is not None or files is not None:
+            return self._send('tulis', method, endpoint, kwargs)
+        # Baca identik yang sedang berjalan: tunggu respons milik permintaan pertama
+        key = (endpoint, _freeze(params))
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader: future = self._inflight[key] = Future()
+        if not leader:
+            self._count('digabung')
+            return future.result()
+        try:
+            response = self._send('baca', method, endpoint, kwargs)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _send(self, kind, method, endpoint, kwargs):
+        retry_status = RETRY_STATUS_READ if kind == 'baca' else RETRY_STATUS_WRITE
+        for attempt in range(MAX_RETRIES + 1):
+            waited = BUCKETS[kind].acquire()
+            if waited:
+                self._count('menunggu_kuota_detik', waited)
+            self._count('dikirim')
+            try:
+                return super().request(method, endpoint, **kwargs)
+            except APIError as err:
+                if attempt == MAX_RETRIES or not (err.code in retry_status or is_quota_error(err)): raise
+                delay = backoff_delay(attempt, _retry_after(err))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == MAX_RETRIES or kind != 'baca': raise
+                delay = backoff_delay(attempt)
+            self._count('diulang')
+            with instrumentation.span("sheets.backoff", jenis=kind, percobaan=attempt + 1):
+                time.sleep(delay)
+
+
+# ================================
+# KONEKSI
+# ================================
+def credentials_from_secrets(secrets):
+    return {
+        "type": secrets["gcp_type"], "project_id": secrets["gcp_project_id"],
+        "private_key_id": secrets["gcp_private_key_id"], "private_key": secrets["gcp_private_key_raw"].replace('\\n', '\n'),
+        "client_email": secrets["gcp_client_email"], "client_id": secrets["gcp_client_id"],
+        "auth_uri": secrets["gcp_auth_uri"], "token_uri": secrets["gcp_token_uri"],
+        "auth_provider_x509_cert_url": secrets["gcp_auth_provider_x509_cert_url"],
+        "client_x509_cert_url": secrets["gcp_client_x509_cert_url"]
+    }
+
+def connect(secrets):
+    if OFFLINE_WORKBOOK:
+        from offline_sheets import OfflineClient
+        return OfflineClient.from_file(OFFLINE_WORKBOOK)
+    return instrument_client(gspread.service_account_from_dict(credentials_from_secrets(secrets), http_client=QuotaHTTPClient))
+
+def load_secrets_file(path=SECRETS_PATH):
+    # Format yang sama dengan st.secrets, agar worker terjadwal memakai kredensial yang sama
+    if OFFLINE_WORKBOOK: return {}
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
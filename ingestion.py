@@ -0,0 +1,449 @@
+# ===================================================================================
+#  LAPISAN INGESTI GOOGLE SHEETS
+#  Mengambil nilai semua sheet REKAP, DATABASE, dan HASIL_MATCHING dengan
+#  permintaan batch (values:batchGet). Daftar sheet diambil dari satu panggilan
+#  metadata. Jika batch gagal, sheet diambil satu per satu lewat thread pool
+#  berukuran terbatas.
+#
+#  Pemuatan bersifat streaming: batch dibatasi jumlah sel (dari gridProperties),
+#  dan tiap sheet REKAP langsung diparse ke kolom bertipe begitu tiba (Harga &
+#  Terjual angka, Tanggal datetime64, Toko/Status/Brand categorical, teks
+#  di-intern). String mentahnya dilepas sebelum sheet berikutnya diproses, jadi
+#  puncak memori mendekati ukuran frame akhir, bukan seluruh nilai mentah.
+# ===================================================================================
+
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pandas.api.types import union_categoricals
+
+import instrumentation
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# ================================
+# KONSTANTA SHEET
+# ================================
+DATABASE_SHEET = "DATABASE"
+MATCHING_SHEET = "HASIL_MATCHING"
+
+# Nama sheet yang relevan sekarang termasuk DATABASE secara eksplisit
+SHEET_NAMES = [
+    "DATABASE", "DB KLIK - REKAP - READY", "DB KLIK - REKAP - HABIS",
+    "ABDITAMA - REKAP - READY", "ABDITAMA - REKAP - HABIS", "LEVEL99 - REKAP - READY", "LEVEL99 - REKAP - HABIS",
+    "JAYA PC - REKAP - READY", "JAYA PC - REKAP - HABIS", "MULTIFUNGSI - REKAP - READY", "MULTIFUNGSI - REKAP - HABIS",
+    "IT SHOP - REKAP - READY", "IT SHOP - REKAP - HABIS", "SURYA MITRA ONLINE - REKAP - READY", "SURYA MITRA ONLINE - REKAP - HABIS",
+    "GG STORE - REKAP - READY", "GG STORE - REKAP - HABIS", "TECH ISLAND - REKAP - READY", "TECH ISLAND - REKAP - HABIS",
+    "LOGITECH - REKAP - READY", "LOGITECH - REKAP - HABIS"
+]
+
+REKAP_RENAME = {
+    'NAMA': 'Nama Produk', 'TERJUAL/BLN': 'Terjual per Bulan',
+    'TANGGAL': 'Tanggal', 'HARGA': 'Harga', 'BRAND': 'Brand',
+    'STOK': 'Stok', 'TOKO': 'Toko', 'STATUS': 'Status'
+}
+REKAP_REQUIRED_COLS = ['Tanggal', 'Nama Produk', 'Harga', 'Toko']
+# Format kolom TANGGAL di sheet REKAP; None = dideteksi dari nilai pertama (dayfirst)
+REKAP_DATE_FORMAT = None
+
+# Skema akhir REKAP: kolom yang dipakai tab dashboard & pipeline pembaruan (kolom lain dibuang)
+REKAP_COLUMNS = [
+    'Tanggal', 'Nama Produk', 'SKU', 'Toko', 'Brand', 'KATEGORI', 'Status', 'Stok',
+    'Harga', 'Terjual per Bulan', 'Omzet',
+]
+REKAP_CATEGORY_COLS = ['Toko', 'Brand', 'KATEGORI', 'Status']
+REKAP_INTERN_COLS = ['Nama Produk', 'SKU']
+# Kolom teks lain menjadi categorical jika jumlah nilai uniknya <= rasio ini terhadap jumlah baris
+CATEGORY_MAX_RATIO = 0.5
+
+# Jumlah range per permintaan batch & jumlah thread untuk fallback per sheet
+BATCH_MAX_RANGES = 25
+# Batas sel (baris x kolom grid) per batch: nilai mentah satu batch harus muat di memori sekaligus
+BATCH_MAX_CELLS = 2_000_000
+FALLBACK_MAX_WORKERS = 4
+
+
+# ================================
+# FUNGSI PEMBANTU
+# ================================
+def a1_sheet_range(sheet_name):
+    # Nama sheet dikutip agar spasi dan tanda '-' aman dalam notasi A1
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+def pad_rows(values):
+    # API values:get memotong sel kosong di ujung baris; samakan panjangnya seperti get_all_values()
+    if not values: return []
+    width = max(len(row) for row in values)
+    return [row + [''] * (width - len(row)) if len(row) < width else row for row in values]
+
+def grid_cells(properties):
+    grid = properties.get('gridProperties', {})
+    return grid.get('rowCount', 0) * grid.get('columnCount', 0)
+
+def list_sheet_titles(spreadsheet):
+    # Satu panggilan metadata untuk seluruh daftar worksheet
+    metadata = spreadsheet.fetch_sheet_metadata()
+    return {s['properties']['title']: s['properties'] for s in metadata.get('sheets', [])}
+
+def workbook_sheet_names(available, sheet_names=SHEET_NAMES):
+    """sheet_names ditambah sheet REKAP lain yang ada di workbook (urutan workbook).
+
+    Toko yang sheet-nya ditambahkan ke workbook tetap ikut dimuat & dibandingkan
+    walaupun belum tercantum di SHEET_NAMES, sama seperti pencarian sheet
+    "REKAP" pada pembaruan harga versi awal.
+    """
+    known = set(sheet_names)
+    return list(sheet_names) + [title for title in available if "REKAP" in title.upper() and title not in known]
+
+def store_name_from_sheet(sheet_name):
+    store_name_match = re.match(r"^(.*?) - REKAP", sheet_name, re.IGNORECASE)
+    return store_name_match.group(1).strip() if store_name_match else "Toko Tak Dikenal"
+
+
+# ================================
+# PENGAMBILAN NILAI SHEET
+# ================================
+def _fetch_batch(spreadsheet, sheet_names, ranges):
+    with instrumentation.span("fetch.batch", ranges=len(sheet_names)):
+        response = spreadsheet.values_batch_get([ranges[name] for name in sheet_names])
+    value_ranges = response.get('valueRanges', [])
+    if len(value_ranges) != len(sheet_names):
+        raise ValueError(f"batchGet mengembalikan {len(value_ranges)} range untuk {len(sheet_names)} sheet")
+    return {name: pad_rows(vr.get('values', [])) for name, vr in zip(sheet_names, value_ranges)}
+
+def _fetch_single(spreadsheet, a1_range):
+    started = time.perf_counter()
+    with instrumentation.span("fetch.single", range=a1_range):
+        response = spreadsheet.values_get(a1_range)
+    return pad_rows(response.get('values', [])), time.perf_counter() - started
+
+def new_fetch_report():
+    return {'timings': [], 'warnings': [], 'missing': [], 'api_calls': 0}
+
+def iter_sheet_values(spreadsheet, sheet_names, report, batch_size=BATCH_MAX_RANGES, max_workers=FALLBACK_MAX_WORKERS, available=None):
+    """Generator (nama sheet, nilai mentah) untuk setiap sheet yang ada, segera setelah batch-nya tiba.
+
+    Sheet yang tidak ada dicatat di report['missing']; sheet yang gagal dibaca
+    di report['warnings']. available: hasil list_sheet_titles() jika pemanggil
+    sudah membacanya (tidak dibaca ulang).
+    """
+    if available is None:
+        available = list_sheet_titles(spreadsheet)
+        report['api_calls'] += 1
+    wanted = [name for name in sheet_names if name in available]
+    report['missing'] = [name for name in sheet_names if name not in available]
+    ranges = {name: a1_sheet_range(name) for name in wanted}
+    cells = {name: grid_cells(available[name]) for name in wanted}
+    yield from iter_ranges(spreadsheet, ranges, report, batch_size, max_workers, cells)
+
+def fetch_sheet_values(spreadsheet, sheet_names, batch_size=BATCH_MAX_RANGES, max_workers=FALLBACK_MAX_WORKERS):
+    """Ambil nilai mentah (list of rows) untuk setiap sheet sekaligus. Mengembalikan (values_by_sheet, report)."""
+    started = time.perf_counter()
+    report = new_fetch_report()
+    values_by_sheet = dict(iter_sheet_values(spreadsheet, sheet_names, report, batch_size, max_workers))
+    report['total_detik'] = time.perf_counter() - started
+    return values_by_sheet, report
+
+def _range_label(key):
+    return key if isinstance(key, str) else f"{key[0]} [{key[1]}]"
+
+def _batches(keys, batch_size, cells=None, max_cells=BATCH_MAX_CELLS):
+    # Potong daftar range per jumlah range dan (jika ukurannya diketahui) per jumlah sel
+    batch, batch_cells = [], 0
+    for key in keys:
+        size = cells.get(key, 0) if cells else 0
+        if batch and (len(batch) >= batch_size or batch_cells + size > max_cells):
+            yield batch
+            batch, batch_cells = [], 0
+        batch.append(key)
+        batch_cells += size
+    if batch: yield batch
+
+def _timing(key, mode, batch_id, fetch_seconds, rows):
+    return {'sheet': _range_label(key), 'mode': mode, 'batch': batch_id, 'detik': fetch_seconds,
+            'detik_ambil': fetch_seconds, 'detik_parse': 0.0, 'baris': rows}
+
+def add_parse_time(report, key, seconds):
+    # Tambahkan waktu parse ke entri timing range `key` (entri terbaru dengan label yang sama)
+    if report is None: return
+    label = _range_label(key)
+    for timing in reversed(report['timings']):
+        if timing['sheet'] == label:
+            timing['detik_parse'] += seconds
+            timing['detik'] = timing['detik_ambil'] + timing['detik_parse']
+            return
+
+def iter_ranges(spreadsheet, ranges, report, batch_size=BATCH_MAX_RANGES, max_workers=FALLBACK_MAX_WORKERS, cells=None):
+    """Generator (kunci, nilai) per range segera setelah tiba; batch berikutnya baru diminta saat dikonsumsi.
+
+    ranges: {kunci: range A1}; kunci boleh tuple (sheet, bagian). cells: perkiraan
+    sel per kunci untuk membatasi ukuran batch. Timing & peringatan ditambahkan ke `report`:
+    satu entri per range. Pada mode batch, detik_ambil adalah bagian range itu dari
+    waktu batch-nya (proporsional jumlah sel) dan 'batch' menandai permintaan asalnya;
+    detik_parse diisi pemanggil lewat add_parse_time().
+    """
+    pending = []
+    for batch_id, chunk in enumerate(_batches(list(ranges), batch_size, cells), start=1):
+        chunk_started = time.perf_counter()
+        report['api_calls'] += 1
+        try:
+            chunk_values = _fetch_batch(spreadsheet, chunk, ranges)
+        except Exception:
+            # Satu range bermasalah menggagalkan seluruh batch; ulangi per sheet di bawah
+            pending.extend(chunk)
+            continue
+        elapsed = time.perf_counter() - chunk_started
+        sizes = {name: sum(len(row) for row in chunk_values[name]) for name in chunk}
+        total_size = sum(sizes.values())
+        for name in chunk:
+            share = elapsed * (sizes[name] / total_size if total_size else 1 / len(chunk))
+            report['timings'].append(_timing(name, 'batch', batch_id, share, len(chunk_values[name])))
+        for name in chunk:
+            # pop: batch tidak lagi memegang nilai yang sudah diserahkan ke pemanggil
+            yield name, chunk_values.pop(name)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            fetch_single = instrumentation.bind(_fetch_single)
+            futures = {pool.submit(fetch_single, spreadsheet, ranges[name]): name for name in pending}
+            for future in as_completed(futures):
+                name = futures.pop(future)
+                report['api_calls'] += 1
+                try:
+                    values, elapsed = future.result()
+                except Exception as e:
+                    report['warnings'].append(f"Gagal baca sheet '{_range_label(name)}': {e}")
+                    continue
+                report['timings'].append(_timing(name, 'thread', None, elapsed, len(values)))
+                yield name, values
+                del values
+
+def fetch_ranges(spreadsheet, ranges, report, batch_size=BATCH_MAX_RANGES, max_workers=FALLBACK_MAX_WORKERS):
+    # Semua range sekaligus sebagai dict {kunci: nilai}
+    return dict(iter_ranges(spreadsheet, ranges, report, batch_size, max_workers))
+
+
+# ================================
+# PARSING & PEMBERSIHAN DATA REKAP
+# ================================
+def parse_dates(values, date_format=REKAP_DATE_FORMAT, dayfirst=True):
+    """Setara pd.to_datetime(values, errors='coerce', dayfirst=True), tetapi tiap string unik diparse sekali.
+
+    Kolom tanggal hanya berisi beberapa ratus nilai berbeda; nilai unik
+    diparse dengan format eksplisit (atau format yang dideteksi dari nilai
+    pertama, seperti yang dilakukan pandas) lalu dipetakan kembali lewat kode
+    factorize.
+    """
+    codes, uniques = pd.factorize(values)
+    if date_format is None:
+        first = next((v for v in uniques if isinstance(v, str) and v.strip()), None)
+        date_format = guess_datetime_format(first, dayfirst=dayfirst) if first is not None else None
+    if date_format is not None:
+        parsed = pd.to_datetime(uniques, format=date_format, errors='coerce')
+    else:
+        parsed = pd.to_datetime(uniques, errors='coerce', dayfirst=dayfirst)
+    return pd.Series(parsed.take(codes, allow_fill=True), index=values.index)
+
+def sheet_frame(sheet_name, header, data):
+    df_sheet = pd.DataFrame(data, columns=header)
+    if '' in df_sheet.columns: df_sheet = df_sheet.drop(columns=[''])
+    if "REKAP" in sheet_name.upper():
+        df_sheet['Toko'] = store_name_from_sheet(sheet_name)
+        if 'Status' not in df_sheet.columns:
+            df_sheet['Status'] = 'Tersedia' if "READY" in sheet_name.upper() else 'Habis'
+    return df_sheet
+
+def align_rows(header, rows):
+    # Baris hasil range parsial harus selebar header (sel kosong di ujung dipotong oleh API)
+    width = len(header)
+    return [row[:width] if len(row) >= width else row + [''] * (width - len(row)) for row in rows]
+
+def rekap_column_positions(header):
+    # {kolom skema REKAP: indeks di header}; header dinormalisasi seperti REKAP_RENAME, nama ganda: yang pertama
+    positions = {}
+    for i, col in enumerate(header):
+        col = str(col).strip().upper()
+        col = REKAP_RENAME.get(col, col)
+        if col in REKAP_COLUMNS and col not in positions:
+            positions[col] = i
+    return positions
+
+def _numbers(values, digits_only=False):
+    # Angka per nilai unik (nilai mentah banyak berulang); gagal parse -> NaN
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    text = pd.Series(uniques, dtype=object).astype(str)
+    if digits_only: text = text.str.replace(r'[^\d]', '', regex=True)
+    numbers = pd.to_numeric(text, errors='coerce').to_numpy(dtype=float)
+    return np.append(numbers, np.nan)[codes]
+
+def parse_rekap_values(sheet_name, header, rows):
+    """Parse baris mentah satu sheet REKAP langsung ke potongan bertipe (kolom REKAP_COLUMNS).
+
+    Hanya kolom skema yang diambil dari baris mentah. Harga: digit saja; Terjual:
+    angka (kosong = 0); Tanggal: datetime64; Toko & Status: categorical dari nama
+    sheet (Status dari kolomnya jika ada); Brand & KATEGORI categorical; teks lain
+    di-intern. Baris tanpa Tanggal/Harga yang valid dibuang. Brand fallback diisi
+    di fill_brand setelah digabung.
+    """
+    positions = rekap_column_positions(header)
+    if not all(col in positions or col == 'Toko' for col in REKAP_REQUIRED_COLS):
+        return pd.DataFrame(columns=REKAP_REQUIRED_COLS)
+
+    def column(name):
+        i = positions[name]
+        return np.array([row[i] for row in rows], dtype=object)
+
+    tanggal = parse_dates(pd.Series(column('Tanggal'))).to_numpy()
+    harga = _numbers(column('Harga'), digits_only=True)
+    keep = ~(np.isnan(harga) | pd.isna(tanggal))
+    n = int(keep.sum())
+    terjual = np.nan_to_num(_numbers(column('Terjual per Bulan'))[keep]) if 'Terjual per Bulan' in positions else np.zeros(n)
+
+    chunk = {
+        'Tanggal': tanggal[keep],
+        'Nama Produk': intern_strings(pd.Series(column('Nama Produk')[keep]).astype(str).str.strip()),
+        'Toko': pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [store_name_from_sheet(sheet_name)]),
+    }
+    if 'Status' not in positions:
+        status = 'Tersedia' if "READY" in sheet_name.upper() else 'Habis'
+        chunk['Status'] = pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), [status])
+    for col in positions:
+        if col in chunk or col in ('Harga', 'Terjual per Bulan', 'Omzet'): continue
+        values = column(col)[keep]
+        chunk[col] = pd.Categorical(values) if col in REKAP_CATEGORY_COLS else intern_strings(pd.Series(values))
+    chunk['Harga'] = harga[keep]
+    chunk['Terjual per Bulan'] = terjual
+    chunk['Omzet'] = (chunk['Harga'] * terjual).astype(int)
+    return pd.DataFrame({col: chunk[col] for col in REKAP_COLUMNS if col in chunk})
+
+def needs_brand_fallback(rekap_df):
+    return 'Brand' not in rekap_df.columns or rekap_df['Brand'].isnull().all()
+
+def fill_brand(rekap_df, force=False):
+    if force or needs_brand_fallback(rekap_df):
+        rekap_df['Brand'] = rekap_df['Nama Produk'].str.split(n=1).str[0].str.upper()
+    return rekap_df
+
+def build_frames(sheet_values, sheet_names=SHEET_NAMES, on_rekap=None, report=None):
+    """Ubah nilai mentah menjadi (rekap_parts, database_df, matches_df).
+
+    sheet_values: iterable (nama sheet, nilai mentah), mis. iter_sheet_values()
+    atau dict.items(). Tiap sheet REKAP diparse begitu diterima dan nilai
+    mentahnya dilepas sebelum sheet berikutnya; on_rekap(nama, nilai, part)
+    dipanggil sebelum dilepas. rekap_parts: {nama sheet: potongan bertipe},
+    urut menurut sheet_names. Jika report diberikan, waktu parse tiap sheet
+    ditambahkan ke entri timing-nya.
+    """
+    rekap_parts, database_df, matches_df = {}, pd.DataFrame(), parse_matches_values(None)
+    for sheet_name, all_values in sheet_values:
+        parse_started = time.perf_counter()
+        if sheet_name == MATCHING_SHEET:
+            with instrumentation.span("parse.matching"):
+                matches_df = parse_matches_values(all_values)
+        elif sheet_name in sheet_names and all_values and len(all_values) >= 2:
+            with instrumentation.span("parse.sheet", sheet=sheet_name, baris=len(all_values) - 1):
+                if "DATABASE" in sheet_name.upper():
+                    database_df = sheet_frame(sheet_name, all_values[0], all_values[1:])
+                elif "REKAP" in sheet_name.upper():
+                    rekap_parts[sheet_name] = parse_rekap_values(sheet_name, all_values[0], all_values[1:])
+                    if on_rekap is not None: on_rekap(sheet_name, all_values, rekap_parts[sheet_name])
+        add_parse_time(report, sheet_name, time.perf_counter() - parse_started)
+        del all_values
+    return {name: rekap_parts[name] for name in sheet_names if name in rekap_parts}, database_df, matches_df
+
+def concat_typed(frames):
+    """pd.concat untuk potongan bertipe. Kolom categorical digabung dengan union_categoricals
+    (kategori terurut, seperti astype('category')); pd.concat biasa jatuh ke object
+    jika kategori antarpotongan berbeda."""
+    frames = list(frames)
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    columns = list(dict.fromkeys(col for frame in frames for col in frame.columns))
+    combined = {}
+    for col in columns:
+        parts = [frame[col] if col in frame.columns else pd.Series(np.nan, index=frame.index, dtype=object) for frame in frames]
+        if any(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            try:
+                combined[col] = pd.Series(union_categoricals([pd.Categorical(part) for part in parts], sort_categories=True))
+                continue
+            except TypeError:
+                parts = [part.astype(object) for part in parts]
+        combined[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(combined)
+
+def assemble_rekap(rekap_frames):
+    rekap_df = concat_typed(rekap_frames)
+    return fill_brand(rekap_df).sort_values('Tanggal').reset_index(drop=True)
+
+
+# ================================
+# SKEMA & TIPE DATA RINGKAS
+# ================================
+def intern_strings(values):
+    # Satu objek string per nilai unik (dibagi juga dengan frame lain lewat sys.intern)
+    codes, uniques = pd.factorize(values)
+    uniques = np.array([sys.intern(v) if isinstance(v, str) else v for v in uniques] + [np.nan], dtype=object)
+    return pd.Series(uniques[codes], index=values.index, name=values.name)
+
+def downcast_numeric(values):
+    # Bilangan bulat tanpa NaN -> tipe integer terkecil; pecahan tetap float64 (nilai rupiah tidak dibulatkan)
+    if values.isna().any() or not np.array_equal(values, np.floor(values)):
+        return values
+    return pd.to_numeric(values.astype(np.int64), downcast='integer')
+
+def compact_rekap(rekap_df):
+    """Terapkan skema akhir REKAP: buang kolom tak terpakai, categorical, intern, downcast.
+
+    Mengembalikan (rekap_df, memory_report).
+    """
+    before = rekap_df
+    rekap_df = rekap_df[[col for col in REKAP_COLUMNS if col in rekap_df.columns]].copy()
+    for col in rekap_df.columns:
+        values = rekap_df[col]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            rekap_df[col] = downcast_numeric(values)
+        elif col in REKAP_CATEGORY_COLS:
+            rekap_df[col] = values.astype('category')
+        elif values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+            if col not in REKAP_INTERN_COLS and values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+                rekap_df[col] = values.astype('category')
+            else:
+                rekap_df[col] = intern_strings(values)
+    return rekap_df, memory_report(rekap_df, before)
+
+def memory_report(rekap_df, before=None):
+    # Memori per kolom (MB, termasuk isi string); kolom yang dibuang tercatat dengan nilai sesudah 0.
+    # memory_usage(deep=True) menghitung string per baris, jadi hemat dari intern tidak terlihat di sini.
+    after_usage = rekap_df.memory_usage(index=False, deep=True)
+    before_usage = before.memory_usage(index=False, deep=True) if before is not None else after_usage
+    rows = []
+    for col in before_usage.index.union(after_usage.index, sort=False):
+        rows.append({
+            'kolom': col,
+            'tipe': str(rekap_df[col].dtype) if col in rekap_df.columns else 'dibuang',
+            'sebelum_mb': before_usage.get(col, 0) / 2**20,
+            'sesudah_mb': after_usage.get(col, 0) / 2**20,
+        })
+    return rows
+
+
+# ================================
+# PARSING HASIL_MATCHING
+# ================================
+def parse_matches_values(values):
+    # Setara get_all_records(): baris pertama header, angka dikonversi per kolom
+    if not values or len(values) < 2: return pd.DataFrame()
+    header = [str(c).strip() for c in values[0]]
+    matches_df = pd.DataFrame(values[1:], columns=header)
+    for col in matches_df.columns:
+        non_empty = matches_df[col] != ''
+        converted = pd.to_numeric(matches_df[col].str.replace(',', '', regex=False), errors='coerce')
+        if non_empty.any() and converted[non_empty].notna().all():
+            matches_df[col] = converted
+    return matches_df
@@ -0,0 +1,172 @@
+# ===================================================================================
+#  INSTRUMENTASI RINGAN: SPAN WAKTU PER TAHAP & HITUNGAN PANGGILAN API
+#  Satu "trace" mengumpulkan span (nama, mulai, durasi, kedalaman) dan jumlah
+#  panggilan/byte Google Sheets API selama satu run dashboard atau satu job
+#  worker. Trace aktif disimpan di contextvar, sehingga sesi Streamlit yang
+#  berjalan paralel tidak saling mencampur.
+#
+#  Jika tidak ada trace aktif (instrumentasi mati), span() mengembalikan
+#  context manager kosong yang sama setiap kali: biayanya satu lookup
+#  contextvar per tahap, tanpa alokasi & tanpa jam.
+#
+#  Trace yang selesai ditulis sebagai satu baris JSON ke log terstruktur
+#  (DASHBOARD_DIAGNOSTICS_LOG) dan bisa ditampilkan di panel diagnostik sidebar.
+# ===================================================================================
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+# ================================
+# KONFIGURASI
+# ================================
+DIAGNOSTICS_DEFAULT = os.environ.get("DASHBOARD_DIAGNOSTICS", "") not in ("", "0")
+DIAGNOSTICS_LOG = os.environ.get(
+    "DASHBOARD_DIAGNOSTICS_LOG",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "diagnostics.jsonl"),
+)
+MAX_SPANS = 2000  # batas span per trace (mis. span per produk di loop panjang)
+
+logger = logging.getLogger("dashboard.diagnostics")
+
+_current = contextvars.ContextVar("diagnostics_trace", default=None)
+_parent = contextvars.ContextVar("diagnostics_parent", default=None)
+_NOOP = nullcontext()
+
+
+class Trace:
+    def __init__(self, name, **attrs):
+        self.name, self.attrs = name, attrs
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.started = self.last_activity = time.perf_counter()
+        self.seconds = None
+        self.spans = []
+        self.api = {'calls': 0, 'bytes_in': 0, 'bytes_out': 0, 'detik': 0.0}
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self):
+        return self.seconds is not None
+
+    def add_api_call(self, bytes_in=0, bytes_out=0, seconds=0.0):
+        with self._lock:
+            self.api['calls'] += 1
+            self.api['bytes_in'] += int(bytes_in)
+            self.api['bytes_out'] += int(bytes_out)
+            self.api['detik'] += seconds
+
+    def to_dict(self):
+        return {'trace': self.name, 'waktu': self.started_at, 'detik': self.seconds, 'atribut': self.attrs,
+                'api': dict(self.api), 'spans': list(self.spans)}
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'attrs', 'started', 'api_before', 'token', 'depth')
+
+    def __init__(self, trace, name, attrs):
+        self.trace, self.name, self.attrs = trace, name, attrs
+
+    def __enter__(self):
+        parent = _parent.get()
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.token = _parent.set(self)
+        self.api_before = (self.trace.api['calls'], self.trace.api['bytes_in'])
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ended = time.perf_counter()
+        _parent.reset(self.token)
+        trace = self.trace
+        with trace._lock:
+            trace.last_activity = ended
+            if len(trace.spans) < MAX_SPANS:
+                trace.spans.append({
+                    'nama': self.name, 'kedalaman': self.depth, 'mulai': self.started - trace.started,
+                    'detik': ended - self.started, 'api_calls': trace.api['calls'] - self.api_before[0],
+                    'bytes_in': trace.api['bytes_in'] - self.api_before[1], 'gagal': exc_type is not None,
+                    **self.attrs,
+                })
+        return False
+
+
+# ================================
+# API PUBLIK
+# ================================
+def active():
+    trace = _current.get()
+    return trace is not None and not trace.finished
+
+def span(name, **attrs):
+    """Context manager pengukur satu tahap; tidak melakukan apa pun jika tidak ada trace aktif."""
+    trace = _current.get()
+    if trace is None or trace.finished: return _NOOP
+    return _Span(trace, name, attrs)
+
+def start_trace(name, enabled=None, **attrs):
+    """Mulai trace baru untuk konteks (thread) ini. Mengembalikan Trace, atau None jika instrumentasi mati."""
+    if not (DIAGNOSTICS_DEFAULT if enabled is None else enabled):
+        _current.set(None)
+        return None
+    trace = Trace(name, **attrs)
+    _current.set(trace)
+    _parent.set(None)
+    return trace
+
+def finish_trace(trace, ended=None, log_path=DIAGNOSTICS_LOG):
+    """Tutup trace dan tulis ke log terstruktur (JSON lines). Aman dipanggil dengan None atau dua kali.
+
+    ended (perf_counter) dipakai untuk trace yang terputus, mis. trace.last_activity
+    untuk run Streamlit yang berhenti lewat st.stop()/st.rerun().
+    """
+    if trace is None or trace.finished: return trace
+    trace.seconds = (ended or time.perf_counter()) - trace.started
+    if _current.get() is trace: _current.set(None)
+    record = trace.to_dict()
+    logger.info(json.dumps(record, ensure_ascii=False, default=str))
+    if log_path:
+        try:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        except OSError:
+            pass
+    return trace
+
+def record_api_call(bytes_in=0, bytes_out=0, seconds=0.0):
+    trace = _current.get()
+    if trace is not None and not trace.finished:
+        trace.add_api_call(bytes_in, bytes_out, seconds)
+
+def bind(fn):
+    # Ikat fn ke konteks pemanggil (untuk ThreadPoolExecutor) agar span & hitungan API masuk ke trace yang sama
+    if not active(): return fn
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+def instrument_client(gc):
+    """Hitung panggilan & byte Google Sheets API di sesi HTTP gspread (satu titik untuk semua endpoint).
+
+    Yang dihitung adalah permintaan yang benar-benar dikirim: retry ikut terhitung,
+    baca yang digabung dengan permintaan lain (gsheets_client) tidak.
+    """
+    session = getattr(getattr(gc, 'http_client', None), 'session', None)
+    if session is None or getattr(session, '_diagnostics', False): return gc
+    request = session.request
+
+    def counted_request(*args, **kwargs):
+        if not active(): return request(*args, **kwargs)
+        started = time.perf_counter()
+        response = request(*args, **kwargs)
+        body = kwargs.get('json')
+        record_api_call(len(response.content or b''), len(json.dumps(body)) if body is not None else 0, time.perf_counter() - started)
+        return response
+
+    session.request = counted_request
+    session._diagnostics = True
+    return gc
@@ -0,0 +1,245 @@
+# ===================================================================================
+#  ANTREAN JOB LOKAL UNTUK PEMBARUAN PERBANDINGAN HARGA
+#  Setiap job adalah satu file JSON (status, progres, pesan, hasil) di
+#  .cache/jobs. Dashboard mengirim job & membaca statusnya tanpa menunggu;
+#  worker.py menjalankannya di proses terpisah. Job untuk spreadsheet yang sama
+#  yang masih antre/berjalan tidak diduplikasi.
+#
+#  Semua perubahan file job lewat update_job di bawah kunci antrean (baca-ubah-
+#  tulis atomik antar-proses). Job aktif yang worker-nya mati, atau yang antre
+#  terlalu lama tanpa pernah dijalankan, ditandai gagal agar tidak memblokir
+#  pengiriman berikutnya. Hanya KEEP_JOBS job terakhir per spreadsheet disimpan.
+# ===================================================================================
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+JOBS_DIR = os.environ.get(
+    "DASHBOARD_JOBS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jobs"),
+)
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker.py")
+ACTIVE_STATUSES = ('antre', 'berjalan')
+LOCK_TIMEOUT = 10
+QUEUED_TIMEOUT_SECONDS = 120  # job 'antre' tanpa pid yang tidak pernah diambil worker
+KEEP_JOBS = 20                # job selesai yang disimpan per spreadsheet (beserta log-nya)
+_lock_state = threading.local()
+# Worker yang dijalankan proses ini (pid -> Popen); poll() memanen worker yang sudah keluar
+_workers = {}
+
+
+def now():
+    # Cap waktu job (created_at, started_at, finished_at), dipakai juga oleh worker.py
+    return datetime.now().isoformat(timespec='seconds')
+
+def _job_path(job_id):
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def _lock_holder(lock_path):
+    # pid pemegang kunci; None jika file kosong/tak terbaca (baru dibuat atau sudah dilepas)
+    try:
+        with open(lock_path, encoding='utf-8') as f:
+            return int(f.read().strip() or 0) or None
+    except (OSError, ValueError):
+        return None
+
+def _steal_stale_lock(lock_path, holder):
+    # Pindahkan kunci basi ke nama unik dulu, lalu pastikan yang dipindahkan memang milik pemegang
+    # yang mati; jika ternyata kunci baru milik proses lain, kembalikan (link gagal jika sudah ada kunci lain)
+    stale_path = f"{lock_path}.{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    try:
+        os.rename(lock_path, stale_path)
+    except OSError:
+        return
+    if _lock_holder(stale_path) != holder:
+        try: os.link(stale_path, lock_path)
+        except OSError: pass
+    os.remove(stale_path)
+
+@contextmanager
+def _queue_lock():
+    # Kunci antar-proses sederhana: file dibuat secara eksklusif (O_EXCL) berisi pid pemegangnya.
+    # Reentran di thread yang sama (mis. create_job -> list_jobs -> update_job). Setelah
+    # LOCK_TIMEOUT, kunci hanya diambil alih jika proses pemegangnya sudah mati; pemegang
+    # yang masih hidup tetapi lambat ditunggu.
+    if getattr(_lock_state, 'depth', 0):
+        _lock_state.depth += 1
+        try:
+            yield
+        finally:
+            _lock_state.depth -= 1
+        return
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    lock_path = os.path.join(JOBS_DIR, "queue.lock")
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            break
+        except FileExistsError:
+            if time.monotonic() > deadline:
+                holder = _lock_holder(lock_path)
+                if not _pid_alive(holder):
+                    _steal_stale_lock(lock_path, holder)  # kunci basi dari proses yang mati
+                    continue
+            time.sleep(0.05)
+    _lock_state.depth = 1
+    try:
+        yield
+    finally:
+        _lock_state.depth = 0
+        os.close(fd)
+        os.remove(lock_path)
+
+def _is_zombie(pid):
+    # Proses yang sudah keluar tetapi belum dipanen induknya: os.kill(pid, 0) tetap berhasil
+    try:
+        with open(f"/proc/{pid}/stat", encoding='utf-8') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] == 'Z'
+    except (OSError, IndexError):
+        return False
+
+def _pid_alive(pid):
+    if not pid: return False
+    process = _workers.get(pid)
+    if process is not None:
+        if process.poll() is None: return True
+        del _workers[pid]
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return not _is_zombie(pid)
+
+
+# ================================
+# BACA / TULIS STATUS JOB
+# ================================
+def read_job(job_id):
+    try:
+        with open(_job_path(job_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_job(job):
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    tmp_path = _job_path(job['id']) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, _job_path(job['id']))
+    return job
+
+def update_job(job_id, **fields):
+    # Baca-ubah-tulis di bawah kunci: tulisan dashboard & worker tidak saling menimpa
+    with _queue_lock():
+        job = read_job(job_id) or {'id': job_id}
+        job.update(fields)
+        return write_job(job)
+
+def _job_ids():
+    # ID diawali cap waktu pembuatan, jadi urutan nama file = urutan job
+    if not os.path.isdir(JOBS_DIR): return []
+    return sorted(file_name[:-5] for file_name in os.listdir(JOBS_DIR) if file_name.endswith('.json'))
+
+def _matches_key(job, spreadsheet_key):
+    return spreadsheet_key is None or job.get('params', {}).get('spreadsheet_key') == spreadsheet_key
+
+def list_jobs(spreadsheet_key=None):
+    jobs = []
+    for job_id in _job_ids():
+        job = read_job(job_id)
+        if job and _matches_key(job, spreadsheet_key):
+            jobs.append(_check_alive(job))
+    return jobs
+
+def _dead_reason(job):
+    if job.get('status') not in ACTIVE_STATUSES: return None
+    if job.get('pid'):
+        return None if _pid_alive(job['pid']) else "Proses worker berhenti tanpa menyelesaikan job."
+    created = datetime.fromisoformat(job.get('created_at', now()))
+    if (datetime.now() - created).total_seconds() > QUEUED_TIMEOUT_SECONDS:
+        return "Worker tidak pernah memulai job ini."
+    return None
+
+def _check_alive(job):
+    # Job aktif yang prosesnya sudah mati (atau tak pernah mulai) ditandai gagal
+    if _dead_reason(job) is None: return job
+    with _queue_lock():
+        job = read_job(job['id']) or job  # periksa ulang versi terbaru di bawah kunci
+        reason = _dead_reason(job)
+        if reason is None: return job
+        job.update(status='gagal', pesan=reason, finished_at=now())
+        return write_job(job)
+
+def latest_job(spreadsheet_key):
+    # Dibaca dari job terbaru mundur; berhenti di job pertama milik spreadsheet ini
+    for job_id in reversed(_job_ids()):
+        job = read_job(job_id)
+        if job and _matches_key(job, spreadsheet_key):
+            return _check_alive(job)
+    return None
+
+def active_job(spreadsheet_key):
+    for job in reversed(list_jobs(spreadsheet_key)):
+        if job.get('status') in ACTIVE_STATUSES: return job
+    return None
+
+
+# ================================
+# PENGIRIMAN JOB
+# ================================
+def prune_jobs(spreadsheet_key, keep=KEEP_JOBS):
+    # Hapus job selesai tertua (file JSON & log) di luar `keep` job terakhir spreadsheet ini
+    with _queue_lock():
+        jobs = list_jobs(spreadsheet_key)
+        for job in jobs[:-keep] if keep else jobs:
+            if job.get('status') in ACTIVE_STATUSES: continue
+            for path in (_job_path(job['id']), _job_path(job['id'])[:-5] + '.log'):
+                try: os.remove(path)
+                except OSError: pass
+
+def create_job(params, pid=None):
+    """Buat record job baru, atau kembalikan job aktif untuk spreadsheet yang sama.
+
+    pid diisi jika job langsung dijalankan oleh proses pemanggil (mode terjadwal).
+    Mengembalikan (job, dibuat_baru).
+    """
+    with _queue_lock():
+        existing = active_job(params['spreadsheet_key'])
+        if existing is not None:
+            return existing, False
+        job = write_job({
+            'id': datetime.now().strftime('%Y%m%d%H%M%S%f') + '-' + uuid.uuid4().hex[:6],
+            'params': params, 'status': 'antre', 'progress': 0, 'pesan': "Menunggu worker...",
+            'created_at': now(), 'pid': pid,
+        })
+        prune_jobs(params['spreadsheet_key'])
+    return job, True
+
+def submit_job(params):
+    """Kirim job ke worker latar belakang (proses terpisah). Tidak menunggu job selesai."""
+    job, created = create_job(params)
+    if created:
+        log_path = _job_path(job['id'])[:-5] + '.log'
+        with open(log_path, 'ab') as log:
+            process = subprocess.Popen(
+                [sys.executable, WORKER_SCRIPT, '--job', job['id']],
+                stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+            )
+        # Handle disimpan agar worker yang mati (OOM, SIGKILL, crash) dipanen lewat poll(), bukan jadi zombie
+        _workers[process.pid] = process
+        # Di bawah kunci: hanya pid yang ditambahkan, status/progres dari worker tidak tertimpa
+        job = update_job(job['id'], pid=process.pid)
+    return job, created
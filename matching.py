@@ -0,0 +1,361 @@
+# ===================================================================================
+#  MESIN PENCOCOKAN PRODUK (FUZZY MATCHING)
+#  Semua nama produk DB KLIK diskor terhadap semua nama produk kompetitor dalam
+#  satu batch matriks (rapidfuzz.process.cdist, semua core). Hasilnya identik
+#  dengan process.extract(..., limit=5, score_cutoff=...) per baris: skor
+#  tertinggi dulu, skor sama diurutkan menurut urutan nama kompetitor.
+#  Dengan blocking, token_set_ratio hanya dihitung untuk kandidat yang berbagi
+#  token informatif (brand, nomor model, kapasitas/ukuran) lewat indeks terbalik.
+# ===================================================================================
+
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+# Batas jumlah sel matriks skor per blok (float64) agar memori tetap terkendali
+MATRIX_CELL_BUDGET = 8_000_000
+DEFAULT_LIMIT = 5
+# Batas jumlah pasangan kandidat per blok query pada mode blocking
+PAIR_BLOCK_BUDGET = 2_000_000
+RECALL_SAMPLE_SIZE = 200
+# Recall diukur ulang pada sampel semua produk jika pengukuran terakhir lebih tua dari ini
+RECALL_MAX_AGE_DAYS = 7
+
+# Cache skor pasangan: semua pasangan dengan skor >= lantai disimpan, sehingga
+# cutoff berapa pun di atas lantai (slider minimal 80) bisa dilayani dari cache.
+MATCH_CACHE_ROOT = os.environ.get(
+    "DASHBOARD_MATCH_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "matching"),
+)
+CACHE_SCORE_FLOOR = 80
+CACHE_VERSION = 2
+
+
+def top_k_per_row(rows, cols, scores, limit):
+    # Urutkan pasangan per baris: skor menurun, lalu indeks kolom menaik (sama seperti process.extract).
+    # limit=None mengembalikan semua pasangan yang sudah terurut.
+    order = np.lexsort((cols, -scores, rows))
+    rows, cols, scores = rows[order], cols[order], scores[order]
+    if len(rows) == 0 or limit is None: return rows, cols, scores
+    group_start = np.r_[0, np.flatnonzero(np.diff(rows)) + 1]
+    group_sizes = np.diff(np.r_[group_start, len(rows)])
+    rank = np.arange(len(rows)) - np.repeat(group_start, group_sizes)
+    keep = rank < limit
+    return rows[keep], cols[keep], scores[keep]
+
+def top_matches(queries, choices, score_cutoff, limit=DEFAULT_LIMIT, scorer=fuzz.token_set_ratio, workers=-1, progress=None):
+    """Cari maksimal `limit` kecocokan per query dengan skor >= score_cutoff.
+
+    Mengembalikan (query_idx, choice_idx, scores, stats). Array diurutkan per
+    query sesuai urutan process.extract. stats berisi jumlah pasangan, durasi,
+    dan throughput (pasangan per detik). `progress(selesai, total)` dipanggil
+    sekali per blok, bukan per baris.
+    """
+    started = time.perf_counter()
+    n_queries, n_choices = len(queries), len(choices)
+    empty = np.array([], dtype=np.int64)
+    parts = []
+    if n_queries and n_choices:
+        chunk_size = max(1, MATRIX_CELL_BUDGET // n_choices)
+        for start in range(0, n_queries, chunk_size):
+            block = process.cdist(queries[start:start + chunk_size], choices, scorer=scorer,
+                                  score_cutoff=score_cutoff, dtype=np.float64, workers=workers)
+            rows, cols = np.nonzero(block >= score_cutoff)
+            scores = block[rows, cols]
+            parts.append(top_k_per_row(rows + start, cols, scores, limit))
+            if progress: progress(min(start + chunk_size, n_queries), n_queries)
+
+    if parts:
+        query_idx, choice_idx, scores = (np.concatenate(arrays) for arrays in zip(*parts))
+    else:
+        query_idx, choice_idx, scores = empty, empty, np.array([], dtype=np.float64)
+
+    elapsed = time.perf_counter() - started
+    pairs = n_queries * n_choices
+    stats = {'pasangan': pairs, 'detik': elapsed, 'pasangan_per_detik': pairs / elapsed if elapsed > 0 else 0.0}
+    return query_idx, choice_idx, scores, stats
+
+
+# ================================
+# EKSPANSI HASIL KE BARIS KOMPETITOR
+# ================================
+def build_name_index(names, choices):
+    """Indeks nama -> posisi baris (gaya CSR): (order, starts, counts) per posisi di `choices`."""
+    codes = pd.Index(choices).get_indexer(names)
+    order = np.argsort(codes, kind='stable')
+    counts = np.bincount(codes[codes >= 0], minlength=len(choices))
+    order = order[len(codes) - counts.sum():]  # buang nama yang tidak ada di choices (kode -1 di depan)
+    starts = np.cumsum(counts) - counts
+    return order, starts, counts
+
+def expand_matches(my_names, my_prices, competitor_df, choices, query_idx, choice_idx, scores, update_date):
+    """Bentuk frame HASIL_MATCHING langsung dalam bentuk kolom.
+
+    Setiap pasangan (produk saya, nama kompetitor) diperluas ke semua baris
+    competitor_df dengan nama tersebut, dengan urutan yang sama seperti loop
+    iterrows() lama: per produk saya, per kecocokan, per baris kompetitor.
+    """
+    order, starts, counts = build_name_index(competitor_df['Nama Produk'].to_numpy(), choices)
+    lengths = counts[choice_idx]
+    match_rep = np.repeat(np.arange(len(choice_idx)), lengths)
+    within = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    comp_pos = order[starts[choice_idx][match_rep] + within]
+
+    my_names = np.asarray(my_names, dtype=object)
+    my_prices = np.asarray(my_prices, dtype=np.float64).astype(np.int64)
+    rows_q = query_idx[match_rep]
+    return pd.DataFrame({
+        'Produk Toko Saya': my_names[rows_q],
+        'Harga Toko Saya': my_prices[rows_q],
+        'Produk Kompetitor': np.asarray(choices, dtype=object)[choice_idx][match_rep],
+        'Harga Kompetitor': competitor_df['Harga'].to_numpy(dtype=np.float64).astype(np.int64)[comp_pos],
+        'Toko Kompetitor': competitor_df['Toko'].to_numpy(dtype=object)[comp_pos],
+        'Skor Kemiripan': scores.astype(np.int64)[match_rep],
+        'Tanggal_Update': update_date,
+    })
+
+# ================================
+# NORMALISASI NAMA & INDEKS TOKEN
+# ================================
+# "IN" hanya dianggap inci jika menempel pada angka ("27IN"), agar "2 IN 1" tidak jadi 2INCH
+_SIZE_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)(?:\s*(?:"|\'\'|INCH(?:ES)?\b)|IN\b)')
+_UNIT_PATTERN = re.compile(r'(\d+(?:[.,]\d+)?)\s+(TB|GB|MB|HZ|MHZ|GHZ|W|MM|CM|MAH|MP|DPI|K)\b')
+_NON_ALNUM = re.compile(r'[^A-Z0-9]+')
+
+def normalize_name(name):
+    # "27 inch" / 27" / 27in -> 27INCH, "1 TB" -> 1TB, tanda baca jadi spasi
+    name = str(name).upper()
+    name = _SIZE_PATTERN.sub(r'\1INCH', name)
+    name = _UNIT_PATTERN.sub(r'\1\2', name)
+    return _NON_ALNUM.sub(' ', name).strip()
+
+def informative_tokens(normalized):
+    # Brand (token pertama) + semua token yang mengandung angka (model, kapasitas, ukuran)
+    tokens = normalized.split()
+    if not tokens: return set()
+    keys = {tok for tok in tokens if len(tok) >= 2 and any(ch.isdigit() for ch in tok)}
+    if len(tokens[0]) >= 2 and tokens[0].isalpha(): keys.add(tokens[0])
+    return keys
+
+def _token_table(names):
+    # Tabel panjang (posisi, token); nama dinormalisasi sekali saja
+    tokens = [sorted(informative_tokens(normalize_name(name))) for name in names]
+    table = pd.DataFrame({'pos': np.arange(len(names)), 'token': tokens}).explode('token')
+    return table.dropna(subset=['token']), np.array([len(t) == 0 for t in tokens], dtype=bool)
+
+def build_token_index(choices):
+    """Indeks terbalik token -> array posisi nama kompetitor (menaik)."""
+    table, no_tokens = _token_table(choices)
+    index = {token: group.to_numpy() for token, group in table.groupby('token')['pos']}
+    return index, np.flatnonzero(no_tokens)
+
+def candidate_pairs(queries, choices, choice_table=None, choice_untokened=None):
+    # Pasangan (query, kandidat) unik yang berbagi minimal satu token informatif.
+    # Query tanpa token dibandingkan ke semua nama; nama kompetitor tanpa token
+    # menjadi kandidat untuk semua query.
+    if choice_table is None:
+        choice_table, untokened_mask = _token_table(choices)
+        choice_untokened = np.flatnonzero(untokened_mask)
+    query_table, query_untokened = _token_table(queries)
+    pairs = query_table.merge(choice_table, on='token', suffixes=('_q', '_c'))[['pos_q', 'pos_c']]
+    extra = []
+    untokened_queries = np.flatnonzero(query_untokened)
+    if len(untokened_queries):
+        extra.append(pd.DataFrame({'pos_q': np.repeat(untokened_queries, len(choices)), 'pos_c': np.tile(np.arange(len(choices)), len(untokened_queries))}))
+    if len(choice_untokened):
+        tokened_queries = np.flatnonzero(~query_untokened)
+        extra.append(pd.DataFrame({'pos_q': np.repeat(tokened_queries, len(choice_untokened)), 'pos_c': np.tile(choice_untokened, len(tokened_queries))}))
+    if extra: pairs = pd.concat([pairs] + extra, ignore_index=True)
+    pairs = pairs.drop_duplicates()
+    return pairs['pos_q'].to_numpy(dtype=np.int64), pairs['pos_c'].to_numpy(dtype=np.int64)
+
+
+# ================================
+# PENCOCOKAN DENGAN BLOCKING
+# ================================
+def top_matches_blocked(queries, choices, score_cutoff, limit=DEFAULT_LIMIT, scorer=fuzz.token_set_ratio, workers=-1, progress=None):
+    """Sama seperti top_matches(), tetapi hanya menskor pasangan kandidat dari indeks token.
+
+    stats['pasangan'] adalah jumlah pasangan yang benar-benar diskor,
+    stats['pasangan_penuh'] jumlah pasangan jika tanpa blocking.
+    """
+    started = time.perf_counter()
+    n_queries, n_choices = len(queries), len(choices)
+    queries, choices = list(queries), list(choices)
+    choice_table, untokened_mask = _token_table(choices)
+    choice_untokened = np.flatnonzero(untokened_mask)
+    query_array, choice_array = np.array(queries, dtype=object), np.array(choices, dtype=object)
+
+    parts, scored = [], 0
+    # Ukuran blok query dibatasi oleh blok token terbesar agar jumlah pasangan per blok terkendali
+    largest_block = int(choice_table['token'].value_counts().max()) if len(choice_table) else n_choices
+    chunk_size = max(1, PAIR_BLOCK_BUDGET // (3 * largest_block + len(choice_untokened) + 1))
+    for start in range(0, n_queries, chunk_size):
+        chunk = queries[start:start + chunk_size]
+        rows, cols = candidate_pairs(chunk, choices, choice_table, choice_untokened)
+        if len(rows):
+            scores = process.cpdist(query_array[rows + start], choice_array[cols], scorer=scorer,
+                                    score_cutoff=score_cutoff, dtype=np.float64, workers=workers)
+            keep = scores >= score_cutoff
+            parts.append(top_k_per_row(rows[keep] + start, cols[keep], scores[keep], limit))
+            scored += len(rows)
+        if progress: progress(min(start + chunk_size, n_queries), n_queries)
+
+    empty = np.array([], dtype=np.int64)
+    if parts:
+        query_idx, choice_idx, scores = (np.concatenate(arrays) for arrays in zip(*parts))
+    else:
+        query_idx, choice_idx, scores = empty, empty, np.array([], dtype=np.float64)
+
+    elapsed = time.perf_counter() - started
+    stats = {'pasangan': scored, 'pasangan_penuh': n_queries * n_choices, 'detik': elapsed,
+             'pasangan_per_detik': scored / elapsed if elapsed > 0 else 0.0}
+    return query_idx, choice_idx, scores, stats
+
+def blocking_recall_report(queries, choices, score_cutoff, limit=DEFAULT_LIMIT, sample_size=RECALL_SAMPLE_SIZE, seed=0):
+    """Bandingkan hasil blocking dengan brute force pada sampel query.
+
+    Recall = porsi pasangan top-`limit` brute force yang juga ditemukan oleh
+    blocking. 'hilang' berisi contoh pasangan yang terlewat.
+    """
+    queries = list(queries)
+    if len(queries) > sample_size:
+        picked = np.sort(np.random.default_rng(seed).choice(len(queries), size=sample_size, replace=False))
+        queries = [queries[i] for i in picked]
+    brute = top_matches(queries, choices, score_cutoff, limit)
+    blocked = top_matches_blocked(queries, choices, score_cutoff, limit)
+    brute_pairs = set(zip(brute[0].tolist(), brute[1].tolist()))
+    blocked_pairs = set(zip(blocked[0].tolist(), blocked[1].tolist()))
+    missed = sorted(brute_pairs - blocked_pairs)
+    brute_scores = dict(zip(zip(brute[0].tolist(), brute[1].tolist()), brute[2].tolist()))
+    return {
+        'sampel': len(queries),
+        'pasangan_brute': len(brute_pairs),
+        'pasangan_blok': len(blocked_pairs & brute_pairs),
+        'recall': 1.0 if not brute_pairs else 1 - len(missed) / len(brute_pairs),
+        'reduksi_pasangan': 1 - blocked[3]['pasangan'] / max(blocked[3]['pasangan_penuh'], 1),
+        'hilang': [(queries[q], choices[c], int(brute_scores[(q, c)])) for q, c in missed[:20]],
+    }
+
+def load_recall_report(cache_key):
+    """Laporan recall blocking terakhir yang tersimpan, atau None."""
+    try:
+        with open(os.path.join(MATCH_CACHE_ROOT, cache_key, 'recall.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_recall_report(cache_key, report):
+    directory = os.path.join(MATCH_CACHE_ROOT, cache_key)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'recall.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f)
+
+def recall_is_stale(report, max_age_days=RECALL_MAX_AGE_DAYS):
+    if report is None: return True
+    try:
+        measured = datetime.fromisoformat(report['diukur_pada'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return datetime.now() - measured > timedelta(days=max_age_days)
+
+
+# ================================
+# CACHE SKOR PASANGAN (INKREMENTAL)
+# ================================
+def _cache_config(score_floor, use_blocking):
+    return {'version': CACHE_VERSION, 'scorer': 'token_set_ratio', 'blocking': bool(use_blocking), 'floor': score_floor}
+
+def load_pair_cache(cache_key):
+    """Baca cache skor pasangan. Mengembalikan dict (config, pairs, queries, choices) atau None."""
+    directory = os.path.join(MATCH_CACHE_ROOT, cache_key)
+    try:
+        with open(os.path.join(directory, 'config.json'), encoding='utf-8') as f:
+            config = json.load(f)
+        pairs = pd.read_parquet(os.path.join(directory, 'pairs.parquet'))
+        names = pd.read_parquet(os.path.join(directory, 'names.parquet'))
+    except (OSError, ValueError):
+        return None
+    return {
+        'config': config, 'pairs': pairs,
+        'queries': set(names.loc[names['role'] == 'query', 'name']),
+        'choices': set(names.loc[names['role'] == 'choice', 'name']),
+    }
+
+def save_pair_cache(cache_key, cache):
+    directory = os.path.join(MATCH_CACHE_ROOT, cache_key)
+    os.makedirs(directory, exist_ok=True)
+    names = pd.DataFrame({
+        'name': sorted(cache['queries']) + sorted(cache['choices']),
+        'role': ['query'] * len(cache['queries']) + ['choice'] * len(cache['choices']),
+    })
+    # config ditulis terakhir; cache tanpa config yang cocok dianggap tidak valid
+    config_path = os.path.join(directory, 'config.json')
+    if os.path.exists(config_path): os.remove(config_path)
+    cache['pairs'].to_parquet(os.path.join(directory, 'pairs.parquet'), index=False)
+    names.to_parquet(os.path.join(directory, 'names.parquet'), index=False)
+    with open(config_path, 'w', encoding='utf-8') as f:
+        json.dump(cache['config'], f)
+
+def _scored_pairs(queries, choices, score_floor, use_blocking, progress=None):
+    # Semua pasangan dengan skor >= lantai sebagai frame (query, choice, score)
+    if not queries or not choices:
+        return pd.DataFrame({'query': pd.Series(dtype=object), 'choice': pd.Series(dtype=object), 'score': pd.Series(dtype=np.float64)}), 0
+    matcher = top_matches_blocked if use_blocking else top_matches
+    query_idx, choice_idx, scores, stats = matcher(queries, choices, score_floor, limit=None, progress=progress)
+    pairs = pd.DataFrame({
+        'query': np.array(queries, dtype=object)[query_idx],
+        'choice': np.array(choices, dtype=object)[choice_idx],
+        'score': scores,
+    })
+    return pairs, stats['pasangan']
+
+def incremental_top_matches(queries, choices, score_cutoff, cache=None, limit=DEFAULT_LIMIT, use_blocking=True, progress=None):
+    """Top-`limit` kecocokan per query memakai cache skor pasangan.
+
+    Hanya nama DB KLIK baru (vs semua nama kompetitor) dan nama kompetitor baru
+    (vs nama DB KLIK lama) yang diskor ulang. Hasil sama dengan top_matches()/
+    top_matches_blocked(). Mengembalikan (query_idx, choice_idx, scores, stats, cache_baru).
+    """
+    started = time.perf_counter()
+    queries, choices = list(queries), list(choices)
+    score_floor = min(CACHE_SCORE_FLOOR, score_cutoff)
+    config = _cache_config(score_floor, use_blocking)
+    rebuilt = cache is None or cache['config'] != config
+    if rebuilt:
+        cache = {'config': config, 'pairs': _scored_pairs([], [], score_floor, use_blocking)[0], 'queries': set(), 'choices': set()}
+
+    query_set, choice_set = set(queries), set(choices)
+    new_queries = sorted(query_set - cache['queries'])
+    old_queries = sorted(query_set & cache['queries'])
+    new_choices = [name for name in choices if name not in cache['choices']]
+
+    fresh_new_q, scored_new_q = _scored_pairs(new_queries, choices, score_floor, use_blocking, progress)
+    fresh_new_c, scored_new_c = _scored_pairs(old_queries, new_choices, score_floor, use_blocking)
+    kept = cache['pairs']
+    kept = kept[kept['query'].isin(query_set) & kept['choice'].isin(choice_set)]
+    pairs = pd.concat([kept, fresh_new_q, fresh_new_c], ignore_index=True)
+    new_cache = {'config': config, 'pairs': pairs, 'queries': query_set, 'choices': choice_set}
+
+    # Pilih top-k per posisi query; skor sama diurutkan menurut posisi nama kompetitor
+    selected = pairs[pairs['score'] >= score_cutoff]
+    query_pos = pd.DataFrame({'query': queries, 'qpos': np.arange(len(queries))})
+    choice_pos = pd.Series(np.arange(len(choices)), index=pd.Index(choices))
+    selected = query_pos.merge(selected, on='query')
+    rows = selected['qpos'].to_numpy(dtype=np.int64)
+    cols = choice_pos.reindex(selected['choice']).to_numpy(dtype=np.int64)
+    query_idx, choice_idx, scores = top_k_per_row(rows, cols, selected['score'].to_numpy(dtype=np.float64), limit)
+
+    elapsed = time.perf_counter() - started
+    scored = scored_new_q + scored_new_c
+    stats = {'pasangan': scored, 'pasangan_penuh': len(queries) * len(choices), 'detik': elapsed,
+             'pasangan_per_detik': scored / elapsed if elapsed > 0 else 0.0,
+             'query_baru': len(new_queries), 'nama_kompetitor_baru': len(new_choices),
+             'mode': 'penuh' if rebuilt else 'inkremental'}
+    return query_idx, choice_idx, scores, stats, new_cache
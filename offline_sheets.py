@@ -0,0 +1,304 @@
+# ===================================================================================
+#  GOOGLE SHEETS TIRUAN (OFFLINE) & GENERATOR DATA SINTETIS
+#  generate_workbook() membuat isi spreadsheet dengan tata letak produksi:
+#  DATABASE, sheet "<TOKO> - REKAP - READY/HABIS" per toko, dan HASIL_MATCHING,
+#  dengan ukuran produk x toko x hari yang bisa diatur. OfflineClient meniru
+#  bagian API gspread yang dipakai dashboard & worker (open_by_key,
+#  fetch_sheet_metadata, values_get, values_batch_get, batch_update,
+#  values_batch_update) dan menghitung jumlah panggilan API (serta byte JSON
+#  saat instrumentasi aktif, setara hitungan klien gspread sungguhan).
+#
+#  Dipakai oleh benchmark.py, dan oleh dashboard/worker jika variabel
+#  lingkungan DASHBOARD_OFFLINE_WORKBOOK menunjuk file workbook JSON
+#  (lihat gsheets_client.connect), sehingga bisa dijalankan tanpa kredensial.
+# ===================================================================================
+
+import json
+import os
+import random
+import re
+from datetime import date, timedelta
+
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+
+import instrumentation
+from derived import MY_STORE_NAME
+from ingestion import DATABASE_SHEET, MATCHING_SHEET, SHEET_NAMES, store_name_from_sheet
+
+# ================================
+# GENERATOR DATA SINTETIS
+# ================================
+REKAP_HEADER = ["NAMA", "HARGA", "TERJUAL/BLN", "TANGGAL", "BRAND", "STOK", "SKU", "KATEGORI"]
+DATABASE_HEADER = ["SKU", "NAMA", "KATEGORI", "HPP (LATEST)", "HPP (AVERAGE)"]
+MATCHING_HEADER = ["Produk Toko Saya", "Harga Toko Saya", "Produk Kompetitor", "Harga Kompetitor", "Toko Kompetitor", "Skor Kemiripan", "Tanggal_Update"]
+SHEET_DATE_FORMAT = "%d/%m/%Y"
+
+BRANDS = ["LOGITECH", "ASUS", "MSI", "ACER", "SAMSUNG", "LENOVO", "HP", "KINGSTON", "SEAGATE", "WD", "XIAOMI", "RAZER"]
+PRODUCT_TYPES = {
+    "Mouse": ["", "Wireless", "Gaming"], "Keyboard": ["", "Mechanical", "Wireless"], "SSD": ["256GB", "512GB", "1TB", "2TB"],
+    "Monitor": ['24"', '27"', "32 INCH"], "RAM": ["8GB", "16GB", "32GB"], "Laptop": ["I5 16GB", "R7 16GB 512GB"], "Headset": ["", "7.1"],
+}
+CATEGORIES = {"Mouse": "AKSESORIS", "Keyboard": "AKSESORIS", "Headset": "AKSESORIS", "SSD": "STORAGE", "RAM": "KOMPONEN",
+              "Monitor": "MONITOR", "Laptop": "LAPTOP"}
+NAME_NOISE = ["", "", " Original", " Garansi Resmi", " - Hitam", " BNIB"]
+READY_PROBABILITY = 0.85
+
+
+def store_names(sheet_names=SHEET_NAMES):
+    # Urutan toko seperti di SHEET_NAMES; toko sendiri selalu pertama
+    names = []
+    for sheet_name in sheet_names:
+        if "REKAP" in sheet_name.upper() and store_name_from_sheet(sheet_name) not in names:
+            names.append(store_name_from_sheet(sheet_name))
+    return [MY_STORE_NAME] + [name for name in names if name != MY_STORE_NAME]
+
+def _catalog(n_products, rng):
+    catalog = []
+    for i in range(n_products):
+        product_type = rng.choice(list(PRODUCT_TYPES))
+        brand = rng.choice(BRANDS)
+        name = f"{brand} {product_type} {rng.choice('ABCGMXZ')}{rng.randint(100, 9999)} {rng.choice(PRODUCT_TYPES[product_type])}".strip()
+        catalog.append({'sku': f"SKU{i:05d}", 'name': name, 'brand': brand, 'kategori': CATEGORIES[product_type],
+                        'hpp': rng.randint(20, 900) * 1000})
+    return catalog
+
+def generate_workbook(n_products=500, n_stores=6, n_days=60, seed=1, start=date(2024, 1, 1), coverage=0.7, matches=True):
+    """Isi spreadsheet sintetis: {judul sheet: list baris string}, seperti hasil values.get (FORMATTED_VALUE).
+
+    Tiap toko menjual sekitar `coverage` dari katalog; nama di toko kompetitor
+    diberi variasi agar pencocokan fuzzy punya pekerjaan nyata. Setiap hari tiap
+    produk tercatat di sheet READY atau HABIS toko itu.
+    """
+    rng = random.Random(seed)
+    stores = store_names()[:max(2, min(n_stores, len(store_names())))]
+    catalog = _catalog(n_products, rng)
+    sheets = {DATABASE_SHEET: [DATABASE_HEADER] + [
+        [p['sku'], p['name'], p['kategori'], str(p['hpp']) if rng.random() > 0.1 else "", str(int(p['hpp'] * rng.uniform(0.95, 1.05)))]
+        for p in catalog
+    ]}
+    dates = [(start + timedelta(days=d)).strftime(SHEET_DATE_FORMAT) for d in range(n_days)]
+
+    listings = {}
+    for store in stores:
+        carried = catalog if store == MY_STORE_NAME else [p for p in catalog if rng.random() < coverage]
+        listings[store] = [(p, p['name'] + ("" if store == MY_STORE_NAME else rng.choice(NAME_NOISE)),
+                            int(p['hpp'] * rng.uniform(0.9, 1.4)) // 1000 * 1000) for p in carried]
+        ready, habis = [REKAP_HEADER], [REKAP_HEADER]
+        for day in dates:
+            for product, name, price in listings[store]:
+                price = max(1000, price + rng.choice((-1, 0, 0, 0, 1)) * 1000)
+                row = [name, f"Rp {price:,}".replace(',', '.'), str(rng.randint(0, 60)), day, product['brand'],
+                       str(rng.randint(0, 25)), product['sku'] if store == MY_STORE_NAME else "", product['kategori']]
+                (ready if rng.random() < READY_PROBABILITY else habis).append(row)
+        sheets[f"{store} - REKAP - READY"], sheets[f"{store} - REKAP - HABIS"] = ready, habis
+
+    matching = [MATCHING_HEADER]
+    if matches:
+        update_date = (start + timedelta(days=n_days - 2)).isoformat()
+        mine = {p['sku']: price for p, _, price in listings[MY_STORE_NAME]}
+        for store in stores[1:]:
+            for product, name, price in listings[store]:
+                if rng.random() < 0.5:
+                    matching.append([product['name'], str(mine[product['sku']]), name, str(price), store, str(rng.randint(88, 100)), update_date])
+    sheets[MATCHING_SHEET] = matching
+    return sheets
+
+def append_day(sheets, seed=2):
+    """Tambahkan satu hari data baru di akhir setiap sheet REKAP (untuk mengukur refresh inkremental)."""
+    rng = random.Random(seed)
+    for title, rows in sheets.items():
+        if "REKAP" not in title.upper() or len(rows) < 2: continue
+        last_day = max(date_from_sheet(row[3]) for row in rows[1:][-50:])
+        next_day = (last_day + timedelta(days=1)).strftime(SHEET_DATE_FORMAT)
+        seen = {row[0]: row for row in rows[1:]}
+        rows.extend([row[:3] + [next_day] + row[4:] for row in seen.values() if rng.random() < 0.5])
+    return sheets
+
+def date_from_sheet(value):
+    day, month, year = (int(part) for part in value.split('/'))
+    return date(year, month, day)
+
+def save_workbook(sheets, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(sheets, f, ensure_ascii=False)
+
+def load_workbook(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+# ================================
+# KLIEN GSPREAD TIRUAN
+# ================================
+_NUMBER = re.compile(r'^-?\d+(\.\d+)?$')
+
+def _unformatted(value):
+    # valueRenderOption=UNFORMATTED_VALUE: angka dikembalikan sebagai angka
+    if isinstance(value, str) and _NUMBER.match(value):
+        return float(value) if '.' in value else int(value)
+    return value
+
+def _formatted(value):
+    return value if isinstance(value, str) else str(value)
+
+
+class OfflineSpreadsheet:
+    def __init__(self, sheets, key="offline", path=None):
+        self.id, self.path = key, path
+        self._sheets, self._ids, self._grid = {}, {}, {}
+        self.calls, self.saved_mtime = 0, None
+        for title, rows in sheets.items():
+            self._add(title, [list(row) for row in rows])
+
+    def _add(self, title, rows, grid_rows=None):
+        self._sheets[title] = rows
+        self._ids[title] = max(self._ids.values(), default=0) + 1
+        self._grid[title] = grid_rows or max(1, len(rows))
+
+    def _title_of(self, sheet_id):
+        return next(title for title, i in self._ids.items() if i == sheet_id)
+
+    def _parse_range(self, a1_range):
+        title, _, cells = a1_range.partition('!')
+        if title.startswith("'"): title = title[1:-1].replace("''", "'")
+        if title not in self._sheets: raise WorksheetNotFound(title)
+        return title, cells
+
+    def _values(self, a1_range):
+        title, cells = self._parse_range(a1_range)
+        rows = self._sheets[title]
+        if cells:
+            first, last = (int(part) for part in cells.split(':'))  # hanya rentang baris "a:b"
+            rows = rows[first - 1:last]
+        while rows and not any(v != '' for v in rows[-1]): rows = rows[:-1]
+        return rows
+
+    def _respond(self, response, request=None):
+        self.calls += 1
+        if instrumentation.active():
+            instrumentation.record_api_call(len(json.dumps(response)), len(json.dumps(request)) if request is not None else 0)
+        return response
+
+    def _persist(self):
+        if self.path:
+            save_workbook(self._sheets, self.path)
+            self.saved_mtime = os.path.getmtime(self.path)
+
+    # --- API baca ---
+    def fetch_sheet_metadata(self, params=None):
+        return self._respond({'sheets': [
+            {'properties': {'title': title, 'sheetId': self._ids[title], 'index': i,
+                            'gridProperties': {'rowCount': self._grid[title], 'columnCount': 26}}}
+            for i, title in enumerate(self._sheets)
+        ]})
+
+    def values_get(self, a1_range, params=None):
+        convert = _unformatted if (params or {}).get('valueRenderOption') == 'UNFORMATTED_VALUE' else _formatted
+        return self._respond({'range': a1_range, 'values': [[convert(v) for v in row] for row in self._values(a1_range)]})
+
+    def values_batch_get(self, ranges, params=None):
+        return self._respond({'valueRanges': [{'range': r, 'values': [[_formatted(v) for v in row] for row in self._values(r)]} for r in ranges]})
+
+    # --- API tulis ---
+    def batch_update(self, body):
+        replies = []
+        for request in body['requests']:
+            kind, spec = next(iter(request.items()))
+            reply = {}
+            if kind == 'deleteSheet':
+                title = self._title_of(spec['sheetId'])
+                del self._sheets[title], self._ids[title], self._grid[title]
+            elif kind in ('duplicateSheet', 'addSheet'):
+                if kind == 'duplicateSheet':
+                    source = self._title_of(spec['sourceSheetId'])
+                    title = spec['newSheetName']
+                    self._add(title, [list(row) for row in self._sheets[source]], self._grid[source])
+                else:
+                    title = spec['properties']['title']
+                    self._add(title, [], 1)
+                reply = {kind: {'properties': {'title': title, 'sheetId': self._ids[title], 'gridProperties': {'rowCount': self._grid[title]}}}}
+            elif kind == 'appendDimension':
+                self._grid[self._title_of(spec['sheetId'])] += spec['length']
+            elif kind == 'deleteDimension':
+                title = self._title_of(spec['range']['sheetId'])
+                start, end = spec['range']['startIndex'], spec['range']['endIndex']
+                del self._sheets[title][start:end]
+                self._grid[title] -= end - start
+            elif kind == 'copyPaste':
+                source, destination = spec['source'], spec['destination']
+                source_rows = self._sheets[self._title_of(source['sheetId'])]
+                title = self._title_of(destination['sheetId'])
+                height = source['endRowIndex'] - source['startRowIndex']
+                if destination['startRowIndex'] + height > self._grid[title]:
+                    raise ValueError(f"copyPaste melebihi ukuran grid '{title}' ({self._grid[title]} baris)")
+                first_col, last_col = source['startColumnIndex'], source['endColumnIndex']
+                block = [(list(row) + [''] * last_col)[first_col:last_col] for row in source_rows[source['startRowIndex']:source['endRowIndex']]]
+                block += [[''] * (last_col - first_col)] * (height - len(block))
+                rows = self._sheets[title]
+                while len(rows) < destination['startRowIndex'] + height: rows.append([])
+                col = destination['startColumnIndex']
+                for offset, values in enumerate(block):
+                    row = rows[destination['startRowIndex'] + offset]
+                    row.extend([''] * (col + len(values) - len(row)))
+                    row[col:col + len(values)] = values
+            elif kind == 'updateCells' and 'rows' not in spec and spec.get('fields') == 'userEnteredValue':
+                # Hanya bentuk "kosongkan rentang" yang didukung
+                grid_range = spec['range']
+                rows = self._sheets[self._title_of(grid_range['sheetId'])]
+                for row in rows[grid_range['startRowIndex']:grid_range['endRowIndex']]:
+                    row[grid_range['startColumnIndex']:grid_range['endColumnIndex']] = [''] * len(row[grid_range['startColumnIndex']:grid_range['endColumnIndex']])
+                    while row and row[-1] == '': row.pop()
+            elif kind == 'updateSheetProperties':
+                old_title, new_title = self._title_of(spec['properties']['sheetId']), spec['properties']['title']
+                for mapping in (self._sheets, self._ids, self._grid):
+                    mapping[new_title] = mapping.pop(old_title)
+            else:
+                raise ValueError(f"Permintaan batchUpdate '{kind}' tidak didukung klien offline")
+            replies.append(reply)
+        self._persist()
+        return self._respond({'replies': replies}, body)
+
+    def values_batch_update(self, body):
+        for data in body['data']:
+            title, cells = self._parse_range(data['range'])
+            (first_row, first_col), (last_row, last_col) = (a1_to_rowcol(part) for part in cells.split(':'))
+            if last_row > self._grid[title]:
+                raise ValueError(f"Rentang {data['range']} melebihi ukuran grid ({self._grid[title]} baris)")
+            rows = self._sheets[title]
+            while len(rows) < last_row: rows.append([])
+            for offset, values in enumerate(data['values']):
+                row = rows[first_row - 1 + offset]
+                row.extend([''] * (last_col - len(row)))
+                row[first_col - 1:last_col] = list(values)
+        self._persist()
+        return self._respond({}, body)
+
+
+class OfflineClient:
+    """Pengganti gspread.Client: semua spreadsheet_key membuka workbook yang sama.
+
+    Jika dibuat dari file (from_file), perubahan ditulis kembali ke file dan
+    file dibaca ulang saat berubah, sehingga dashboard & worker melihat isi yang sama.
+    """
+    def __init__(self, sheets=None, path=None):
+        self.path = path
+        self._mtime = None
+        self.spreadsheet = OfflineSpreadsheet(sheets or {}, path=path)
+
+    @classmethod
+    def from_file(cls, path):
+        client = cls(path=path)
+        client._reload()
+        return client
+
+    def _reload(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime not in (self._mtime, self.spreadsheet.saved_mtime):
+            self.spreadsheet = OfflineSpreadsheet(load_workbook(self.path), path=self.path)
+            self._mtime = mtime
+
+    def open_by_key(self, key):
+        if self.path: self._reload()
+        self.spreadsheet.id = key
+        return self.spreadsheet
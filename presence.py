@@ -0,0 +1,82 @@
+# ===================================================================================
+#  PETA KEHADIRAN PRODUK MINGGUAN (TAB 6)
+#  Bitmap (Toko, Nama Produk) x Minggu berisi True jika produk berstatus
+#  'Tersedia' di minggu itu. Dibangun sekali per (versi data, rentang tanggal);
+#  produk baru / hilang antara dua minggu untuk semua toko dijawab dengan satu
+#  operasi kolom, tanpa memindai df_filtered lagi.
+# ===================================================================================
+
+import numpy as np
+import pandas as pd
+
+
+def build_presence(df_filtered):
+    """Bangun peta kehadiran dari df_filtered (butuh kolom Toko, Nama Produk, Minggu, Status).
+
+    Pasangan (Toko, Nama Produk) diberi nomor urut menurut toko lalu nama;
+    baris df_filtered diindeks per (pasangan, minggu) untuk mengambil baris detail.
+    """
+    pair_codes = df_filtered.groupby(['Toko', 'Nama Produk'], observed=True, sort=True).ngroup().to_numpy()
+    week_codes, weeks = pd.factorize(df_filtered['Minggu'], sort=True)
+    n_pairs, n_weeks = (pair_codes.max() + 1 if len(pair_codes) else 0), len(weeks)
+
+    available = (df_filtered['Status'] == 'Tersedia').to_numpy()
+    matrix = np.zeros((n_pairs, n_weeks), dtype=bool)
+    matrix[pair_codes[available], week_codes[available]] = True
+
+    _, first_rows = np.unique(pair_codes, return_index=True)
+    pair_store = df_filtered['Toko'].to_numpy(dtype=object)[first_rows]
+    row_keys = pair_codes.astype(np.int64) * n_weeks + week_codes
+    row_order = np.argsort(row_keys, kind='stable')
+    return {
+        'weeks': pd.DatetimeIndex(weeks),
+        'matrix': matrix,
+        'pair_store': pair_store,
+        'stores': sorted(set(pair_store)),
+        'first_seen': np.where(matrix.any(axis=1), matrix.argmax(axis=1), -1),
+        'pair_codes': pair_codes,
+        'row_order': row_order,
+        'sorted_keys': row_keys[row_order],
+    }
+
+def _week_columns(presence, week_before, week_after):
+    weeks = presence['weeks']
+    return presence['matrix'][:, weeks.get_loc(week_before)], presence['matrix'][:, weeks.get_loc(week_after)]
+
+def new_products(presence, week_before, week_after):
+    # Pasangan yang Tersedia di week_after tetapi tidak di week_before (semua toko sekaligus)
+    before, after = _week_columns(presence, week_before, week_after)
+    return np.flatnonzero(after & ~before)
+
+def disappeared_products(presence, week_before, week_after):
+    # Pasangan yang Tersedia di week_before tetapi tidak lagi di week_after
+    before, after = _week_columns(presence, week_before, week_after)
+    return np.flatnonzero(before & ~after)
+
+def first_seen_week(presence, pair_ids):
+    # Minggu pertama pasangan berstatus Tersedia dalam rentang (NaT jika tidak pernah)
+    first = presence['first_seen'][pair_ids]
+    return pd.DatetimeIndex(np.where(first >= 0, presence['weeks'].to_numpy()[np.maximum(first, 0)], np.datetime64('NaT')))
+
+def count_by_store(presence, pair_ids):
+    counts = pd.Series(presence['pair_store'][pair_ids]).value_counts()
+    return [int(counts.get(store, 0)) for store in presence['stores']]
+
+def week_changes(presence, week_before, week_after):
+    """(pasangan baru, tabel Produk Baru/Produk Hilang per toko) antara dua minggu."""
+    new_pairs = new_products(presence, week_before, week_after)
+    counts = pd.DataFrame({
+        'Toko': presence['stores'],
+        'Produk Baru': count_by_store(presence, new_pairs),
+        'Produk Hilang': count_by_store(presence, disappeared_products(presence, week_before, week_after)),
+    })
+    return new_pairs, counts
+
+def rows_in_week(presence, pair_ids, week):
+    """Posisi baris df_filtered (urutan asli) milik pair_ids pada minggu `week`."""
+    keys = np.asarray(pair_ids, dtype=np.int64) * len(presence['weeks']) + presence['weeks'].get_loc(week)
+    lo = np.searchsorted(presence['sorted_keys'], keys, side='left')
+    hi = np.searchsorted(presence['sorted_keys'], keys, side='right')
+    lengths = hi - lo
+    offsets = np.repeat(lo - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + np.arange(lengths.sum())
+    return np.sort(presence['row_order'][offsets])
@@ -0,0 +1,137 @@
+# ===================================================================================
+#  PIPELINE PEMBARUAN PERBANDINGAN HARGA (TANPA STREAMLIT)
+#  Muat data sumber -> cocokkan produk -> tulis HASIL_MATCHING. Dipakai oleh
+#  worker.py (dijalankan dari dashboard lewat antrean job atau dari penjadwal).
+#  Progres dilaporkan lewat callback progress(persen, teks).
+# ===================================================================================
+
+from datetime import datetime
+
+import pandas as pd
+
+import instrumentation
+from derived import MY_STORE_NAME, latest_rows
+from matching import (
+    blocking_recall_report, expand_matches, incremental_top_matches, load_pair_cache, load_recall_report, recall_is_stale,
+    save_pair_cache, save_recall_report, top_matches, top_matches_blocked,
+)
+from sheet_writer import write_matches_diff
+from snapshot import full_load, incremental_refresh, load_snapshot, load_snapshot_frame, refresh_matches, save_snapshot
+
+SOURCE_COLS = ['Tanggal', 'Nama Produk', 'Harga', 'Toko']
+
+
+def load_source_data_for_update(gc, spreadsheet_key, rekap_df=None, refresh_source=False):
+    """Baris terbaru per (Toko, Nama Produk) untuk pencocokan.
+
+    Sumbernya rekap_df yang sudah dimuat (jika diberikan) atau tabel terbaru per
+    produk di snapshot lokal, sehingga riwayat REKAP tidak dibaca sama sekali.
+    Spreadsheet hanya dibaca jika snapshot belum ada, atau refresh_source=True
+    (hanya baris baru, untuk worker terjadwal). Daftar toko mengikuti sheet REKAP
+    yang ada di workbook saat snapshot dimuat/diperbarui, bukan hanya SHEET_NAMES.
+    """
+    if rekap_df is None and not refresh_source:
+        loaded = load_snapshot_frame(spreadsheet_key, 'latest')
+        if loaded is not None:
+            return loaded[0][SOURCE_COLS].reset_index(drop=True)
+    if rekap_df is None:
+        snapshot = load_snapshot(spreadsheet_key)
+        if snapshot is None or refresh_source:
+            spreadsheet = gc.open_by_key(spreadsheet_key)
+            if snapshot is None: loaded = full_load(spreadsheet)
+            else: loaded = incremental_refresh(spreadsheet, snapshot)
+            rekap_df, database_df, matches_df, manifest, _ = loaded
+            if rekap_df is None: return pd.DataFrame()
+            save_snapshot(spreadsheet_key, rekap_df, database_df, matches_df, manifest)
+        else:
+            rekap_df = snapshot[0]
+    if rekap_df is None or rekap_df.empty: return pd.DataFrame()
+    latest = latest_rows(rekap_df[SOURCE_COLS], ['Toko', 'Nama Produk'])
+    return latest.reset_index(drop=True)
+
+def measure_blocking_recall(spreadsheet_key, my_names, competitor_products_list, score_cutoff, match_stats, new_queries):
+    """Ukur recall blocking sebanding dengan perubahan, lalu simpan laporannya.
+
+    Skor dihitung ulang penuh: sampel semua produk. Inkremental: sampel produk
+    yang baru diskor. Tanpa produk baru, laporan tersimpan dipakai ulang kecuali
+    sudah lebih tua dari RECALL_MAX_AGE_DAYS atau cutoff-nya berbeda (diukur
+    ulang pada sampel semua produk).
+    """
+    last = load_recall_report(spreadsheet_key)
+    if match_stats.get('mode', 'penuh') == 'penuh': sample, scope = my_names, 'penuh'
+    elif new_queries: sample, scope = new_queries, 'produk_baru'
+    elif recall_is_stale(last) or last.get('cutoff') != score_cutoff: sample, scope = my_names, 'terjadwal'
+    else: return dict(last, tersimpan=True)
+    with instrumentation.span("update.recall", cakupan=scope):
+        recall = blocking_recall_report(sample, competitor_products_list, score_cutoff)
+    recall.update(cakupan=scope, cutoff=score_cutoff, diukur_pada=datetime.now().isoformat(timespec='seconds'))
+    save_recall_report(spreadsheet_key, recall)
+    return dict(recall, tersimpan=False)
+
+def run_price_comparison_update(gc, spreadsheet_key, score_cutoff=88, use_blocking=False, incremental=True,
+                                rekap_df=None, refresh_source=False, progress=None):
+    """Jalankan pembaruan penuh. Mengembalikan dict hasil:
+
+    status ('selesai' | 'kosong' | 'gagal'), pesan, baris, pencocokan (stats),
+    penulisan (report diff writer), recall (laporan blocking atau None).
+    use_blocking bersifat opt-in: blocking token lebih cepat, tetapi bisa
+    melewatkan pasangan yang ditemukan brute force (recall < 100%).
+    Setelah penulisan, hanya HASIL_MATCHING yang dibaca ulang ke snapshot.
+    """
+    progress = progress or (lambda pct, text: None)
+    progress(0, "Memulai pembaruan perbandingan harga...")
+    with instrumentation.span("update.load_source"):
+        source_df = load_source_data_for_update(gc, spreadsheet_key, rekap_df, refresh_source)
+    if source_df is None or source_df.empty:
+        return {'status': 'gagal', 'pesan': "Gagal memuat data sumber untuk update. Batal."}
+    my_store_df = source_df[source_df['Toko'] == MY_STORE_NAME]
+    competitor_df = source_df[source_df['Toko'] != MY_STORE_NAME]
+    if my_store_df.empty or competitor_df.empty:
+        return {'status': 'gagal', 'pesan': "Data toko Anda atau kompetitor tidak cukup."}
+
+    competitor_products_list = competitor_df['Nama Produk'].unique().tolist()
+    my_names, my_prices = my_store_df['Nama Produk'].tolist(), my_store_df['Harga'].tolist()
+    total = len(my_names)
+    show_progress = lambda done, _: progress(int((done / total) * 80), f"Mencocokkan produk {done}/{total}")
+    with instrumentation.span("update.matching", produk=total, kompetitor=len(competitor_products_list), inkremental=incremental):
+        new_queries = []
+        if incremental:
+            pair_cache = load_pair_cache(spreadsheet_key)
+            known_queries = pair_cache['queries'] if pair_cache is not None else set()
+            new_queries = list(dict.fromkeys(name for name in my_names if name not in known_queries))
+            query_idx, choice_idx, scores, match_stats, pair_cache = incremental_top_matches(
+                my_names, competitor_products_list, score_cutoff, pair_cache, limit=5, use_blocking=use_blocking, progress=show_progress
+            )
+            save_pair_cache(spreadsheet_key, pair_cache)
+        else:
+            matcher = top_matches_blocked if use_blocking else top_matches
+            query_idx, choice_idx, scores, match_stats = matcher(my_names, competitor_products_list, score_cutoff=score_cutoff, limit=5, progress=show_progress)
+    recall = None
+    if use_blocking:
+        recall = measure_blocking_recall(spreadsheet_key, my_names, competitor_products_list, score_cutoff, match_stats, new_queries)
+    with instrumentation.span("update.expand", pasangan=len(query_idx)):
+        results_df = expand_matches(my_names, my_prices, competitor_df, competitor_products_list, query_idx, choice_idx, scores, datetime.now().strftime('%Y-%m-%d'))
+    throughput = f"{match_stats['pasangan']:,} pasangan dalam {match_stats['detik']:.1f} detik ({match_stats['pasangan_per_detik']:,.0f} pasangan/detik)"
+    if 'pasangan_penuh' in match_stats: throughput += f", dari {match_stats['pasangan_penuh']:,} pasangan total"
+    if match_stats.get('mode') == 'inkremental':
+        throughput += f"; inkremental: {match_stats['query_baru']} produk baru, {match_stats['nama_kompetitor_baru']} nama kompetitor baru diskor"
+
+    progress(90, "Menyimpan hasil...")
+    result = {'baris': len(results_df), 'pencocokan': match_stats, 'recall': recall}
+    try:
+        spreadsheet = gc.open_by_key(spreadsheet_key)
+        with instrumentation.span("update.write", baris=len(results_df)):
+            write_report = write_matches_diff(spreadsheet, results_df)
+    except Exception as e:
+        return dict(result, status='gagal', pesan=f"Gagal menyimpan hasil: {e}")
+    result['penulisan'] = write_report
+    try:
+        with instrumentation.span("update.refresh_matches"):
+            refresh_matches(spreadsheet, spreadsheet_key)
+        write_report['api_calls'] += 1
+    except Exception as e:
+        result['peringatan'] = f"HASIL_MATCHING tersimpan, tetapi snapshot lokal gagal diperbarui: {e}"
+    if results_df.empty:
+        return dict(result, status='kosong', pesan="Tidak ditemukan pasangan produk yang cocok.")
+    progress(100, "Selesai")
+    return dict(result, status='selesai', pesan=f"Selesai: {len(results_df)} baris hasil disimpan. Pencocokan: {throughput}.")
@@ -0,0 +1,73 @@
+# ===================================================================================
+#  TABEL ROLLUP HARIAN & MINGGUAN
+#  Agregat per (Toko, Brand, KATEGORI, Status) dibangun sekali per versi data
+#  saat data dimuat: jumlah baris, Omzet, dan Terjual per hari, serta Omzet &
+#  Terjual dari snapshot terakhir tiap produk per minggu. Tab 1, 3, 4, dan 5
+#  membaca tabel kecil ini, bukan baris mentah REKAP.
+# ===================================================================================
+
+import pandas as pd
+
+from derived import MY_STORE_NAME, latest_rows, week_start
+
+ROLLUP_DIMS = ['Toko', 'Brand', 'KATEGORI', 'Status']
+
+
+def _aggregate(df, keys):
+    return df.groupby(keys, observed=True, dropna=False).agg(
+        Jumlah_Baris=('Omzet', 'size'), Omzet=('Omzet', 'sum'), Terjual=('Terjual per Bulan', 'sum'),
+    ).reset_index()
+
+def build_rollups(rekap_df):
+    """Rollup untuk seluruh data satu versi.
+
+    daily: per (Tanggal, dimensi) plus kolom Minggu.
+    weekly_latest: per (Minggu, dimensi) dari baris terbaru tiap (Minggu, Toko, Nama Produk).
+    """
+    dims = [col for col in ROLLUP_DIMS if col in rekap_df.columns]
+    daily = _aggregate(rekap_df, ['Tanggal'] + dims)
+    daily['Minggu'] = week_start(daily['Tanggal'])
+    with_week = rekap_df[['Tanggal', 'Nama Produk', 'Omzet', 'Terjual per Bulan'] + dims].assign(Minggu=week_start(rekap_df['Tanggal']))
+    weekly_latest = _aggregate(latest_rows(with_week, ['Minggu', 'Toko', 'Nama Produk']), ['Minggu'] + dims)
+    return {'dims': dims, 'daily': daily, 'weekly_latest': weekly_latest}
+
+def weekly_latest_in_range(rollups, df_filtered, start_date=None, end_date=None):
+    # Minggu yang utuh di dalam rentang diambil dari rollup; minggu yang terpotong batas
+    # rentang dihitung ulang dari baris df_filtered minggu itu saja
+    weekly = rollups['weekly_latest']
+    if start_date is None or end_date is None: return weekly
+    start_ts, end_ts = pd.to_datetime(start_date), pd.to_datetime(end_date)
+    in_range = (weekly['Minggu'] + pd.Timedelta(days=7) > start_ts) & (weekly['Minggu'] <= end_ts)
+    full = (weekly['Minggu'] >= start_ts) & (weekly['Minggu'] + pd.Timedelta(days=7) <= end_ts)
+    partial_weeks = weekly.loc[in_range & ~full, 'Minggu'].unique()
+    partial_rows = df_filtered[df_filtered['Minggu'].isin(partial_weeks)]
+    partial = _aggregate(latest_rows(partial_rows, ['Minggu', 'Toko', 'Nama Produk']), ['Minggu'] + rollups['dims'])
+    return pd.concat([weekly[full], partial], ignore_index=True)
+
+def build_range_rollups(rollups, df_filtered, competitor_latest_overall, start_date=None, end_date=None, my_store_name=MY_STORE_NAME):
+    """Tabel siap tampil untuk satu rentang tanggal, semuanya dari rollup (ukuran tidak bergantung jumlah produk).
+
+    stock_trends (tab 4), omzet_pivot & weekly_omzet (tab 5), main_weekly (tab 1),
+    competitor_brands (tab 3, dari snapshot terakhir per produk kompetitor).
+    """
+    daily = rollups['daily']
+    if start_date is not None and end_date is not None:
+        start_ts, end_ts = pd.to_datetime(start_date), pd.to_datetime(end_date)
+        daily = daily[(daily['Tanggal'] >= start_ts) & (daily['Tanggal'] <= end_ts)]
+    weekly = weekly_latest_in_range(rollups, df_filtered, start_date, end_date)
+
+    stock_trends = daily.groupby(['Minggu', 'Toko', 'Status'], observed=True)['Jumlah_Baris'].sum().unstack(fill_value=0).reset_index()
+    stock_trends.columns.name = 'Status'
+    stores = daily['Toko'].unique()
+    return {
+        'stock_trends': stock_trends,
+        'omzet_pivot': daily.pivot_table(index='Toko', columns='Tanggal', values='Omzet', aggfunc='sum', observed=True).fillna(0),
+        'weekly_omzet': weekly.groupby(['Minggu', 'Toko'], observed=True)['Omzet'].sum().reset_index(),
+        'main_weekly': weekly[weekly['Toko'] == my_store_name].groupby('Minggu').agg(
+            Omzet=('Omzet', 'sum'), Penjualan_Unit=('Terjual', 'sum')
+        ).reset_index().sort_values('Minggu'),
+        'competitor_stores': sorted(store for store in stores if store != my_store_name),
+        'competitor_brands': competitor_latest_overall.groupby(['Toko', 'Brand'], observed=True).agg(
+            Total_Omzet=('Omzet', 'sum'), Total_Unit_Terjual=('Terjual per Bulan', 'sum')
+        ).reset_index(),
+    }
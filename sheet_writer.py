@@ -0,0 +1,224 @@
+# ===================================================================================
+#  PENULIS SHEET HASIL_MATCHING BERBASIS DIFF
+#  Hasil baru dibandingkan dengan isi sheet yang sudah ada berdasarkan kunci
+#  (Produk Toko Saya, Produk Kompetitor, Toko Kompetitor). Hanya baris yang
+#  berubah yang ditulis ulang, baris baru mengisi slot baris usang lalu
+#  ditambahkan di akhir, dan sisa baris usang dihapus, semuanya dalam
+#  permintaan batch berukuran terbatas.
+#
+#  Perubahan diterapkan ke salinan sheet (duplikasi di sisi server), lalu isi
+#  salinan itu disalin kembali ke sheet asli (copyPaste) dan salinannya dihapus,
+#  dalam satu batchUpdate atomik. Pembaca tetap melihat isi lama yang utuh
+#  sampai versi baru di-commit, dan sheet asli tidak pernah diganti: sheetId/gid,
+#  rumus =HASIL_MATCHING!... di tab lain, filter view, dan rentang terlindungi
+#  tetap berlaku. Selama penulisan, salinan staging menambah sementara jumlah
+#  sel workbook sebesar ukuran HASIL_MATCHING.
+# ===================================================================================
+
+import time
+
+from gspread.utils import rowcol_to_a1
+
+from ingestion import MATCHING_SHEET, a1_sheet_range, list_sheet_titles
+
+# ================================
+# KONFIGURASI PENULISAN
+# ================================
+WRITE_BATCH_ROWS = 5000
+KEY_COLS = ['Produk Toko Saya', 'Produk Kompetitor', 'Toko Kompetitor']
+DATE_COL = 'Tanggal_Update'
+STAGING_SUFFIX = "__STAGING"
+
+
+def _python_value(value):
+    # numpy scalar -> tipe Python agar bisa diserialisasi ke JSON
+    return value.item() if hasattr(value, 'item') else value
+
+def frame_rows(results_df):
+    return [[_python_value(v) for v in row] for row in results_df.itertuples(index=False, name=None)]
+
+def _comparable(row, width):
+    # Samakan baris dari sheet (UNFORMATTED_VALUE) dengan baris baru: lebar tetap, angka bulat jadi int
+    row = list(row[:width]) + [''] * (width - len(row))
+    return tuple(int(v) if isinstance(v, float) and v.is_integer() else v for v in row)
+
+def _row_runs(row_numbers):
+    # Kelompokkan nomor baris berurutan menjadi rentang [awal, akhir]
+    runs = []
+    for number in sorted(row_numbers):
+        if runs and number == runs[-1][1] + 1: runs[-1][1] = number
+        else: runs.append([number, number])
+    return runs
+
+def _chunked_value_ranges(title, rows_by_number, n_cols, batch_rows, first_col=1):
+    # Rentang baris berurutan -> daftar permintaan values:batchUpdate, masing-masing <= batch_rows baris
+    batches, current, current_rows = [], [], 0
+    for start, end in _row_runs(rows_by_number):
+        for chunk_start in range(start, end + 1, batch_rows):
+            chunk_end = min(end, chunk_start + batch_rows - 1)
+            if current and current_rows + (chunk_end - chunk_start + 1) > batch_rows:
+                batches.append(current); current, current_rows = [], 0
+            current.append({
+                'range': f"{a1_sheet_range(title)}!{rowcol_to_a1(chunk_start, first_col)}:{rowcol_to_a1(chunk_end, first_col + n_cols - 1)}",
+                'values': [rows_by_number[n] for n in range(chunk_start, chunk_end + 1)],
+            })
+            current_rows += chunk_end - chunk_start + 1
+    if current: batches.append(current)
+    return batches
+
+
+# ================================
+# DIFF & PENULISAN
+# ================================
+def diff_rows(existing_values, header, new_rows):
+    """Rencanakan perubahan baris.
+
+    Mengembalikan (writes, n_final_rows, stale_rows, counts): writes adalah
+    {nomor baris sheet: nilai}, stale_rows daftar nomor baris yang dihapus.
+    Kolom tanggal tidak ikut menentukan "berubah"; kolom itu ditangani terpisah.
+    """
+    width = len(header)
+    date_pos = header.index(DATE_COL) if DATE_COL in header else None
+    key_pos = [header.index(col) for col in KEY_COLS]
+
+    def content(row):
+        return tuple(v for i, v in enumerate(row) if i != date_pos)
+
+    existing_by_key, stale = {}, []
+    for offset, row in enumerate(existing_values[1:]):
+        row = _comparable(row, width)
+        key = tuple(row[i] for i in key_pos)
+        if key in existing_by_key or not any(v != '' for v in row): stale.append(offset + 2)
+        else: existing_by_key[key] = (offset + 2, row)
+
+    writes, pending_new, seen = {}, [], set()
+    counts = {'diperbarui': 0, 'ditambah': 0, 'dihapus': 0, 'tetap': 0}
+    for row in new_rows:
+        key = tuple(row[i] for i in key_pos)
+        if key in existing_by_key and key not in seen:
+            seen.add(key)
+            row_number, old_row = existing_by_key[key]
+            if content(_comparable(row, width)) != content(old_row):
+                writes[row_number] = row; counts['diperbarui'] += 1
+            else:
+                counts['tetap'] += 1
+        else:
+            pending_new.append(row)
+    stale.extend(number for key, (number, _) in existing_by_key.items() if key not in seen)
+    stale.sort()
+
+    # Baris baru mengisi slot baris usang dulu, sisanya ditambahkan setelah baris terakhir
+    last_row = len(existing_values)
+    for row in pending_new:
+        if stale: writes[stale.pop(0)] = row
+        else:
+            last_row += 1; writes[last_row] = row
+        counts['ditambah'] += 1
+    counts['dihapus'] = len(stale)
+    return writes, last_row, stale, counts
+
+def _grid_range(sheet_id, end_row, start_col, end_col, start_row=0):
+    return {'sheetId': sheet_id, 'startRowIndex': start_row, 'endRowIndex': end_row,
+            'startColumnIndex': start_col, 'endColumnIndex': end_col}
+
+def commit_requests(target, staging_id, final_rows, width, sheet_title=MATCHING_SHEET):
+    """Permintaan batchUpdate yang memindahkan isi staging ke sheet target, mempertahankan sheetId target.
+
+    Sheet target diperbesar/dipotong menjadi final_rows baris, kolom di kanan
+    hasil dikosongkan, lalu staging dihapus. Tanpa target (tulisan pertama),
+    staging cukup diganti nama.
+    """
+    if target is None:
+        return [{'updateSheetProperties': {'properties': {'sheetId': staging_id, 'title': sheet_title}, 'fields': 'title'}}]
+    grid = target.get('gridProperties', {})
+    target_id, target_rows, target_cols = target['sheetId'], grid.get('rowCount', final_rows), grid.get('columnCount', width)
+    requests = []
+    if final_rows > target_rows:
+        requests.append({'appendDimension': {'sheetId': target_id, 'dimension': 'ROWS', 'length': final_rows - target_rows}})
+    requests.append({'copyPaste': {
+        'source': _grid_range(staging_id, final_rows, 0, width),
+        'destination': _grid_range(target_id, final_rows, 0, width),
+        'pasteType': 'PASTE_NORMAL',
+    }})
+    if target_cols > width:
+        requests.append({'updateCells': {'range': _grid_range(target_id, final_rows, width, target_cols), 'fields': 'userEnteredValue'}})
+    if target_rows > final_rows:
+        requests.append({'deleteDimension': {'range': {'sheetId': target_id, 'dimension': 'ROWS', 'startIndex': final_rows, 'endIndex': target_rows}}})
+    requests.append({'deleteSheet': {'sheetId': staging_id}})
+    return requests
+
+def write_matches_diff(spreadsheet, results_df, sheet_title=MATCHING_SHEET, batch_rows=WRITE_BATCH_ROWS):
+    """Tulis results_df ke sheet HASIL_MATCHING secara diff, lewat salinan staging yang disalin kembali atomik.
+
+    Mengembalikan report berisi jumlah baris diperbarui/ditambah/dihapus/tetap,
+    jumlah panggilan API, dan durasi.
+    """
+    started = time.perf_counter()
+    header = [str(c) for c in results_df.columns]
+    new_rows = frame_rows(results_df)
+    staging_title = sheet_title + STAGING_SUFFIX
+    report = {'api_calls': 0}
+
+    sheets = list_sheet_titles(spreadsheet)
+    report['api_calls'] += 1
+    setup_requests = []
+    if staging_title in sheets:
+        setup_requests.append({'deleteSheet': {'sheetId': sheets[staging_title]['sheetId']}})
+
+    existing_values = []
+    target = sheets.get(sheet_title)
+    if target is not None:
+        response = spreadsheet.values_get(a1_sheet_range(sheet_title), params={'valueRenderOption': 'UNFORMATTED_VALUE'})
+        report['api_calls'] += 1
+        existing_values = response.get('values', [])
+    can_diff = bool(existing_values) and [str(c).strip() for c in existing_values[0]] == header
+
+    if can_diff:
+        setup_requests.append({'duplicateSheet': {'sourceSheetId': target['sheetId'], 'newSheetName': staging_title}})
+    else:
+        # Sheet belum ada atau header berbeda: staging dibuat kosong dan diisi penuh
+        existing_values = [header]
+        setup_requests.append({'addSheet': {'properties': {'title': staging_title, 'gridProperties': {'rowCount': 1, 'columnCount': len(header)}}}})
+    reply = spreadsheet.batch_update({'requests': setup_requests})
+    report['api_calls'] += 1
+    staging = reply['replies'][-1].get('duplicateSheet', reply['replies'][-1].get('addSheet'))['properties']
+    staging_id = staging['sheetId']
+
+    writes, final_rows, stale, counts = diff_rows(existing_values, header, new_rows)
+    if not can_diff: writes[1] = header
+
+    # Kolom tanggal ditulis sebagai satu rentang kolom jika ada nilai yang berbeda
+    date_batches = []
+    if DATE_COL in header and new_rows:
+        date_pos = header.index(DATE_COL)
+        new_date = new_rows[0][date_pos]
+        old_dates = {row[date_pos] if len(row) > date_pos else '' for row in existing_values[1:]}
+        if old_dates - {new_date}:
+            date_col = {number: [new_date] for number in range(2, final_rows + 1)}
+            date_batches = _chunked_value_ranges(staging_title, date_col, 1, batch_rows, first_col=date_pos + 1)
+
+    grid_rows = staging.get('gridProperties', {}).get('rowCount', 1)
+    if final_rows > grid_rows:
+        spreadsheet.batch_update({'requests': [{'appendDimension': {'sheetId': staging_id, 'dimension': 'ROWS', 'length': final_rows - grid_rows}}]})
+        report['api_calls'] += 1
+
+    for batch in _chunked_value_ranges(staging_title, writes, len(header), batch_rows) + date_batches:
+        spreadsheet.values_batch_update({'valueInputOption': 'RAW', 'data': batch})
+        report['api_calls'] += 1
+
+    # Hapus baris usang dari bawah ke atas agar nomor baris di atasnya tidak bergeser
+    delete_requests = [
+        {'deleteDimension': {'range': {'sheetId': staging_id, 'dimension': 'ROWS', 'startIndex': start - 1, 'endIndex': end}}}
+        for start, end in reversed(_row_runs(stale))
+    ]
+    for i in range(0, len(delete_requests), batch_rows):
+        spreadsheet.batch_update({'requests': delete_requests[i:i + batch_rows]})
+        report['api_calls'] += 1
+
+    # Commit: salin staging ke sheet asli & hapus staging dalam satu batchUpdate (atomik)
+    spreadsheet.batch_update({'requests': commit_requests(target, staging_id, final_rows - len(stale), len(header), sheet_title)})
+    report['api_calls'] += 1
+
+    report.update(counts)
+    report['detik'] = time.perf_counter() - started
+    return report
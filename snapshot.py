@@ -0,0 +1,308 @@
+# ===================================================================================
+#  SNAPSHOT LOKAL (PARQUET) & REFRESH INKREMENTAL
+#  rekap_df, database_df, dan matches_df yang sudah bersih disimpan ke disk
+#  dalam format Parquet bersama manifest per sheet (jumlah baris, header, baris
+#  terakhir, tanggal terakhir). Refresh hanya mengambil baris REKAP yang
+#  ditambahkan sejak snapshot terakhir; DATABASE & HASIL_MATCHING (kecil dan
+#  ditulis ulang) selalu diambil penuh.
+#
+#  REKAP disimpan terpartisi per bulan & toko (Bulan=YYYYMM/Toko=...), sehingga
+#  pembacaan satu rentang tanggal hanya membuka partisi bulan yang dibutuhkan
+#  (predicate pushdown). Tabel kecil "terbaru per produk" (baris terakhir tiap
+#  Toko & Nama Produk dari seluruh riwayat) disimpan terpisah untuk tampilan
+#  yang tidak butuh riwayat.
+# ===================================================================================
+
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import instrumentation
+from derived import latest_rows
+from ingestion import (
+    MATCHING_SHEET, a1_sheet_range, add_parse_time, align_rows, assemble_rekap, build_frames,
+    compact_rekap, fetch_ranges, fill_brand, iter_sheet_values, list_sheet_titles,
+    needs_brand_fallback, new_fetch_report, pad_rows, parse_matches_values, parse_rekap_values, workbook_sheet_names,
+)
+
+# ================================
+# KONFIGURASI SNAPSHOT
+# ================================
+SNAPSHOT_ROOT = os.environ.get(
+    "DASHBOARD_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "snapshot"),
+)
+SNAPSHOT_VERSION = 3  # 2: skema ringkas (compact_rekap); 3: REKAP terpartisi + tabel terbaru per produk
+MANIFEST_FILE = "manifest.json"
+FRAME_NAMES = ['rekap', 'database', 'matches']
+PARTITION_COLS = ['Bulan', 'Toko']
+LATEST_KEYS = ['Toko', 'Nama Produk']
+HISTORY_WINDOW_DAYS = 56  # riwayat yang disimpan di memori dashboard; bulan yang lebih lama dimuat saat dibutuhkan
+SQL_MIRROR_SUFFIX = ".sqlite"  # cermin SQLite folder REKAP satu generasi (storage.SqlStore), dihapus bersama foldernya
+
+
+def snapshot_dir(spreadsheet_key):
+    return os.path.join(SNAPSHOT_ROOT, spreadsheet_key)
+
+def _trim_row(row):
+    # Bandingkan baris tanpa sel kosong di ujung (API memotongnya secara tidak konsisten)
+    row = list(row)
+    while row and row[-1] == '': row.pop()
+    return row
+
+def month_number(dates):
+    # Kunci partisi bulan sebagai angka YYYYMM (bisa dibandingkan langsung di filter)
+    dates = pd.DatetimeIndex(dates)
+    return dates.year * 100 + dates.month
+
+def window_start(date_max, days=HISTORY_WINDOW_DAYS):
+    """Awal bulan dari (date_max - days): batas bawah jendela riwayat yang dimuat per bulan penuh."""
+    return (pd.Timestamp(date_max) - pd.Timedelta(days=days)).to_period('M').to_timestamp()
+
+def history_info(rekap_df):
+    # Ringkasan riwayat yang disimpan di manifest (rentang tanggal & daftar bulan) tanpa membaca partisi
+    months = pd.unique(month_number(rekap_df['Tanggal']))
+    return {'date_min': rekap_df['Tanggal'].min().strftime('%Y-%m-%d'), 'date_max': rekap_df['Tanggal'].max().strftime('%Y-%m-%d'),
+            'months': sorted(int(m) for m in months), 'columns': [str(c) for c in rekap_df.columns], 'rows': int(len(rekap_df))}
+
+def latest_table(rekap_df):
+    """Baris terbaru per (Toko, Nama Produk) dari seluruh riwayat."""
+    return latest_rows(rekap_df, LATEST_KEYS).reset_index(drop=True)
+
+def sheet_manifest_entry(values, rekap_part=None):
+    entry = {'row_count': len(values) - 1, 'header': _trim_row(values[0]), 'last_row': _trim_row(values[-1]), 'last_date': None}
+    if rekap_part is not None and not rekap_part.empty:
+        entry['last_date'] = rekap_part['Tanggal'].max().strftime('%Y-%m-%d')
+    return entry
+
+
+# ================================
+# BACA / TULIS SNAPSHOT
+# ================================
+def read_manifest(spreadsheet_key):
+    """Manifest snapshot (tanpa membaca frame apa pun) atau None jika tidak ada / versi lama."""
+    try:
+        with open(os.path.join(snapshot_dir(spreadsheet_key), MANIFEST_FILE), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == SNAPSHOT_VERSION else None
+
+def write_rekap_partitions(rekap_df, path):
+    rekap_df.assign(Bulan=month_number(rekap_df['Tanggal'])).to_parquet(path, partition_cols=PARTITION_COLS, index=False)
+
+def read_rekap_partitions(path, columns, start_date=None, end_date=None, stores=None):
+    # Filter pada kolom partisi Bulan & Toko: folder di luar rentang/toko tidak dibuka sama sekali
+    filters = []
+    if start_date is not None: filters.append(('Bulan', '>=', int(month_number([start_date])[0])))
+    if end_date is not None: filters.append(('Bulan', '<=', int(month_number([end_date])[0])))
+    if stores is not None: filters.append(('Toko', 'in', list(stores)))
+    rekap_df = pd.read_parquet(path, filters=filters or None)
+    # Partisi dibaca per folder; kembalikan urutan kolom & urutan tanggal seperti saat disimpan
+    rekap_df = rekap_df[[col for col in columns if col in rekap_df.columns]]
+    return rekap_df.sort_values('Tanggal', kind='mergesort').reset_index(drop=True)
+
+def _read_frame(directory, manifest, name, start_date=None, end_date=None, stores=None):
+    path = os.path.join(directory, manifest['files'][name])
+    if name == 'rekap':
+        return read_rekap_partitions(path, manifest['history']['columns'], start_date, end_date, stores)
+    return pd.read_parquet(path)
+
+def load_snapshot(spreadsheet_key, start_date=None, end_date=None):
+    """Baca snapshot lokal. Mengembalikan (rekap_df, database_df, matches_df, manifest) atau None.
+
+    start_date/end_date membatasi REKAP ke partisi bulan yang beririsan dengan rentang itu.
+    """
+    manifest = read_manifest(spreadsheet_key)
+    if manifest is None: return None
+    directory = snapshot_dir(spreadsheet_key)
+    try:
+        with instrumentation.span("snapshot.load", terbatas=start_date is not None or end_date is not None):
+            frames = {name: _read_frame(directory, manifest, name, start_date, end_date) for name in FRAME_NAMES}
+    except Exception:
+        return None
+    return frames['rekap'], frames['database'], frames['matches'], manifest
+
+def load_snapshot_frame(spreadsheet_key, name, start_date=None, end_date=None, stores=None):
+    """Baca satu frame snapshot saja ('rekap' | 'database' | 'matches' | 'latest'). Mengembalikan (frame, manifest) atau None.
+
+    stores membatasi REKAP ke partisi toko tertentu.
+    """
+    manifest = read_manifest(spreadsheet_key)
+    if manifest is None: return None
+    try:
+        with instrumentation.span("snapshot.load", frame=name):
+            return _read_frame(snapshot_dir(spreadsheet_key), manifest, name, start_date, end_date, stores), manifest
+    except Exception:
+        return None
+
+def save_snapshot(spreadsheet_key, rekap_df, database_df, matches_df, manifest):
+    # File ditulis dengan nomor generasi baru; manifest diganti paling akhir (atomik),
+    # sehingga snapshot lama tetap utuh jika proses terhenti di tengah jalan.
+    # Frame bernilai None tidak ditulis ulang; file dari generasi sebelumnya dipakai lagi.
+    # REKAP ditulis sebagai folder partisi, bersama tabel terbaru per produk & ringkasan riwayatnya.
+    directory = snapshot_dir(spreadsheet_key)
+    os.makedirs(directory, exist_ok=True)
+    current = {}
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), encoding='utf-8') as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        pass
+    generation = current.get('generation', 0) + 1
+    old_files = set(current.get('files', {}).values())
+    files, history = {}, current.get('history')
+    for name, frame in zip(FRAME_NAMES, [rekap_df, database_df, matches_df]):
+        if frame is None:
+            files[name] = current['files'][name]; continue
+        with instrumentation.span("snapshot.save", frame=name, baris=len(frame)):
+            if name == 'rekap':
+                files['rekap'], files['latest'] = f"rekap-{generation}", f"latest-{generation}.parquet"
+                write_rekap_partitions(frame, os.path.join(directory, files['rekap']))
+                latest_table(frame).to_parquet(os.path.join(directory, files['latest']), index=False)
+                history = history_info(frame)
+                continue
+            files[name] = f"{name}-{generation}.parquet"
+            frame.to_parquet(os.path.join(directory, files[name]), index=False)
+    if rekap_df is None: files['latest'] = current['files']['latest']
+
+    manifest = dict(manifest, version=SNAPSHOT_VERSION, generation=generation, files=files, history=history,
+                    spreadsheet_key=spreadsheet_key, saved_at=datetime.now().isoformat(timespec='seconds'))
+    tmp_path = os.path.join(directory, MANIFEST_FILE + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+    for file_name in old_files - set(files.values()):
+        path = os.path.join(directory, file_name)
+        try:
+            if os.path.isdir(path): shutil.rmtree(path)
+            else: os.remove(path)
+            if os.path.exists(path + SQL_MIRROR_SUFFIX): os.remove(path + SQL_MIRROR_SUFFIX)
+        except OSError: pass
+    return manifest
+
+
+def refresh_matches(spreadsheet, spreadsheet_key):
+    """Baca ulang HASIL_MATCHING saja (satu panggilan API) dan ganti frame matches di snapshot."""
+    response = spreadsheet.values_get(a1_sheet_range(MATCHING_SHEET))
+    matches_df = parse_matches_values(pad_rows(response.get('values', [])))
+    manifest = read_manifest(spreadsheet_key)
+    if manifest is not None:
+        save_snapshot(spreadsheet_key, None, None, matches_df, manifest)
+    return matches_df
+
+
+# ================================
+# PEMUATAN PENUH & INKREMENTAL
+# ================================
+def full_load(spreadsheet, sheet_names=None):
+    """Ambil semua sheet dari awal. Mengembalikan (rekap_df, database_df, matches_df, manifest, report).
+
+    sheet_names=None: SHEET_NAMES ditambah sheet REKAP lain di workbook (lihat
+    ingestion.workbook_sheet_names). Sheet diparse satu per satu saat tiba (lihat
+    ingestion.build_frames); nilai mentahnya tidak ditahan sampai seluruh
+    spreadsheet terbaca.
+    """
+    started = time.perf_counter()
+    report, entries = new_fetch_report(), {}
+    available = list_sheet_titles(spreadsheet)
+    report['api_calls'] += 1
+    if sheet_names is None: sheet_names = workbook_sheet_names(available)
+
+    def remember(sheet_name, values, part):
+        entries[sheet_name] = sheet_manifest_entry(values, part)
+
+    sheet_values = iter_sheet_values(spreadsheet, sheet_names + [MATCHING_SHEET], report, available=available)
+    rekap_parts, database_df, matches_df = build_frames(sheet_values, sheet_names, on_rekap=remember, report=report)
+    report['mode'] = 'penuh'
+    report['total_detik'] = time.perf_counter() - started
+    if not rekap_parts:
+        return None, database_df, matches_df, None, report
+
+    manifest = {'sheets': {name: entries[name] for name in rekap_parts}}
+    # Brand fallback jika tidak ada satu pun sheet dengan kolom BRAND terisi (tanpa menggabung frame dulu)
+    manifest['brand_derived'] = all(needs_brand_fallback(part) for part in rekap_parts.values())
+    with instrumentation.span("parse.compact"):
+        rekap_df, report['memori'] = compact_rekap(assemble_rekap(rekap_parts.values()))
+    return rekap_df, database_df, matches_df, manifest, report
+
+def incremental_refresh(spreadsheet, snapshot, sheet_names=None):
+    """Perbarui snapshot dengan baris REKAP baru saja. Sheet REKAP yang baru muncul
+    di workbook diambil penuh (sheet_names=None, lihat full_load).
+
+    Jika ada sheet yang hilang, dipotong, atau header/baris terakhirnya berubah,
+    fungsi ini jatuh kembali ke full_load().
+    """
+    started = time.perf_counter()
+    rekap_df, _, _, manifest = snapshot
+    report = new_fetch_report()
+    available = list_sheet_titles(spreadsheet)
+    report['api_calls'] += 1
+
+    known_sheets = manifest.get('sheets', {})
+    if any(name not in available for name in known_sheets):
+        return full_load(spreadsheet, sheet_names)
+    if sheet_names is None: sheet_names = workbook_sheet_names(available)
+
+    ranges, tail_sheets = {}, []
+    for sheet_name in sheet_names + [MATCHING_SHEET]:
+        if sheet_name not in available:
+            report['missing'].append(sheet_name); continue
+        entry = known_sheets.get(sheet_name)
+        if entry is None:
+            ranges[sheet_name] = a1_sheet_range(sheet_name); continue
+        quoted = a1_sheet_range(sheet_name)
+        last_known = entry['row_count'] + 1  # nomor baris (1-based) terakhir yang sudah tersimpan
+        grid_rows = available[sheet_name].get('gridProperties', {}).get('rowCount', 0)
+        if grid_rows < last_known:
+            return full_load(spreadsheet, sheet_names)
+        ranges[(sheet_name, 'header')] = f"{quoted}!1:1"
+        ranges[(sheet_name, 'last')] = f"{quoted}!{last_known}:{last_known}"
+        if grid_rows > last_known:
+            ranges[(sheet_name, 'tail')] = f"{quoted}!{last_known + 1}:{grid_rows}"
+        tail_sheets.append(sheet_name)
+
+    fetched = fetch_ranges(spreadsheet, ranges, report)
+    if any(key not in fetched for key in ranges):
+        return full_load(spreadsheet, sheet_names)
+
+    new_parts, manifest = [], dict(manifest, sheets=dict(known_sheets))
+    for sheet_name in tail_sheets:
+        entry = known_sheets[sheet_name]
+        header = fetched[(sheet_name, 'header')]
+        last = fetched[(sheet_name, 'last')]
+        if _trim_row(header[0] if header else []) != entry['header'] or _trim_row(last[0] if last else []) != entry['last_row']:
+            return full_load(spreadsheet, sheet_names)
+        tail = fetched.get((sheet_name, 'tail'), [])
+        if not tail: continue
+        parse_started = time.perf_counter()
+        with instrumentation.span("parse.tail", sheet=sheet_name, baris=len(tail)):
+            part = parse_rekap_values(sheet_name, header[0], align_rows(header[0], tail))
+        add_parse_time(report, (sheet_name, 'tail'), time.perf_counter() - parse_started)
+        new_parts.append(fill_brand(part, force=True) if manifest.get('brand_derived') else part)
+        updated = sheet_manifest_entry([header[0]] + tail, part)
+        updated['row_count'] = entry['row_count'] + len(tail)
+        updated['last_date'] = updated['last_date'] or entry.get('last_date')
+        manifest['sheets'][sheet_name] = updated
+
+    # Sheet REKAP baru (belum ada di manifest) & sheet kecil diambil penuh
+    def remember(sheet_name, values, part):
+        manifest['sheets'][sheet_name] = sheet_manifest_entry(values, part)
+
+    full_values = ((name, fetched.pop(name)) for name in ranges if isinstance(name, str))
+    rekap_parts, database_df, matches_df = build_frames(full_values, sheet_names, on_rekap=remember, report=report)
+    for part in rekap_parts.values():
+        new_parts.append(fill_brand(part, force=True) if manifest.get('brand_derived') else part)
+
+    if new_parts:
+        with instrumentation.span("parse.compact"):
+            rekap_df, report['memori'] = compact_rekap(assemble_rekap([rekap_df] + new_parts))
+    report['mode'] = 'inkremental'
+    report['baris_baru'] = int(sum(len(part) for part in new_parts))
+    report['total_detik'] = time.perf_counter() - started
+    return rekap_df, database_df, matches_df, manifest, report
@@ -0,0 +1,189 @@
+# ===================================================================================
+#  BACKEND PENYIMPANAN DATA
+#  Dua sumber di bawah load_all_data:
+#    - SheetsBackend: Google Sheets (muat penuh, atau hanya baris baru);
+#    - SnapshotBackend: snapshot lokal Parquet terpartisi (snapshot.py), plus
+#      SqlStore: cermin SQLite dari REKAP untuk agregasi yang dijalankan di SQL.
+#
+#  SqlStore menjawab agregat besar (omzet mingguan per toko, baris terbaru per
+#  (Toko, Nama Produk), brand per toko kompetitor) untuk rentang berapa pun,
+#  termasuk seluruh riwayat, tanpa membaca baris mentah ke memori Python; hanya
+#  hasil agregat yang kecil yang kembali sebagai DataFrame. Cermin dibangun sekali
+#  per generasi snapshot (saat pertama dibutuhkan), satu file Parquet per langkah,
+#  dan dihapus bersama generasinya oleh save_snapshot.
+# ===================================================================================
+
+import os
+import sqlite3
+import threading
+import uuid
+
+import pandas as pd
+import pyarrow.dataset as pads
+
+from derived import MY_STORE_NAME
+from snapshot import (
+    LATEST_KEYS, SQL_MIRROR_SUFFIX, full_load, incremental_refresh, load_snapshot, load_snapshot_frame, read_manifest,
+    save_snapshot, snapshot_dir, window_start,
+)
+
+# ================================
+# KONFIGURASI
+# ================================
+SQL_COLUMNS = ['Tanggal', 'Toko', 'Nama Produk', 'SKU', 'Brand', 'KATEGORI', 'Status', 'Harga', 'Terjual per Bulan', 'Omzet']
+SQL_REQUIRED = ['Tanggal', 'Toko', 'Nama Produk', 'Omzet', 'Terjual per Bulan']
+SQL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+INSERT_BATCH_ROWS = 50_000
+_build_lock = threading.Lock()
+
+
+def _sql_date(value, default):
+    return default if value is None else pd.Timestamp(value).strftime(SQL_DATE_FORMAT)
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+# ================================
+# CERMIN SQLITE & AGREGASI DI SQL
+# ================================
+class SqlStore:
+    """Kueri agregat di atas cermin SQLite REKAP satu generasi snapshot.
+
+    Rentang [start_date, end_date] memakai aturan yang sama dengan
+    build_derived_frames (Tanggal >= awal dan <= akhir); None berarti tanpa batas.
+    Baris terbaru per kunci memakai urutan simpan sebagai pemecah tanggal kembar,
+    sama seperti derived.latest_rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def build(cls, rekap_path, columns, path):
+        # Satu fragmen (bulan x toko) per langkah; file ditulis ke nama sementara lalu diganti atomik
+        columns = [col for col in SQL_COLUMNS if col in columns]
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        dataset = pads.dataset(rekap_path, partitioning='hive')
+        file_columns = [col for col in columns if col in dataset.schema.names and col != 'Toko']
+        with sqlite3.connect(tmp_path) as con:
+            con.execute(f"CREATE TABLE rekap ({', '.join(_quote(col) for col in columns)})")
+            insert = f"INSERT INTO rekap VALUES ({', '.join('?' * len(columns))})"
+            for fragment in sorted(dataset.get_fragments(), key=lambda f: f.path):
+                keys = pads.get_partition_keys(fragment.partition_expression)
+                for batch in fragment.to_batches(columns=file_columns, batch_size=INSERT_BATCH_ROWS, use_threads=False):
+                    part = batch.to_pandas().assign(Toko=keys.get('Toko'))
+                    part['Tanggal'] = part['Tanggal'].dt.strftime(SQL_DATE_FORMAT)
+                    part = part[columns].astype(object)
+                    con.executemany(insert, part.where(part.notna(), None).itertuples(index=False, name=None))
+            con.execute('CREATE INDEX idx_rekap_tanggal ON rekap ("Tanggal")')
+            con.execute('CREATE INDEX idx_rekap_produk ON rekap ("Toko", "Nama Produk", "Tanggal")')
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def query(self, sql, params=()):
+        # Koneksi baca-saja per kueri: aman dipakai bersama oleh banyak sesi/thread
+        with sqlite3.connect(f"file:{self.path}?mode=ro", uri=True) as con:
+            return pd.read_sql_query(sql, con, params=params)
+
+    def _range(self, start_date, end_date):
+        return _sql_date(start_date, '0000-01-01 00:00:00'), _sql_date(end_date, '9999-12-31 23:59:59')
+
+    def latest_rows(self, start_date=None, end_date=None, keys=LATEST_KEYS):
+        """Baris terbaru per (Toko, Nama Produk) di rentang, terurut menurut kunci."""
+        key_sql = ', '.join(_quote(key) for key in keys)
+        latest = self.query(f"""
+            SELECT * FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY {key_sql} ORDER BY "Tanggal" DESC, rowid) AS _urutan
+                FROM rekap WHERE "Tanggal" BETWEEN ? AND ?
+            ) WHERE _urutan = 1 ORDER BY {key_sql}
+        """, self._range(start_date, end_date))
+        latest['Tanggal'] = pd.to_datetime(latest['Tanggal'])
+        return latest.drop(columns='_urutan')
+
+    def weekly_omzet(self, start_date=None, end_date=None):
+        """Omzet per (Minggu, Toko) dari baris terbaru tiap produk per minggu (setara rollup['weekly_omzet'])."""
+        weekly = self.query("""
+            WITH ranked AS (
+                SELECT date("Tanggal", 'weekday 0', '-6 days') AS Minggu, "Toko", "Omzet",
+                       ROW_NUMBER() OVER (PARTITION BY date("Tanggal", 'weekday 0', '-6 days'), "Toko", "Nama Produk"
+                                          ORDER BY "Tanggal" DESC, rowid) AS _urutan
+                FROM rekap WHERE "Tanggal" BETWEEN ? AND ?
+            )
+            SELECT Minggu, "Toko", SUM("Omzet") AS Omzet FROM ranked WHERE _urutan = 1
+            GROUP BY Minggu, "Toko" ORDER BY Minggu, "Toko"
+        """, self._range(start_date, end_date))
+        weekly['Minggu'] = pd.to_datetime(weekly['Minggu'])
+        return weekly
+
+    def brand_breakdown(self, start_date=None, end_date=None, my_store_name=MY_STORE_NAME):
+        """Omzet & unit terjual per (Toko, Brand) kompetitor dari snapshot terakhir tiap produk (setara rollup['competitor_brands'])."""
+        return self.query("""
+            WITH ranked AS (
+                SELECT "Toko", "Brand", "Omzet", "Terjual per Bulan",
+                       ROW_NUMBER() OVER (PARTITION BY "Toko", "Nama Produk" ORDER BY "Tanggal" DESC, rowid) AS _urutan
+                FROM rekap WHERE "Tanggal" BETWEEN ? AND ? AND "Toko" != ?
+            )
+            SELECT "Toko", "Brand", SUM("Omzet") AS Total_Omzet, SUM("Terjual per Bulan") AS Total_Unit_Terjual
+            FROM ranked WHERE _urutan = 1 AND "Brand" IS NOT NULL
+            GROUP BY "Toko", "Brand" ORDER BY "Toko", "Brand"
+        """, self._range(start_date, end_date) + (my_store_name,))
+
+
+# ================================
+# BACKEND SUMBER DATA
+# ================================
+class SheetsBackend:
+    """Google Sheets sebagai sumber asli. Mengembalikan (rekap_df, database_df, matches_df, manifest, report)."""
+    name = 'sheets'
+
+    def __init__(self, gc):
+        self.gc = gc
+
+    def load(self, spreadsheet_key):
+        return full_load(self.gc.open_by_key(spreadsheet_key))
+
+    def refresh(self, spreadsheet_key, snapshot):
+        # Hanya baris REKAP yang ditambahkan sejak snapshot; jatuh ke muat penuh jika sheet berubah
+        return incremental_refresh(self.gc.open_by_key(spreadsheet_key), snapshot)
+
+
+class SnapshotBackend:
+    """Snapshot lokal satu spreadsheet: frame Parquet terpartisi dan SqlStore untuk agregat seluruh riwayat."""
+    name = 'snapshot'
+
+    def __init__(self, spreadsheet_key):
+        self.spreadsheet_key = spreadsheet_key
+
+    def manifest(self):
+        return read_manifest(self.spreadsheet_key)
+
+    def load(self, start_date=None, end_date=None):
+        return load_snapshot(self.spreadsheet_key, start_date, end_date)
+
+    def load_window(self):
+        """Jendela riwayat terbaru + tabel terbaru per produk: (rekap_df, database_df, matches_df, manifest, latest_df) atau None."""
+        manifest = self.manifest()
+        if manifest is None: return None
+        snapshot = self.load(start_date=window_start(manifest['history']['date_max']))
+        latest = load_snapshot_frame(self.spreadsheet_key, 'latest')
+        if snapshot is None or latest is None: return None
+        return snapshot + (latest[0],)
+
+    def load_frame(self, name, start_date=None, end_date=None, stores=None):
+        return load_snapshot_frame(self.spreadsheet_key, name, start_date, end_date, stores)
+
+    def save(self, rekap_df, database_df, matches_df, manifest):
+        return save_snapshot(self.spreadsheet_key, rekap_df, database_df, matches_df, manifest)
+
+    def sql_store(self):
+        """SqlStore untuk generasi snapshot saat ini (dibangun jika belum ada), atau None tanpa snapshot."""
+        manifest = self.manifest()
+        if manifest is None: return None
+        columns = manifest['history']['columns']
+        if not all(col in columns for col in SQL_REQUIRED): return None
+        rekap_path = os.path.join(snapshot_dir(self.spreadsheet_key), manifest['files']['rekap'])
+        path = rekap_path + SQL_MIRROR_SUFFIX
+        with _build_lock:
+            if os.path.exists(path): return SqlStore(path)
+            return SqlStore.build(rekap_path, columns, path)
@@ -0,0 +1,36 @@
+# ===================================================================================
+#  FIXTURE BERSAMA UNTUK TES
+#  Modul aplikasi berada di akar repo (tanpa paket), jadi akar repo ditambahkan
+#  ke sys.path. Semua direktori tulis (snapshot, cache skor, antrean job)
+#  diarahkan ke tmp_path agar tes tidak menyentuh .cache/ milik dashboard.
+# ===================================================================================
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jobs
+import matching
+import snapshot
+from offline_sheets import OfflineClient, generate_workbook
+
+SPREADSHEET_KEY = "tes"
+
+
+@pytest.fixture(autouse=True)
+def isolated_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_ROOT', str(tmp_path / "snapshot"))
+    monkeypatch.setattr(matching, 'MATCH_CACHE_ROOT', str(tmp_path / "matching"))
+    monkeypatch.setattr(jobs, 'JOBS_DIR', str(tmp_path / "jobs"))
+    return tmp_path
+
+@pytest.fixture
+def workbook():
+    return generate_workbook(n_products=80, n_stores=4, n_days=21, seed=7)
+
+@pytest.fixture
+def client(workbook):
+    return OfflineClient(workbook)
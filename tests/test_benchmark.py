@@ -0,0 +1,22 @@
+import pytest
+
+import benchmark
+import matching
+import snapshot
+
+
+def test_run_suite_uses_workdir_and_restores_roots(tmp_path):
+    roots = snapshot.SNAPSHOT_ROOT, matching.MATCH_CACHE_ROOT
+    result = benchmark.run_suite(30, 3, 14, repeat=1, workdir=str(tmp_path / "bench"), price_update=False)
+    assert (snapshot.SNAPSHOT_ROOT, matching.MATCH_CACHE_ROOT) == roots
+    assert (tmp_path / "bench" / "snapshot").is_dir()
+    stages = {row['tahap'] for row in result['hasil']}
+    assert {'tab1.analisis_toko', 'tab2.perbandingan_harga', 'tab6.analisis_mingguan', 'hpp.analisis_hpp'} <= stages
+
+def test_run_suite_restores_roots_on_failure(tmp_path, monkeypatch):
+    roots = snapshot.SNAPSHOT_ROOT, matching.MATCH_CACHE_ROOT
+    def fail(*args, **kwargs): raise RuntimeError("gagal")
+    monkeypatch.setattr(benchmark, 'generate_workbook', fail)
+    with pytest.raises(RuntimeError):
+        benchmark.run_suite(30, 3, 14, repeat=1, workdir=str(tmp_path / "bench"), price_update=False)
+    assert (snapshot.SNAPSHOT_ROOT, matching.MATCH_CACHE_ROOT) == roots
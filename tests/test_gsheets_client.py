@@ -0,0 +1,35 @@
+import threading
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from gspread.http_client import HTTPClient
+
+import gsheets_client
+from gsheets_client import QuotaHTTPClient, TokenBucket
+
+
+def test_stats_are_exact_under_concurrent_requests(monkeypatch):
+    monkeypatch.setattr(gsheets_client, 'BUCKETS', {'baca': TokenBucket(10_000, burst=1_000), 'tulis': TokenBucket(10_000, burst=1_000)})
+    sent = []
+
+    def fake_request(self, method, endpoint, **kwargs):
+        sent.append(endpoint)
+        time.sleep(0.01)  # cukup lama agar baca identik tergabung
+        return endpoint
+
+    monkeypatch.setattr(HTTPClient, 'request', fake_request)
+    client = QuotaHTTPClient(AnonymousCredentials())
+    endpoints = [f"values/{i % 4}" for i in range(400)]
+    barrier = threading.Barrier(8)
+
+    def worker(part):
+        barrier.wait()
+        for endpoint in part:
+            assert client.request('get', endpoint) == endpoint
+
+    threads = [threading.Thread(target=worker, args=(endpoints[i::8],)) for i in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    stats = client.stats
+    assert stats['dikirim'] == len(sent)
+    assert stats['dikirim'] + stats['digabung'] == len(endpoints)
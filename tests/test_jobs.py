@@ -0,0 +1,120 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+
+PARAMS = {'spreadsheet_key': "tes", 'score_cutoff': 91, 'incremental': True}
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def wait_for_status(status, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.latest_job("tes")
+        if job['status'] == status: return job
+        time.sleep(0.05)
+    return job
+
+def test_active_job_is_deduplicated():
+    job, created = jobs.create_job(PARAMS, pid=os.getpid())
+    again, created_again = jobs.create_job(dict(PARAMS, score_cutoff=95))
+    assert created and not created_again
+    assert again['id'] == job['id']
+    other, created_other = jobs.create_job(dict(PARAMS, spreadsheet_key="lain"))
+    assert created_other and other['id'] != job['id']
+
+def test_dead_worker_marks_job_failed():
+    for status in jobs.ACTIVE_STATUSES:
+        job, created = jobs.create_job(PARAMS, pid=dead_pid())
+        assert created
+        jobs.update_job(job['id'], status=status)
+        latest = jobs.latest_job("tes")
+        assert latest['id'] == job['id'] and latest['status'] == 'gagal'
+        assert jobs.read_job(job['id'])['status'] == 'gagal'
+    # Job mati tidak lagi menghalangi job baru
+    _, created = jobs.create_job(PARAMS, pid=os.getpid())
+    assert created
+
+def test_crashed_worker_is_reaped_and_job_fails(tmp_path, monkeypatch):
+    # Worker yang mati oleh SIGKILL tanpa pernah memperbarui job; tidak ada yang memanggil wait()
+    crashing_worker = tmp_path / "worker.py"
+    crashing_worker.write_text("import os, signal\nos.kill(os.getpid(), signal.SIGKILL)\n")
+    monkeypatch.setattr(jobs, 'WORKER_SCRIPT', str(crashing_worker))
+    job, created = jobs.submit_job(PARAMS)
+    assert created
+    assert wait_for_status('gagal')['id'] == job['id']
+    again, created = jobs.submit_job(PARAMS)
+    assert created and again['id'] != job['id']
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason="status zombie dibaca dari /proc")
+def test_unreaped_zombie_worker_marks_job_failed():
+    # Worker bukan anak yang tercatat di jobs (mis. dari proses dashboard lain) dan tidak dipanen: jadi zombie
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    try:
+        jobs.create_job(PARAMS, pid=process.pid)
+        os.kill(process.pid, signal.SIGKILL)
+        assert wait_for_status('gagal')['pesan'] == "Proses worker berhenti tanpa menyelesaikan job."
+    finally:
+        process.wait()
+
+def test_queued_job_without_worker_times_out():
+    job, _ = jobs.create_job(PARAMS)
+    assert jobs.latest_job("tes")['status'] == 'antre'
+    old = (datetime.now() - timedelta(seconds=jobs.QUEUED_TIMEOUT_SECONDS + 1)).isoformat(timespec='seconds')
+    jobs.update_job(job['id'], created_at=old)
+    latest = jobs.latest_job("tes")
+    assert latest['status'] == 'gagal' and latest['pesan'] == "Worker tidak pernah memulai job ini."
+
+def hold_lock(pid):
+    os.makedirs(jobs.JOBS_DIR, exist_ok=True)
+    lock_path = os.path.join(jobs.JOBS_DIR, "queue.lock")
+    with open(lock_path, 'w', encoding='utf-8') as f:
+        f.write(str(pid))
+    return lock_path
+
+def test_lock_of_live_holder_is_not_stolen(monkeypatch):
+    monkeypatch.setattr(jobs, 'LOCK_TIMEOUT', 0.1)
+    job, _ = jobs.create_job(PARAMS, pid=os.getpid())
+    holder = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    try:
+        lock_path = hold_lock(holder.pid)
+        writer = threading.Thread(target=jobs.update_job, args=(job['id'],), kwargs={'progress': 50})
+        writer.start()
+        writer.join(0.5)
+        assert writer.is_alive() and os.path.exists(lock_path)
+        os.remove(lock_path)  # pemegang yang lambat selesai
+        writer.join(5)
+        assert not writer.is_alive()
+        assert jobs.read_job(job['id'])['progress'] == 50
+    finally:
+        holder.kill(); holder.wait()
+
+def test_lock_of_dead_holder_is_taken_over(monkeypatch):
+    monkeypatch.setattr(jobs, 'LOCK_TIMEOUT', 0.1)
+    job, _ = jobs.create_job(PARAMS, pid=os.getpid())
+    lock_path = hold_lock(dead_pid())
+    jobs.update_job(job['id'], progress=70)
+    assert jobs.read_job(job['id'])['progress'] == 70
+    assert not os.path.exists(lock_path)
+    assert os.listdir(jobs.JOBS_DIR) == [f"{job['id']}.json"]
+
+def test_finished_jobs_are_pruned(monkeypatch):
+    monkeypatch.setattr(jobs, 'KEEP_JOBS', 3)
+    created = []
+    for _ in range(6):
+        job, _ = jobs.create_job(PARAMS, pid=os.getpid())
+        jobs.update_job(job['id'], status='selesai')
+        created.append(job['id'])
+    jobs.prune_jobs("tes", keep=3)
+    assert [job['id'] for job in jobs.list_jobs("tes")] == created[-3:]
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from rapidfuzz import fuzz, process
+
+from derived import MY_STORE_NAME
+from matching import (
+    expand_matches, incremental_top_matches, normalize_name, top_matches, top_matches_blocked,
+)
+from price_update import load_source_data_for_update
+
+CUTOFF = 85
+
+
+@pytest.fixture
+def source(client):
+    source_df = load_source_data_for_update(client, "tes")
+    my_store_df = source_df[source_df['Toko'] == MY_STORE_NAME]
+    competitor_df = source_df[source_df['Toko'] != MY_STORE_NAME]
+    return my_store_df, competitor_df, competitor_df['Nama Produk'].unique().tolist()
+
+def extract_rows(my_store_df, competitor_df, choices, cutoff, update_date):
+    # Implementasi lama: process.extract per produk, lalu semua baris kompetitor dengan nama itu
+    rows = []
+    for _, mine in my_store_df.iterrows():
+        for name, score, _ in process.extract(mine['Nama Produk'], choices, scorer=fuzz.token_set_ratio, score_cutoff=cutoff, limit=5):
+            for _, theirs in competitor_df[competitor_df['Nama Produk'] == name].iterrows():
+                rows.append([mine['Nama Produk'], int(mine['Harga']), name, int(theirs['Harga']), theirs['Toko'], int(score), update_date])
+    return pd.DataFrame(rows, columns=['Produk Toko Saya', 'Harga Toko Saya', 'Produk Kompetitor', 'Harga Kompetitor',
+                                       'Toko Kompetitor', 'Skor Kemiripan', 'Tanggal_Update'])
+
+def as_lists(query_idx, choice_idx, scores):
+    return list(zip(query_idx.tolist(), choice_idx.tolist(), scores.tolist()))
+
+
+def test_top_matches_and_expand_equal_process_extract(source):
+    my_store_df, competitor_df, choices = source
+    my_names = my_store_df['Nama Produk'].tolist()
+    query_idx, choice_idx, scores, _ = top_matches(my_names, choices, CUTOFF, limit=5)
+    result = expand_matches(my_names, my_store_df['Harga'].tolist(), competitor_df, choices, query_idx, choice_idx, scores, '2024-01-22')
+    expected = extract_rows(my_store_df, competitor_df, choices, CUTOFF, '2024-01-22')
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(result.astype(object), expected.astype(object))
+
+@pytest.mark.parametrize('use_blocking', [False, True])
+def test_incremental_matching_equals_full(source, use_blocking):
+    my_store_df, _, choices = source
+    my_names = my_store_df['Nama Produk'].tolist()
+    matcher = top_matches_blocked if use_blocking else top_matches
+
+    *first, stats, cache = incremental_top_matches(my_names[10:], choices[5:], CUTOFF, None, use_blocking=use_blocking)
+    assert stats['mode'] == 'penuh'
+    assert as_lists(*first) == as_lists(*matcher(my_names[10:], choices[5:], CUTOFF)[:3])
+
+    # Produk & nama kompetitor baru ditambahkan, sebagian yang lama hilang
+    queries, competitor_names = my_names[:-3], choices[:-4] + ["LOGITECH Mouse Wireless M185 Original"]
+    *second, stats, _ = incremental_top_matches(queries, competitor_names, CUTOFF, cache, use_blocking=use_blocking)
+    assert stats['mode'] == 'inkremental' and stats['query_baru'] == 10
+    assert as_lists(*second) == as_lists(*matcher(queries, competitor_names, CUTOFF)[:3])
+
+def test_incremental_matching_serves_higher_cutoff_from_cache(source):
+    my_store_df, _, choices = source
+    my_names = my_store_df['Nama Produk'].tolist()
+    *_, cache = incremental_top_matches(my_names, choices, CUTOFF, None)
+    *result, stats, _ = incremental_top_matches(my_names, choices, 95, cache)
+    assert stats['pasangan'] == 0
+    assert as_lists(*result) == as_lists(*top_matches(my_names, choices, 95)[:3])
+
+def test_blocking_finds_size_variants():
+    queries = ['SAMSUNG Monitor 27" S390', 'ACER Monitor 24 INCH K242']
+    choices = ['SAMSUNG Monitor 27 inch S390 Original', 'ACER Monitor 24in K242', 'ASUS Mouse Gaming']
+    brute = as_lists(*top_matches(queries, choices, 80)[:3])
+    assert as_lists(*top_matches_blocked(queries, choices, 80)[:3]) == brute
+
+@pytest.mark.parametrize('name, expected', [
+    ('Monitor 27 inch', 'MONITOR 27INCH'), ('Monitor 27"', 'MONITOR 27INCH'), ('Monitor 27in', 'MONITOR 27INCH'),
+    ('Monitor 32 INCHES', 'MONITOR 32INCH'), ('Keyboard 2 IN 1', 'KEYBOARD 2 IN 1'), ('SSD 1 TB', 'SSD 1TB'),
+])
+def test_normalize_name(name, expected):
+    assert normalize_name(name) == expected
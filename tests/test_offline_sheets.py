@@ -0,0 +1,7 @@
+import pytest
+
+
+def test_unsupported_batch_update_names_request_kind(client):
+    spreadsheet = client.open_by_key("tes")
+    with pytest.raises(ValueError, match="mergeCells"):
+        spreadsheet.batch_update({'requests': [{'mergeCells': {'range': {'sheetId': 1}}}]})
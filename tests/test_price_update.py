@@ -0,0 +1,28 @@
+from ingestion import SHEET_NAMES
+from offline_sheets import OfflineClient
+from price_update import load_source_data_for_update
+
+NEW_SHEET = "TOKO BARU - REKAP - READY"
+
+
+def add_store_sheet(workbook):
+    # Toko baru yang belum tercantum di SHEET_NAMES, isinya salinan sheet toko lain
+    source = next(title for title in workbook if "REKAP - READY" in title)
+    workbook[NEW_SHEET] = [list(row) for row in workbook[source]]
+    assert NEW_SHEET not in SHEET_NAMES
+
+def stores(source_df):
+    return set(source_df['Toko'].astype(str))
+
+def test_source_includes_rekap_sheets_missing_from_sheet_names(workbook):
+    add_store_sheet(workbook)
+    source_df = load_source_data_for_update(OfflineClient(workbook), "tes")
+    assert "TOKO BARU" in stores(source_df)
+    # Dari snapshot (tanpa membaca spreadsheet) toko baru tetap ada
+    assert "TOKO BARU" in stores(load_source_data_for_update(None, "tes"))
+
+def test_refresh_picks_up_store_sheet_added_after_snapshot(workbook):
+    assert "TOKO BARU" not in stores(load_source_data_for_update(OfflineClient(workbook), "tes"))
+    add_store_sheet(workbook)
+    source_df = load_source_data_for_update(OfflineClient(workbook), "tes", refresh_source=True)
+    assert "TOKO BARU" in stores(source_df)
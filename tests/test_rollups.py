@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from derived import MY_STORE_NAME, build_derived_frames, week_start
+from rollups import build_range_rollups, build_rollups
+from snapshot import full_load, load_snapshot
+from storage import SnapshotBackend
+
+
+@pytest.fixture
+def history(client):
+    rekap_df, database_df, matches_df, manifest, _ = full_load(client.open_by_key("tes"))
+    # Baris kembar pada tanggal yang sama menguji aturan "baris pertama menang" seperti idxmax
+    duplicates = rekap_df.sample(200, random_state=1).assign(Omzet=lambda df: df['Omzet'] + 7)
+    rekap_df = pd.concat([rekap_df, duplicates]).sort_values('Tanggal', kind='mergesort').reset_index(drop=True)
+    backend = SnapshotBackend("tes")
+    backend.save(rekap_df, database_df, matches_df, manifest)
+    # Acuan dibaca dari snapshot agar urutan baris sama dengan yang dilihat SqlStore
+    return load_snapshot("tes")[0], backend.sql_store()
+
+def idxmax_latest(df, keys):
+    return df.loc[df.groupby(keys, observed=True)['Tanggal'].idxmax()]
+
+def in_range(df, start_date, end_date):
+    if start_date is None: return df
+    return df[(df['Tanggal'] >= pd.Timestamp(start_date)) & (df['Tanggal'] <= pd.Timestamp(end_date))]
+
+def expected_tables(df):
+    weekly = idxmax_latest(df.assign(Minggu=week_start(df['Tanggal'])), ['Minggu', 'Toko', 'Nama Produk'])
+    latest = idxmax_latest(df, ['Toko', 'Nama Produk'])
+    competitors = latest[latest['Toko'] != MY_STORE_NAME]
+    return {
+        'latest': latest,
+        'weekly_omzet': weekly.groupby(['Minggu', 'Toko'], observed=True)['Omzet'].sum().reset_index(),
+        'main_weekly': weekly[weekly['Toko'] == MY_STORE_NAME].groupby('Minggu').agg(
+            Omzet=('Omzet', 'sum'), Penjualan_Unit=('Terjual per Bulan', 'sum')).reset_index(),
+        'competitor_brands': competitors.groupby(['Toko', 'Brand'], observed=True).agg(
+            Total_Omzet=('Omzet', 'sum'), Total_Unit_Terjual=('Terjual per Bulan', 'sum')).reset_index(),
+    }
+
+def assert_same(actual, expected, keys):
+    actual, expected = (
+        frame.assign(**{key: frame[key].astype(str) for key in keys if key != 'Minggu'})
+        .sort_values(keys).reset_index(drop=True)[list(expected.columns)]
+        for frame in (actual, expected)
+    )
+    assert len(actual) == len(expected)
+    for column in expected.columns:
+        if column in keys or not pd.api.types.is_numeric_dtype(expected[column]):
+            assert (actual[column].to_numpy() == expected[column].to_numpy()).all(), column
+        else: np.testing.assert_allclose(actual[column].astype(float), expected[column].astype(float), err_msg=column)
+
+def date_ranges(df):
+    first = df['Tanggal'].min()
+    offsets = [(0, 20), (3, 9), (5, 1), (8, 13)]
+    return [(None, None)] + [((first + pd.Timedelta(days=a)).date(), (first + pd.Timedelta(days=a + length)).date()) for a, length in offsets]
+
+def test_rollups_equal_idxmax_pandas(history):
+    rekap_df, _ = history
+    rollups = build_rollups(rekap_df)
+    for start_date, end_date in date_ranges(rekap_df):
+        frames = build_derived_frames(rekap_df, start_date, end_date)
+        tables = build_range_rollups(rollups, frames['df_filtered'], frames['competitor_latest_overall'], start_date, end_date)
+        expected = expected_tables(in_range(rekap_df, start_date, end_date))
+        assert_same(frames['latest_entries_overall'], expected['latest'][['Toko', 'Nama Produk', 'Tanggal', 'Omzet']], ['Toko', 'Nama Produk'])
+        assert_same(tables['weekly_omzet'], expected['weekly_omzet'], ['Minggu', 'Toko'])
+        assert_same(tables['main_weekly'], expected['main_weekly'], ['Minggu'])
+        assert_same(tables['competitor_brands'], expected['competitor_brands'], ['Toko', 'Brand'])
+
+def test_sql_store_equals_idxmax_pandas(history):
+    rekap_df, store = history
+    assert store is not None
+    for start_date, end_date in date_ranges(rekap_df):
+        expected = expected_tables(in_range(rekap_df, start_date, end_date))
+        latest = expected['latest'][['Toko', 'Nama Produk', 'Tanggal', 'Omzet']]
+        assert_same(store.latest_rows(start_date, end_date), latest, ['Toko', 'Nama Produk'])
+        assert_same(store.weekly_omzet(start_date, end_date), expected['weekly_omzet'], ['Minggu', 'Toko'])
+        assert_same(store.brand_breakdown(start_date, end_date), expected['competitor_brands'], ['Toko', 'Brand'])
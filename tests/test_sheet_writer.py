@@ -0,0 +1,61 @@
+import pandas as pd
+
+from ingestion import MATCHING_SHEET
+from sheet_writer import frame_rows, write_matches_diff
+
+HEADER = ['Produk Toko Saya', 'Harga Toko Saya', 'Produk Kompetitor', 'Harga Kompetitor', 'Toko Kompetitor', 'Skor Kemiripan', 'Tanggal_Update']
+
+
+def results(n, offset=0, price_bump=0, update_date='2024-02-01'):
+    return pd.DataFrame({
+        'Produk Toko Saya': [f"Produk {i}" for i in range(offset, offset + n)],
+        'Harga Toko Saya': [100_000 + i for i in range(offset, offset + n)],
+        'Produk Kompetitor': [f"Kompetitor {i}" for i in range(offset, offset + n)],
+        'Harga Kompetitor': [90_000 + i + price_bump * (i % 3 == 0) for i in range(offset, offset + n)],
+        'Toko Kompetitor': ["ABDITAMA" if i % 2 else "LEVEL99" for i in range(offset, offset + n)],
+        'Skor Kemiripan': [90 + i % 10 for i in range(offset, offset + n)],
+        'Tanggal_Update': update_date,
+    })[HEADER]
+
+def sheet_rows(spreadsheet):
+    values = spreadsheet.values_get(f"'{MATCHING_SHEET}'")['values']
+    normalized = [tuple(str(v) for v in (row + [''] * len(HEADER))[:len(HEADER)]) for row in values]
+    return normalized[0], sorted(normalized[1:])
+
+def expected_rows(results_df):
+    return sorted(tuple(str(v) for v in row) for row in frame_rows(results_df))
+
+def sheet_id(spreadsheet):
+    sheets = spreadsheet.fetch_sheet_metadata()['sheets']
+    return next(s['properties']['sheetId'] for s in sheets if s['properties']['title'] == MATCHING_SHEET)
+
+def test_diff_writer_output_equals_results(client):
+    spreadsheet = client.open_by_key("tes")
+    original_id = sheet_id(spreadsheet)
+    steps = [
+        results(40),                                     # header sama, isi diganti
+        results(40, price_bump=500),                     # sebagian harga berubah
+        results(55, offset=20, update_date='2024-02-02'),  # baris usang dihapus, baris baru ditambah
+        results(12, offset=30),                          # sheet menyusut
+        results(0),                                      # kosong
+        results(25),
+    ]
+    for results_df in steps:
+        report = write_matches_diff(spreadsheet, results_df)
+        header, rows = sheet_rows(spreadsheet)
+        assert list(header) == HEADER
+        assert rows == expected_rows(results_df)
+        assert report['diperbarui'] + report['ditambah'] + report['tetap'] == len(results_df)
+        assert sheet_id(spreadsheet) == original_id
+    titles = [s['properties']['title'] for s in spreadsheet.fetch_sheet_metadata()['sheets']]
+    assert not [title for title in titles if title.endswith("__STAGING")]
+
+def test_diff_writer_rewrites_on_header_change(client):
+    spreadsheet = client.open_by_key("tes")
+    original_id = sheet_id(spreadsheet)
+    renamed = results(10).rename(columns={'Skor Kemiripan': 'Skor'})
+    write_matches_diff(spreadsheet, renamed)
+    values = spreadsheet.values_get(f"'{MATCHING_SHEET}'")['values']
+    assert values[0] == list(renamed.columns)
+    assert sorted(tuple(str(v) for v in row) for row in values[1:]) == expected_rows(renamed)
+    assert sheet_id(spreadsheet) == original_id
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+from offline_sheets import OfflineClient, append_day
+from snapshot import full_load, incremental_refresh, load_snapshot, save_snapshot
+
+
+def sorted_rows(rekap_df):
+    columns = sorted(rekap_df.columns)
+    return rekap_df[columns].sort_values(columns, kind='mergesort').reset_index(drop=True)
+
+def save_full_load(spreadsheet):
+    rekap_df, database_df, matches_df, manifest, _ = full_load(spreadsheet)
+    save_snapshot("tes", rekap_df, database_df, matches_df, manifest)
+    return load_snapshot("tes")
+
+def test_incremental_refresh_equals_full_load(client, workbook):
+    spreadsheet = client.open_by_key("tes")
+    snapshot = save_full_load(spreadsheet)
+    append_day(workbook, seed=3)
+    spreadsheet = OfflineClient(workbook).open_by_key("tes")
+
+    refreshed = incremental_refresh(spreadsheet, snapshot)
+    reloaded = full_load(spreadsheet)
+    assert refreshed[4]['mode'] == 'inkremental' and refreshed[4]['baris_baru'] > 0
+    pd.testing.assert_frame_equal(sorted_rows(refreshed[0]), sorted_rows(reloaded[0]))
+    pd.testing.assert_frame_equal(refreshed[1], reloaded[1])
+    pd.testing.assert_frame_equal(refreshed[2], reloaded[2])
+    assert refreshed[3]['sheets'] == reloaded[3]['sheets']
+
+def test_load_report_has_per_sheet_timings(client, workbook):
+    report = full_load(client.open_by_key("tes"))[4]
+    timings = {timing['sheet']: timing for timing in report['timings']}
+    assert set(timings) == set(workbook)
+    for timing in timings.values():
+        assert timing['mode'] == 'batch' and timing['batch'] is not None
+        assert timing['detik'] == pytest.approx(timing['detik_ambil'] + timing['detik_parse'])
+    assert any(timing['detik_parse'] > 0 for timing in timings.values())
+
+def test_incremental_refresh_falls_back_when_rows_change(client, workbook):
+    spreadsheet = client.open_by_key("tes")
+    snapshot = save_full_load(spreadsheet)
+    rekap_sheet = next(title for title in workbook if "REKAP" in title)
+    workbook[rekap_sheet][-1][1] = "Rp 1"
+    spreadsheet = OfflineClient(workbook).open_by_key("tes")
+
+    refreshed = incremental_refresh(spreadsheet, snapshot)
+    assert refreshed[4]['mode'] == 'penuh'
+    pd.testing.assert_frame_equal(sorted_rows(refreshed[0]), sorted_rows(full_load(spreadsheet)[0]))
@@ -0,0 +1,74 @@
+# ===================================================================================
+#  WORKER PEMBARUAN PERBANDINGAN HARGA (TANPA STREAMLIT)
+#  Menjalankan pipeline muat -> cocokkan -> tulis HASIL_MATCHING di luar proses
+#  Streamlit. Dua cara pakai:
+#    python worker.py --job <id>                     (dikirim dari dashboard)
+#    python worker.py --spreadsheet-key <key> [...]  (dijadwalkan, mis. cron)
+# ===================================================================================
+
+import argparse
+import os
+import sys
+import traceback
+
+import instrumentation
+import jobs
+from gsheets_client import SECRETS_PATH, connect, load_secrets_file
+from price_update import run_price_comparison_update
+
+
+def run_job(job_id, secrets_path=SECRETS_PATH):
+    job = jobs.read_job(job_id)
+    if job is None:
+        print(f"Job '{job_id}' tidak ditemukan.", file=sys.stderr); return 1
+    params = job['params']
+    jobs.update_job(job_id, status='berjalan', pid=os.getpid(), started_at=jobs.now(), pesan="Menghubungkan ke Google Sheets...")
+
+    def report_progress(pct, text):
+        jobs.update_job(job_id, progress=int(pct), pesan=text)
+
+    # DASHBOARD_DIAGNOSTICS=1: span tiap tahap & hitungan API ditulis ke log diagnostik dan ke hasil job
+    trace = instrumentation.start_trace("worker", job=job_id)
+    try:
+        gc = connect(load_secrets_file(secrets_path))
+        result = run_price_comparison_update(
+            gc, params['spreadsheet_key'], score_cutoff=params.get('score_cutoff', 88),
+            use_blocking=params.get('use_blocking', False), incremental=params.get('incremental', True),
+            refresh_source=params.get('refresh_source', False), progress=report_progress,
+        )
+    except Exception as e:
+        traceback.print_exc()
+        instrumentation.finish_trace(trace)
+        jobs.update_job(job_id, status='gagal', pesan=f"Gagal menjalankan pembaruan: {e}", finished_at=jobs.now())
+        return 1
+    if trace is not None:
+        result['diagnostik'] = instrumentation.finish_trace(trace).to_dict()
+    jobs.update_job(job_id, status=result['status'], progress=100, pesan=result['pesan'], hasil=result, finished_at=jobs.now())
+    print(result['pesan'])
+    return 1 if result['status'] == 'gagal' else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker pembaruan HASIL_MATCHING")
+    parser.add_argument('--job', help="ID job yang dibuat oleh dashboard")
+    parser.add_argument('--spreadsheet-key', help="Jalankan langsung untuk spreadsheet ini (mode terjadwal)")
+    parser.add_argument('--cutoff', type=int, default=91, help="Skor kemiripan minimum (default 91)")
+    parser.add_argument('--full', action='store_true', help="Abaikan cache skor pasangan (hitung ulang penuh)")
+    parser.add_argument('--blocking', action='store_true', help="Pakai blocking token (lebih cepat, recall bisa < 100%%)")
+    parser.add_argument('--secrets', default=SECRETS_PATH, help="Path secrets.toml berisi kredensial gcp_*")
+    args = parser.parse_args(argv)
+
+    if args.job:
+        return run_job(args.job, args.secrets)
+    if not args.spreadsheet_key:
+        parser.error("--job atau --spreadsheet-key wajib diisi")
+    # Mode terjadwal: baris REKAP baru ditarik dulu ke snapshot sebelum pencocokan
+    job, created = jobs.create_job({'spreadsheet_key': args.spreadsheet_key, 'score_cutoff': args.cutoff,
+                                    'incremental': not args.full, 'use_blocking': args.blocking,
+                                    'refresh_source': True}, pid=os.getpid())
+    if not created:
+        print(f"Job {job['id']} untuk spreadsheet ini masih {job['status']}; dilewati.")
+        return 0
+    return run_job(job['id'], args.secrets)
+
+if __name__ == '__main__':
+    sys.exit(main())